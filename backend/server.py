@@ -1,20 +1,31 @@
 # FastAPI backend for NepSafe tourism app
 # Handles authentication, permits, hotels, destinations, and bookings
 
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, status, BackgroundTasks
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Form, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.encoders import jsonable_encoder
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
-import os, logging, jwt, bcrypt, uuid, base64, random, httpx, smtplib
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, TEXT, IndexModel, ReturnDocument, UpdateOne
+from pymongo.collation import Collation
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
+import os, re, json, math, unicodedata, asyncio, logging, jwt, bcrypt, uuid, base64, hashlib, mimetypes, random, httpx, aiosmtplib
 from pathlib import Path
 from dotenv import load_dotenv
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, TypeAdapter
+from typing import Any, Awaitable, Callable, List, Literal, Optional
+from collections import OrderedDict
+import importlib.util
 from datetime import datetime, timezone, timedelta
 from io import BytesIO
-from PIL import Image
-from fastapi.responses import JSONResponse
+from PIL import Image, ImageOps
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from starlette.concurrency import run_in_threadpool
 from email.message import EmailMessage
+from html import escape
+from string import Template
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -35,55 +46,334 @@ security = HTTPBearer()
 app = FastAPI()
 
 # Security middleware and rate limiting
+# These are plain ASGI middleware rather than BaseHTTPMiddleware subclasses: they only wrap
+# `receive`/`send`, so they add no extra task or body stream per request and streaming
+# responses pass through untouched.
 import time
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import Headers
 from starlette.requests import Request
+from python_multipart.multipart import MultipartParser, parse_options_header
 
 BACKEND_MAX_BODY_SIZE_BYTES = int(os.environ.get("BACKEND_MAX_BODY_SIZE_BYTES", str(2 * 1024 * 1024)))
+UPLOAD_MAX_IMAGE_BYTES = int(os.environ.get("UPLOAD_MAX_IMAGE_BYTES", str(8 * 1024 * 1024)))
+UPLOAD_MAX_DOCUMENT_BYTES = int(os.environ.get("UPLOAD_MAX_DOCUMENT_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_MAX_HOTEL_IMAGES = int(os.environ.get("UPLOAD_MAX_HOTEL_IMAGES", "10"))
+# Room for the other form fields and multipart boundaries on upload routes
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+
+# Per-endpoint upload limits: name -> (method or None for any, path pattern, max bytes per file,
+# max files). The request body limit for a matching route is raised to fit that many files.
+UPLOAD_LIMITS = {
+    "profile_picture": ("POST", re.compile(r"/api/auth/upload-profile-picture"), UPLOAD_MAX_IMAGE_BYTES, 1),
+    "hotel_images": ("POST", re.compile(r"/api/hotel-owner/hotels/[^/]+/images"), UPLOAD_MAX_IMAGE_BYTES, UPLOAD_MAX_HOTEL_IMAGES),
+    "permit_document": ("POST", re.compile(r"/api/permits"), UPLOAD_MAX_DOCUMENT_BYTES, 1),
+    "tourist_spot_image": (None, re.compile(r"/api/admin/tourist-spots(/[^/]+)?"), UPLOAD_MAX_IMAGE_BYTES, 1),
+}
+
+def upload_limits_for(method: str, path: str) -> Optional[tuple]:
+    """(max bytes per file, max files) for an upload route, or None."""
+    for upload_method, pattern, max_bytes, max_files in UPLOAD_LIMITS.values():
+        if (upload_method is None or upload_method == method) and pattern.fullmatch(path):
+            return max_bytes, max_files
+    return None
+
+def body_size_limit_for(method: str, path: str) -> int:
+    limits = upload_limits_for(method, path)
+    if limits:
+        max_bytes, max_files = limits
+        return max(BACKEND_MAX_BODY_SIZE_BYTES, max_bytes * max_files + UPLOAD_FORM_OVERHEAD_BYTES)
+    return BACKEND_MAX_BODY_SIZE_BYTES
+
+class MultipartLimiter:
+    """Follows a multipart body as it is received and rejects it as soon as one file exceeds
+    max_bytes or more than max_files files arrive. Starlette spools the whole form before the
+    route runs, so this is the only place per-file limits can stop an upload early. A body the
+    parser can't follow is passed through untouched for Starlette to reject."""
+
+    def __init__(self, boundary: bytes, max_bytes: int, max_files: int):
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.files = 0
+        self._size = 0
+        self._header_field = b""
+        self._header_value = b""
+        self._is_file = False
+        self._parser = MultipartParser(boundary, callbacks={
+            "on_part_begin": self._part_begin,
+            "on_part_data": self._part_data,
+            "on_header_field": self._header_field_data,
+            "on_header_value": self._header_value_data,
+            "on_header_end": self._header_end,
+        })
+
+    def _part_begin(self) -> None:
+        self._size, self._is_file = 0, False
+
+    def _header_field_data(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _header_value_data(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _header_end(self) -> None:
+        if self._header_field.lower() == b"content-disposition":
+            _, options = parse_options_header(self._header_value)
+            if b"filename" in options:
+                self._is_file = True
+                self.files += 1
+                if self.files > self.max_files:
+                    raise HTTPException(status_code=400, detail=f"Too many files (max {self.max_files})")
+        self._header_field, self._header_value = b"", b""
+
+    def _part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._is_file:
+            self._size += end - start
+            if self._size > self.max_bytes:
+                raise HTTPException(status_code=413, detail=f"File too large (max {self.max_bytes} bytes)")
+
+    def feed(self, chunk: bytes) -> None:
+        if self._parser is None:
+            return
+        try:
+            self._parser.write(chunk)
+        except HTTPException:
+            raise
+        except Exception:
+            self._parser = None
+
+def multipart_limiter_for(scope) -> Optional[MultipartLimiter]:
+    limits = upload_limits_for(scope["method"], scope["path"])
+    if limits is None:
+        return None
+    content_type, options = parse_options_header(Headers(scope=scope).get("content-type", ""))
+    if content_type != b"multipart/form-data" or not options.get(b"boundary"):
+        return None
+    return MultipartLimiter(options[b"boundary"], *limits)
 BACKEND_RATE_LIMIT_WINDOW_SECONDS = int(os.environ.get("BACKEND_RATE_LIMIT_WINDOW_SECONDS", "60"))
 BACKEND_RATE_LIMIT_MAX_REQUESTS = int(os.environ.get("BACKEND_RATE_LIMIT_MAX_REQUESTS", "120"))
-RATE_LIMIT_STORE = {}
-
-# Add security headers to all responses
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        csp = os.environ.get("CONTENT_SECURITY_POLICY", "default-src 'self'; img-src 'self' data: https:; script-src 'self' 'unsafe-inline' https:; style-src 'self' 'unsafe-inline' https:;")
-        response.headers.setdefault("Content-Security-Policy", csp)
-        response.headers.setdefault("X-Frame-Options", "DENY")
-        response.headers.setdefault("X-Content-Type-Options", "nosniff")
-        response.headers.setdefault("Referrer-Policy", "strict-origin-when-cross-origin")
-        response.headers.setdefault("Strict-Transport-Security", "max-age=63072000; includeSubDomains; preload")
-        return response
-
-# Enforce max body size limit
-class BodySizeLimitMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        content_length = request.headers.get("content-length")
-        if content_length and int(content_length) > BACKEND_MAX_BODY_SIZE_BYTES:
-            return JSONResponse(status_code=413, content={"detail": "Request body too large"})
-        return await call_next(request)
-
-class SimpleRateLimiterMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        client_ip = request.client.host if request.client else "unknown"
+
+SECURITY_HEADERS = [
+    (name.lower().encode("latin-1"), value.encode("latin-1"))
+    for name, value in [
+        ("Content-Security-Policy", os.environ.get("CONTENT_SECURITY_POLICY", "default-src 'self'; img-src 'self' data: https:; script-src 'self' 'unsafe-inline' https:; style-src 'self' 'unsafe-inline' https:;")),
+        ("X-Frame-Options", "DENY"),
+        ("X-Content-Type-Options", "nosniff"),
+        ("Referrer-Policy", "strict-origin-when-cross-origin"),
+        ("Strict-Transport-Security", "max-age=63072000; includeSubDomains; preload"),
+    ]
+]
+
+async def send_json_error(send, status_code: int, detail: str, headers: Optional[list] = None) -> None:
+    """Send a complete JSON error response from ASGI middleware."""
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())] + (headers or []),
+    })
+    await send({"type": "http.response.body", "body": body})
+
+# Add security headers to all responses (unless the route already set them)
+class SecurityHeadersMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                present = {name.lower() for name, _ in headers}
+                headers.extend(h for h in SECURITY_HEADERS if h[0] not in present)
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+# Enforce max body size limit, both from Content-Length and, for chunked uploads, while reading.
+# Upload routes get the larger limit from UPLOAD_LIMITS, and their per-file size and file count
+# are checked on each chunk as it arrives.
+class BodySizeLimitMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        max_body_size = body_size_limit_for(scope["method"], scope["path"])
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length is not None:
+            try:
+                declared = int(content_length)
+            except ValueError:
+                return await send_json_error(send, 400, "Invalid Content-Length")
+            if declared > max_body_size:
+                return await send_json_error(send, 413, "Request body too large")
+
+        received = 0
+        response_started = False
+        multipart_limiter = multipart_limiter_for(scope)
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body_size:
+                    # Raised inside the app's body read; FastAPI re-raises HTTPExceptions from there
+                    raise HTTPException(status_code=413, detail="Request body too large")
+                if multipart_limiter is not None:
+                    multipart_limiter.feed(message.get("body", b""))
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except HTTPException as e:
+            if e.status_code != 413 or response_started:
+                raise
+            await send_json_error(send, 413, "Request body too large")
+
+# ---- Rate limiting ----
+# Sliding-window counters: the count of the previous fixed window is weighted by how much of it
+# still overlaps the sliding window, which approximates a true sliding log in O(1) memory per key.
+# "memory" keeps counters in a bounded LRU per process; "mongo" shares them between workers and
+# hosts through the rate_limits collection (expired by a TTL index).
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_LOGIN_MAX_REQUESTS = int(os.environ.get("RATE_LIMIT_LOGIN_MAX_REQUESTS", "10"))
+RATE_LIMIT_AUTH_MAX_REQUESTS = int(os.environ.get("RATE_LIMIT_AUTH_MAX_REQUESTS", "20"))
+RATE_LIMIT_CHATBOT_MAX_REQUESTS = int(os.environ.get("RATE_LIMIT_CHATBOT_MAX_REQUESTS", "30"))
+
+# First match wins: (method or None for any, path prefix matched on whole segments, bucket, max requests or None to exempt,
+# window seconds, key) where key "ip" counts per client address and "user" per authenticated user
+# (falling back to the address for anonymous requests).
+RATE_LIMIT_RULES = [
+    (None, "/api/sos", "sos", None, 0, "ip"),
+    ("POST", "/api/auth/login", "login", RATE_LIMIT_LOGIN_MAX_REQUESTS, 60, "ip"),
+    ("POST", "/api/auth/", "auth", RATE_LIMIT_AUTH_MAX_REQUESTS, 60, "ip"),
+    ("POST", "/api/chatbot", "chatbot", RATE_LIMIT_CHATBOT_MAX_REQUESTS, 60, "user"),
+    (None, "/", "default", BACKEND_RATE_LIMIT_MAX_REQUESTS, BACKEND_RATE_LIMIT_WINDOW_SECONDS, "user"),
+]
+
+def path_has_prefix(path: str, prefix: str) -> bool:
+    """True if `prefix` is `path` or one of its parent paths, so /api/sos does not cover /api/sos-reports."""
+    base = prefix.rstrip("/")
+    return path == base or path.startswith(base + "/")
+
+def match_rate_limit_rule(method: str, path: str) -> tuple:
+    for rule in RATE_LIMIT_RULES:
+        rule_method, prefix = rule[0], rule[1]
+        if (rule_method is None or rule_method == method) and path_has_prefix(path, prefix):
+            return rule
+    return RATE_LIMIT_RULES[-1]
+
+def _sliding_window_decision(previous: int, current: int, limit: int, window: int, elapsed: float) -> tuple:
+    """Return (allowed, retry_after_seconds) given the counts of the previous and current
+    fixed windows (current includes this request) and the time elapsed in the current one."""
+    weight = 1 - elapsed / window
+    if previous * weight + current <= limit:
+        return True, 0
+    if current > limit:
+        # Only the start of the next window brings the count back under the limit
+        return False, max(1, math.ceil(window - elapsed))
+    # Wait until enough of the previous window has slid out
+    needed_weight = (limit - current) / previous
+    return False, max(1, math.ceil((1 - needed_weight) * window - elapsed))
+
+class MemoryRateLimitBackend:
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._windows: "OrderedDict[str, list]" = OrderedDict()
+
+    async def hit(self, key: str, limit: int, window: int) -> tuple:
         now = time.time()
-        entry = RATE_LIMIT_STORE.get(client_ip)
-        if entry:
-            count, window_start = entry
-            if now - window_start <= BACKEND_RATE_LIMIT_WINDOW_SECONDS:
-                count += 1
-                if count > BACKEND_RATE_LIMIT_MAX_REQUESTS:
-                    return JSONResponse(status_code=429, content={"detail": "Too many requests"})
-                RATE_LIMIT_STORE[client_ip] = (count, window_start)
-            else:
-                RATE_LIMIT_STORE[client_ip] = (1, now)
-        else:
-            RATE_LIMIT_STORE[client_ip] = (1, now)
-        return await call_next(request)
+        index = int(now // window)
+        entry = self._windows.get(key)
+        if entry is None or entry[0] < index - 1:
+            entry = [index, 0, 0]
+        elif entry[0] == index - 1:
+            entry = [index, 0, entry[1]]
+        entry[1] += 1
+        self._windows[key] = entry
+        self._windows.move_to_end(key)
+        while len(self._windows) > self.max_keys:
+            self._windows.popitem(last=False)
+        return _sliding_window_decision(entry[2], entry[1], limit, window, now - index * window)
+
+class MongoRateLimitBackend:
+    """One document per key and fixed window; the previous window is read back for the estimate."""
+
+    async def hit(self, key: str, limit: int, window: int) -> tuple:
+        now = time.time()
+        index = int(now // window)
+        current_doc, previous_doc = await asyncio.gather(
+            db.rate_limits.find_one_and_update(
+                {"_id": f"{key}:{index}"},
+                {"$inc": {"count": 1},
+                 "$setOnInsert": {"expires_at": datetime.fromtimestamp((index + 2) * window, tz=timezone.utc)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            ),
+            db.rate_limits.find_one({"_id": f"{key}:{index - 1}"}, {"count": 1})
+        )
+        previous = previous_doc["count"] if previous_doc else 0
+        return _sliding_window_decision(previous, current_doc["count"], limit, window, now - index * window)
+
+class RateLimiter:
+    def __init__(self, backend_name: str):
+        self.memory = MemoryRateLimitBackend(RATE_LIMIT_MAX_KEYS)
+        self.backend = MongoRateLimitBackend() if backend_name == "mongo" else self.memory
+
+    async def hit(self, key: str, limit: int, window: int) -> tuple:
+        try:
+            return await self.backend.hit(key, limit, window)
+        except PyMongoError as e:
+            # Keep limiting per process rather than failing every request while Mongo is down
+            logging.warning(f"[RATE LIMIT] Shared backend unavailable, using memory: {str(e)}")
+            return await self.memory.hit(key, limit, window)
+
+rate_limiter = RateLimiter(RATE_LIMIT_BACKEND)
+
+def _rate_limit_subject(scope, per: str) -> str:
+    if per == "user":
+        auth = Headers(scope=scope).get("authorization", "")
+        if auth.lower().startswith("bearer "):
+            try:
+                payload = jwt.decode(auth[7:], SECRET_KEY, algorithms=[ALGORITHM])
+                if payload.get("sub"):
+                    return f"user:{payload['sub']}"
+            except jwt.PyJWTError:
+                pass
+    client_addr = scope.get("client")
+    return f"ip:{client_addr[0] if client_addr else 'unknown'}"
+
+class SimpleRateLimiterMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            return await self.app(scope, receive, send)
+        _, _, bucket, limit, window, per = match_rate_limit_rule(scope["method"], scope["path"])
+        if limit is None:
+            return await self.app(scope, receive, send)
+        allowed, retry_after = await rate_limiter.hit(f"{bucket}:{_rate_limit_subject(scope, per)}", limit, window)
+        if not allowed:
+            return await send_json_error(send, 429, "Too many requests", [(b"retry-after", str(retry_after).encode())])
+        await self.app(scope, receive, send)
 
 # Apply middleware (order matters)
-# CORS must be added first for it to work properly
+# Each add_middleware call wraps the previous stack, so the last one added runs first. CORS is
+# added last so that 413/429 responses from the limits below still carry CORS headers.
 cors_origins_env = os.environ.get('CORS_ORIGINS')
 if cors_origins_env:
     cors_origins = [origin.strip() for origin in cors_origins_env.split(',') if origin.strip()]
@@ -95,16 +385,17 @@ if "*" in cors_origins:
     cors_origins = ["*"]
     allow_credentials = False
 
+app.add_middleware(BodySizeLimitMiddleware)
+app.add_middleware(SimpleRateLimiterMiddleware)
+app.add_middleware(SecurityHeadersMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=allow_credentials,
     allow_origins=cors_origins,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Event-Seq", "Retry-After"],
 )
-app.add_middleware(SecurityHeadersMiddleware)
-app.add_middleware(BodySizeLimitMiddleware)
-app.add_middleware(SimpleRateLimiterMiddleware)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -131,6 +422,7 @@ class User(BaseModel):
     name: str
     role: str = "user"  # user, hotel_owner, admin
     profile_picture: Optional[str] = None
+    profile_thumbnail_url: Optional[str] = None
     email_verified: bool = False
     is_active: bool = True
     is_banned: bool = False
@@ -163,7 +455,9 @@ class Hotel(BaseModel):
     amenities: List[str]
     contact: str
     image_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
     images: Optional[List[str]] = None  # Multiple images
+    image_thumbnails: Optional[List[str]] = None  # Thumbnail for each entry in images
     available_rooms: int
     owner_id: Optional[str] = None  # Link to hotel owner
     owner_name: Optional[str] = None
@@ -218,6 +512,7 @@ class Booking(BaseModel):
     check_in: str
     check_out: str
     guests: int
+    rooms: int = 1
     total_price: float
     status: str  # confirmed, cancelled
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -227,6 +522,7 @@ class BookingCreate(BaseModel):
     check_in: str
     check_out: str
     guests: int
+    rooms: Optional[int] = None  # defaults to the fewest rooms that fit the guests
 
 # ==================== PERMIT MODELS ====================
 class Permit(BaseModel):
@@ -244,7 +540,7 @@ class Permit(BaseModel):
     end_date: str
     status: str  # pending, approved, rejected, cancelled
     admin_note: Optional[str] = None
-    document_data: Optional[str] = None  # base64 encoded passport photo
+    document_data: Optional[str] = None  # blob URL of the passport photo (legacy records: base64)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: Optional[datetime] = None
 
@@ -320,6 +616,7 @@ class TouristSpot(BaseModel):
     attractions: Optional[str] = None
     cost: Optional[str] = None
     image_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
 
 class TouristSpotCreate(BaseModel):
     name: str
@@ -394,18 +691,232 @@ def generate_verification_code() -> str:
     return str(random.randint(100000, 999999))
 
 
-def send_verification_email(to_email: str, code: str):
-    """Send a professional HTML verification email with the code. If SMTP not configured, print the code to logs."""
-    smtp_host = os.environ.get('SMTP_HOST')
-    smtp_port = int(os.environ.get('SMTP_PORT', '587'))
-    smtp_user = os.environ.get('SMTP_USER')
-    smtp_pass = os.environ.get('SMTP_PASS')
-    email_from = os.environ.get('EMAIL_FROM', smtp_user or f"no-reply@{os.environ.get('HOSTNAME','localhost')}")
+def create_access_token(user_id: str, role: str) -> str:
+    """Create JWT access token for authentication"""
+    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode = {"sub": user_id, "role": role, "exp": expire}
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-    subject = "🔐 Verify Your NepSafe Email"
-    
-    # Professional HTML email template
-    html_body = f"""
+async def log_admin_action(
+    admin_id: str,
+    action: str,
+    entity_type: str,
+    entity_id: Optional[str] = None,
+    before: Optional[dict] = None,
+    after: Optional[dict] = None
+) -> None:
+    log_record = {
+        "id": str(uuid.uuid4()),
+        "admin_id": admin_id,
+        "action": action,
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "before": before,
+        "after": after,
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+    await db.admin_audit_logs.insert_one(log_record)
+
+# ---- Token verification and revocation ----
+# Verified tokens are kept in a small LRU so repeat requests skip the signature check. Bans and
+# deactivations are enforced from an in-memory set of revoked user ids; every status change bumps
+# a version counter in auth_state, and each worker polls that one document and reloads the set
+# only when the version moves. The hot path never touches Mongo.
+AUTH_TOKEN_CACHE_SIZE = int(os.environ.get("AUTH_TOKEN_CACHE_SIZE", "10000"))
+AUTH_STATE_POLL_SECONDS = float(os.environ.get("AUTH_STATE_POLL_SECONDS", "5"))
+
+_verified_tokens: "OrderedDict[str, tuple]" = OrderedDict()
+_revoked_users: dict = {}
+_auth_state_version: Optional[int] = None
+
+def verify_access_token(token: str) -> tuple:
+    """Return (user_id, role) for a valid token, raising 401 otherwise."""
+    cached = _verified_tokens.get(token)
+    if cached is not None:
+        user_id, role, expires_at = cached
+        if expires_at > time.time():
+            _verified_tokens.move_to_end(token)
+            return user_id, role
+        del _verified_tokens[token]
+        raise HTTPException(status_code=401, detail="Token expired")
+
+    try:
+        # Cached entries expire with the token, so a token without exp is never accepted
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"require": ["exp", "sub"]})
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token expired")
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    user_id = payload.get("sub")
+    role = payload.get("role", "user")
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    _verified_tokens[token] = (user_id, role, payload["exp"])
+    while len(_verified_tokens) > AUTH_TOKEN_CACHE_SIZE:
+        _verified_tokens.popitem(last=False)
+    return user_id, role
+
+def _revocation_reason(user_doc: dict) -> Optional[str]:
+    if user_doc.get("is_banned", False):
+        return "Account banned"
+    if user_doc.get("is_active", True) is False:
+        return "Account deactivated"
+    return None
+
+async def load_revoked_users() -> None:
+    """Reload the revoked-user set if the auth_state version has moved since the last load."""
+    global _revoked_users, _auth_state_version
+    state = await db.auth_state.find_one({"id": "users"}, {"_id": 0, "version": 1})
+    version = state["version"] if state else 0
+    if version == _auth_state_version:
+        return
+    revoked = {}
+    async for user_doc in db.users.find(
+        {"$or": [{"is_banned": True}, {"is_active": False}]}, {"_id": 0, "id": 1, "is_banned": 1, "is_active": 1}
+    ):
+        revoked[user_doc["id"]] = _revocation_reason(user_doc)
+    _revoked_users = revoked
+    _auth_state_version = version
+
+async def record_user_status_change(user_id: str, user_doc: dict) -> None:
+    """Apply a status change locally at once and bump the version so other workers reload."""
+    reason = _revocation_reason(user_doc)
+    if reason:
+        _revoked_users[user_id] = reason
+    else:
+        _revoked_users.pop(user_id, None)
+    await db.auth_state.update_one({"id": "users"}, {"$inc": {"version": 1}}, upsert=True)
+
+async def auth_state_loop() -> None:
+    while True:
+        await asyncio.sleep(AUTH_STATE_POLL_SECONDS)
+        try:
+            await load_revoked_users()
+        except PyMongoError as e:
+            logging.warning(f"[AUTH] Could not refresh revoked users: {str(e)}")
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    user_id, role = verify_access_token(credentials.credentials)
+    reason = _revoked_users.get(user_id)
+    if reason:
+        raise HTTPException(status_code=403, detail=reason)
+    return {"user_id": user_id, "role": role}
+
+async def get_admin_user(current_user: dict = Depends(get_current_user)) -> str:
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user["user_id"]
+
+async def get_hotel_owner(current_user: dict = Depends(get_current_user)) -> str:
+    if current_user["role"] != "hotel_owner":
+        raise HTTPException(status_code=403, detail="Hotel owner access required")
+    return current_user["user_id"]
+
+# ==================== PASSWORD HASHING ====================
+# bcrypt takes a few hundred milliseconds per call and releases the GIL while it runs, so hashing
+# happens on a dedicated thread pool instead of the event loop. At most PASSWORD_HASH_WORKERS
+# hashes run at once; when more than PASSWORD_HASH_MAX_QUEUE are waiting, new ones get a 503
+# instead of piling up behind a login burst.
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get("PASSWORD_HASH_MAX_QUEUE", "64"))
+
+_password_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_password_slots = asyncio.Semaphore(PASSWORD_HASH_WORKERS)
+
+PASSWORD_HASH_METRICS = {
+    "in_flight": 0, "queued": 0, "max_queued": 0, "rejected": 0,
+    "completed": 0, "total_wait_ms": 0.0, "total_run_ms": 0.0,
+}
+
+async def _run_password_job(func, *args):
+    metrics = PASSWORD_HASH_METRICS
+    if metrics["queued"] >= PASSWORD_HASH_MAX_QUEUE:
+        metrics["rejected"] += 1
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+    queued_at = time.perf_counter()
+    metrics["queued"] += 1
+    metrics["max_queued"] = max(metrics["max_queued"], metrics["queued"])
+    try:
+        await _password_slots.acquire()
+    finally:
+        metrics["queued"] -= 1
+    started = time.perf_counter()
+    metrics["in_flight"] += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_password_pool, func, *args)
+    finally:
+        metrics["in_flight"] -= 1
+        metrics["completed"] += 1
+        metrics["total_wait_ms"] += (started - queued_at) * 1000
+        metrics["total_run_ms"] += (time.perf_counter() - started) * 1000
+        _password_slots.release()
+
+def _hash_password_sync(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
+
+async def hash_password(password: str) -> str:
+    return await _run_password_job(_hash_password_sync, password)
+
+async def verify_password(password: str, hashed) -> bool:
+    """Check `password` against a stored hash (str or bytes, as older documents hold either)."""
+    hashed_bytes = hashed.encode('utf-8') if isinstance(hashed, str) else hashed
+    return await _run_password_job(bcrypt.checkpw, password.encode('utf-8'), hashed_bytes)
+
+def password_needs_rehash(hashed) -> bool:
+    """True when the stored hash was made with a different cost than BCRYPT_ROUNDS."""
+    hashed_str = hashed.decode('utf-8') if isinstance(hashed, bytes) else str(hashed)
+    parts = hashed_str.split("$")
+    try:
+        return int(parts[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+@api_router.get("/admin/password-hash-metrics")
+async def get_password_hash_metrics(admin_id: str = Depends(get_admin_user)):
+    m = PASSWORD_HASH_METRICS
+    return {
+        **m,
+        "workers": PASSWORD_HASH_WORKERS,
+        "max_queue": PASSWORD_HASH_MAX_QUEUE,
+        "bcrypt_rounds": BCRYPT_ROUNDS,
+        "avg_wait_ms": round(m["total_wait_ms"] / m["completed"], 1) if m["completed"] else None,
+        "avg_run_ms": round(m["total_run_ms"] / m["completed"], 1) if m["completed"] else None,
+        "total_wait_ms": round(m["total_wait_ms"], 1),
+        "total_run_ms": round(m["total_run_ms"], 1),
+    }
+
+# ==================== MAIL ====================
+# Outgoing mail is written to a Mongo outbox and delivered by a background worker, so request
+# handlers never wait on SMTP and a restart never loses a message. The worker sends over a
+# small pool of persistent connections (STARTTLS and login once per connection, reused until
+# it idles out or the server drops it) and retries failures with exponential backoff. SOS
+# alerts use the same templates but are delivered by the SOS dispatcher, on its own workers
+# and connections. Templates are parsed once at import.
+SMTP_HOST = os.environ.get('SMTP_HOST')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', '587'))
+SMTP_USER = os.environ.get('SMTP_USER')
+SMTP_PASS = os.environ.get('SMTP_PASS')
+SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', 'true').lower() == 'true'
+EMAIL_FROM = os.environ.get('EMAIL_FROM', SMTP_USER or f"no-reply@{os.environ.get('HOSTNAME','localhost')}")
+SOS_ALERT_EMAIL = os.environ.get('SOS_ALERT_EMAIL') or SMTP_USER or EMAIL_FROM
+
+MAIL_POOL_SIZE = int(os.environ.get("MAIL_POOL_SIZE", "4"))
+MAIL_IDLE_SECONDS = float(os.environ.get("MAIL_IDLE_SECONDS", "60"))
+MAIL_MAX_ATTEMPTS = int(os.environ.get("MAIL_MAX_ATTEMPTS", "8"))
+MAIL_RETRY_BASE_SECONDS = float(os.environ.get("MAIL_RETRY_BASE_SECONDS", "30"))
+MAIL_RETRY_MAX_SECONDS = 60 * 60
+MAIL_POLL_SECONDS = float(os.environ.get("MAIL_POLL_SECONDS", "10"))
+MAIL_SEND_TIMEOUT_SECONDS = 30
+# A message left "sending" this long (worker died mid-send) is picked up again
+MAIL_LEASE_SECONDS = 120
+MAIL_SENT_RETENTION_DAYS = 7
+MAIL_SINK_DIR = Path(os.environ.get("MAIL_SINK_DIR", str(ROOT_DIR / "mail_sink")))
+
+MAIL_METRICS = {"queued": 0, "sent": 0, "retried": 0, "failed": 0, "connections_opened": 0}
+
+_VERIFICATION_HTML = """
     <html>
         <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
             <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
@@ -423,7 +934,7 @@ def send_verification_email(to_email: str, code: str):
                     <!-- Verification Code Box -->
                     <div style="background-color: white; border: 2px solid #059669; border-radius: 8px; padding: 20px; text-align: center; margin: 25px 0;">
                         <p style="margin: 0; font-size: 12px; color: #6b7280; text-transform: uppercase;">Your Verification Code</p>
-                        <p style="margin: 10px 0 0 0; font-size: 36px; font-weight: bold; color: #059669; letter-spacing: 5px;">{code}</p>
+                        <p style="margin: 10px 0 0 0; font-size: 36px; font-weight: bold; color: #059669; letter-spacing: 5px;">$code</p>
                     </div>
                     
                     <p style="color: #6b7280; font-size: 14px;">This code will expire in 24 hours.</p>
@@ -446,47 +957,8 @@ def send_verification_email(to_email: str, code: str):
         </body>
     </html>
     """
-    
-    # Plain text fallback
-    text_body = f"Your NepSafe verification code is: {code}\n\nThis code will expire in 24 hours.\n\nIf you didn't create this account, please ignore this email."
-
-    if not smtp_host or not smtp_user or not smtp_pass:
-        # SMTP not configured; log the code so devs can copy it during development
-        logging.info(f"[SMTP Not Configured] Verification code for {to_email}: {code}")
-        print(f"[SMTP Not Configured] Verification code for {to_email}: {code}")
-        return
-
-    try:
-        msg = EmailMessage()
-        msg['Subject'] = subject
-        msg['From'] = email_from
-        msg['To'] = to_email
-        msg.set_content(text_body)
-        msg.add_alternative(html_body, subtype='html')
-
-        with smtplib.SMTP(smtp_host, smtp_port, timeout=10) as server:
-            server.starttls()
-            server.login(smtp_user, smtp_pass)
-            server.send_message(msg)
-        logging.info(f"Verification email sent successfully to {to_email}")
-        print(f"✓ Verification email sent to {to_email}")
-    except Exception as e:
-        logging.error(f"Failed to send verification email to {to_email}: {str(e)}")
-        print(f"✗ Failed to send verification email to {to_email}: {str(e)}")
-
 
-def send_password_reset_email(to_email: str, code: str):
-    """Send a professional HTML password reset email with the code."""
-    smtp_host = os.environ.get('SMTP_HOST')
-    smtp_port = int(os.environ.get('SMTP_PORT', '587'))
-    smtp_user = os.environ.get('SMTP_USER')
-    smtp_pass = os.environ.get('SMTP_PASS')
-    email_from = os.environ.get('EMAIL_FROM', smtp_user or f"no-reply@{os.environ.get('HOSTNAME','localhost')}")
-
-    subject = "🔐 Reset Your NepSafe Password"
-    
-    # Professional HTML email template
-    html_body = f"""
+_PASSWORD_RESET_HTML = """
     <html>
         <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
             <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
@@ -504,7 +976,7 @@ def send_password_reset_email(to_email: str, code: str):
                     <!-- Reset Code Box -->
                     <div style="background-color: white; border: 2px solid #dc2626; border-radius: 8px; padding: 20px; text-align: center; margin: 25px 0;">
                         <p style="margin: 0; font-size: 12px; color: #6b7280; text-transform: uppercase;">Your Password Reset Code</p>
-                        <p style="margin: 10px 0 0 0; font-size: 36px; font-weight: bold; color: #dc2626; letter-spacing: 5px;">{code}</p>
+                        <p style="margin: 10px 0 0 0; font-size: 36px; font-weight: bold; color: #dc2626; letter-spacing: 5px;">$code</p>
                     </div>
                     
                     <p style="color: #6b7280; font-size: 14px;">This code will expire in 24 hours.</p>
@@ -533,88 +1005,1088 @@ def send_password_reset_email(to_email: str, code: str):
         </body>
     </html>
     """
-    
-    # Plain text fallback
-    text_body = f"Your NepSafe password reset code is: {code}\n\nThis code will expire in 24 hours.\n\n⚠️ If you did not request this, your account may be at risk. Please secure your account immediately."
 
-    if not smtp_host or not smtp_user or not smtp_pass:
-        # SMTP not configured; log the code so devs can copy it during development
-        logging.info(f"[SMTP Not Configured] Password reset code for {to_email}: {code}")
-        print(f"[SMTP Not Configured] Password reset code for {to_email}: {code}")
+_SOS_ALERT_HTML = """
+        <html>
+        <body style="font-family: Arial; padding: 20px;">
+            <div style="background: #DC143C; color: white; padding: 20px; border-radius: 8px;">
+                <h1>🚨 EMERGENCY SOS ALERT</h1>
+            </div>
+            <div style="padding: 20px; background: #f9f9f9; margin-top: 10px; border-radius: 8px;">
+                <h2>Emergency Details</h2>
+                <p><strong>Type:</strong> $emergency_type</p>
+                <p><strong>Name:</strong> $user_name</p>
+                <p><strong>Email:</strong> $user_email</p>
+                <p><strong>Phone:</strong> $user_phone</p>
+                <p><strong>Message:</strong> $message</p>
+                <h2>📍 Location</h2>
+                <p><strong>Coordinates:</strong> $latitude, $longitude</p>
+                <p><a href="$google_maps_link" style="background: #003893; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px;">View on Google Maps</a></p>
+                <p><strong>Time:</strong> $created_at</p>
+            </div>
+        </body>
+        </html>
+"""
+
+# name -> (subject, plain text, html); values are HTML-escaped before filling the html part
+MAIL_TEMPLATES = {
+    "verification": (
+        Template("🔐 Verify Your NepSafe Email"),
+        Template("Your NepSafe verification code is: $code\n\nThis code will expire in 24 hours.\n\nIf you didn't create this account, please ignore this email."),
+        Template(_VERIFICATION_HTML),
+    ),
+    "password_reset": (
+        Template("🔐 Reset Your NepSafe Password"),
+        Template("Your NepSafe password reset code is: $code\n\nThis code will expire in 24 hours.\n\n⚠️ If you did not request this, your account may be at risk. Please secure your account immediately."),
+        Template(_PASSWORD_RESET_HTML),
+    ),
+    "sos_alert": (
+        Template("🚨 EMERGENCY SOS ALERT - $emergency_label"),
+        Template("SOS Alert from $user_name at $google_maps_link"),
+        Template(_SOS_ALERT_HTML),
+    ),
+}
+
+def render_email(template: str, context: dict) -> tuple:
+    """Return (subject, text, html) for a named template."""
+    subject, text, html = MAIL_TEMPLATES[template]
+    escaped = {key: escape(str(value)) for key, value in context.items()}
+    return subject.substitute(context), text.substitute(context), html.substitute(escaped)
+
+class SMTPPool:
+    """Up to `size` concurrent SMTP connections, kept open and reused between messages."""
+
+    def __init__(self, size: int, idle_seconds: float):
+        self.idle_seconds = idle_seconds
+        self._slots = asyncio.Semaphore(size)
+        self._idle: list = []
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(
+            hostname=SMTP_HOST, port=SMTP_PORT, start_tls=SMTP_STARTTLS, timeout=MAIL_SEND_TIMEOUT_SECONDS
+        )
+        await smtp.connect()
+        if SMTP_USER and SMTP_PASS:
+            await smtp.login(SMTP_USER, SMTP_PASS)
+        MAIL_METRICS["connections_opened"] += 1
+        return smtp
+
+    async def _discard(self, smtp: aiosmtplib.SMTP) -> None:
+        try:
+            if smtp.is_connected:
+                await smtp.quit()
+        except (aiosmtplib.SMTPException, OSError):
+            smtp.close()
+
+    async def send(self, message: EmailMessage) -> None:
+        async with self._slots:
+            smtp, reused = None, False
+            while self._idle and smtp is None:
+                candidate, last_used = self._idle.pop()
+                if candidate.is_connected and time.monotonic() - last_used < self.idle_seconds:
+                    smtp, reused = candidate, True
+                else:
+                    await self._discard(candidate)
+            if smtp is None:
+                smtp = await self._connect()
+            try:
+                await smtp.send_message(message)
+            except aiosmtplib.SMTPServerDisconnected:
+                # The server closed a pooled connection while it sat idle; retry once on a new one
+                await self._discard(smtp)
+                if not reused:
+                    raise
+                smtp = await self._connect()
+                try:
+                    await smtp.send_message(message)
+                except BaseException:
+                    await self._discard(smtp)
+                    raise
+            except BaseException:
+                await self._discard(smtp)
+                raise
+            self._idle.append((smtp, time.monotonic()))
+
+    async def reap(self) -> None:
+        """Close connections that have been idle longer than idle_seconds."""
+        now = time.monotonic()
+        expired = [smtp for smtp, last_used in self._idle if now - last_used >= self.idle_seconds]
+        self._idle = [(smtp, last_used) for smtp, last_used in self._idle if now - last_used < self.idle_seconds]
+        for smtp in expired:
+            await self._discard(smtp)
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for smtp, _ in idle:
+            await self._discard(smtp)
+
+mail_pool = SMTPPool(MAIL_POOL_SIZE, MAIL_IDLE_SECONDS)
+_mail_wakeup = asyncio.Event()
+
+def _header_value(value: str) -> str:
+    # EmailMessage rejects CR/LF in headers; fold them so user-supplied text can never break a send
+    return " ".join(str(value).splitlines()).strip()
+
+def build_email(to_email: str, subject: str, text_body: str, html_body: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg['Subject'] = _header_value(subject)
+    msg['From'] = EMAIL_FROM
+    msg['To'] = _header_value(to_email)
+    msg.set_content(text_body)
+    msg.add_alternative(html_body, subtype='html')
+    return msg
+
+async def enqueue_email(template: str, to_email: str, context: dict) -> None:
+    """Render a message and add it to the outbox. Without SMTP_HOST the message is only logged."""
+    subject, text_body, html_body = render_email(template, context)
+    if not SMTP_HOST:
+        # SMTP not configured; log the message so devs can copy codes during development
+        logging.info(f"[SMTP Not Configured] {subject} for {to_email}: {text_body}")
+        print(f"[SMTP Not Configured] {subject} for {to_email}: {text_body}")
         return
 
+    now = datetime.now(timezone.utc)
+    await db.mail_outbox.insert_one({
+        "id": str(uuid.uuid4()),
+        "template": template,
+        "to": to_email,
+        "subject": subject,
+        "text": text_body,
+        "html": html_body,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    })
+    MAIL_METRICS["queued"] += 1
+    _mail_wakeup.set()
+
+async def send_verification_email(to_email: str, code: str):
+    """Queue the HTML verification email with the code."""
+    await enqueue_email("verification", to_email, {"code": code})
+
+async def send_password_reset_email(to_email: str, code: str):
+    """Queue the HTML password reset email with the code."""
+    await enqueue_email("password_reset", to_email, {"code": code})
+
+async def _claim_mail() -> Optional[dict]:
+    now = datetime.now(timezone.utc)
+    return await db.mail_outbox.find_one_and_update(
+        {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "claimed_at": {"$lt": now - timedelta(seconds=MAIL_LEASE_SECONDS)}},
+        ]},
+        {"$set": {"status": "sending", "claimed_at": now, "claimed_by": WORKER_ID}, "$inc": {"attempts": 1}},
+        sort=[("next_attempt_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def deliver_mail(job: dict) -> bool:
+    """Send one outbox message, rescheduling it with backoff on failure. Returns True when sent."""
     try:
-        msg = EmailMessage()
-        msg['Subject'] = subject
-        msg['From'] = email_from
-        msg['To'] = to_email
-        msg.set_content(text_body)
-        msg.add_alternative(html_body, subtype='html')
-
-        with smtplib.SMTP(smtp_host, smtp_port, timeout=10) as server:
-            server.starttls()
-            server.login(smtp_user, smtp_pass)
-            server.send_message(msg)
-        logging.info(f"Password reset email sent successfully to {to_email}")
-        print(f"✓ Password reset email sent to {to_email}")
+        await mail_pool.send(build_email(job["to"], job["subject"], job["text"], job["html"]))
+    except (aiosmtplib.SMTPException, OSError) as e:
+        attempts = job["attempts"]
+        if attempts >= MAIL_MAX_ATTEMPTS:
+            MAIL_METRICS["failed"] += 1
+            logging.error(f"[MAIL] Giving up on {job['template']} to {job['to']} after {attempts} attempts: {str(e)}")
+            update = {"status": "failed", "last_error": str(e)}
+        else:
+            MAIL_METRICS["retried"] += 1
+            delay = min(MAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1), MAIL_RETRY_MAX_SECONDS)
+            delay *= random.uniform(0.8, 1.2)
+            logging.warning(f"[MAIL] {job['template']} to {job['to']} failed, retrying in {delay:.0f}s: {str(e)}")
+            update = {
+                "status": "pending",
+                "last_error": str(e),
+                "next_attempt_at": datetime.now(timezone.utc) + timedelta(seconds=delay),
+            }
+        await db.mail_outbox.update_one({"id": job["id"]}, {"$set": update})
+        return False
     except Exception as e:
-        logging.error(f"Failed to send password reset email to {to_email}: {str(e)}")
-        print(f"✗ Failed to send password reset email to {to_email}: {str(e)}")
+        # Anything else means the message itself is broken; retrying it would fail the same way
+        MAIL_METRICS["failed"] += 1
+        logging.exception(f"[MAIL] Dropping malformed {job.get('template')} message {job['id']}: {e!r}")
+        await db.mail_outbox.update_one({"id": job["id"]}, {"$set": {"status": "failed", "last_error": repr(e)}})
+        return False
+
+    MAIL_METRICS["sent"] += 1
+    await db.mail_outbox.update_one(
+        {"id": job["id"]},
+        {"$set": {"status": "sent", "sent_at": datetime.now(timezone.utc)}, "$unset": {"html": "", "text": ""}}
+    )
+    logging.info(f"[MAIL] Sent {job['template']} to {job['to']}")
+    return True
+
+async def run_mail_outbox() -> int:
+    """Deliver due messages until none are left, MAIL_POOL_SIZE at a time. Returns messages sent."""
+    async def sender() -> int:
+        sent = 0
+        while (job := await _claim_mail()) is not None:
+            sent += await deliver_mail(job)
+        return sent
+    # One sender failing (e.g. Mongo unreachable) must not cancel or orphan the others
+    results = await asyncio.gather(*(sender() for _ in range(MAIL_POOL_SIZE)), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logging.error(f"[MAIL] Sender error: {result!r}")
+    return sum(result for result in results if isinstance(result, int))
+
+async def mail_worker_loop() -> None:
+    while True:
+        try:
+            await run_mail_outbox()
+            await mail_pool.reap()
+        except Exception as e:
+            # This is the only mail worker in the process; it has to survive anything
+            logging.exception(f"[MAIL] Worker error: {str(e)}")
+        # Woken immediately by local enqueues; the timeout picks up retries and other workers' mail
+        try:
+            await asyncio.wait_for(_mail_wakeup.wait(), timeout=MAIL_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _mail_wakeup.clear()
+
+@api_router.get("/admin/mail-metrics")
+async def get_mail_metrics(admin_id: str = Depends(get_admin_user)):
+    rows = await db.mail_outbox.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]).to_list(None)
+    return {
+        **MAIL_METRICS,
+        "configured": bool(SMTP_HOST),
+        "pool_size": MAIL_POOL_SIZE,
+        "outbox": {row["_id"]: row["count"] for row in rows},
+    }
 
+# ---- Local SMTP sink ----
+# `python server.py smtp-sink [port]` accepts mail on localhost with no TLS or auth and writes
+# each message to MAIL_SINK_DIR as an .eml file. Point SMTP_HOST/SMTP_PORT at it with
+# SMTP_STARTTLS=false to exercise the whole outbox path in development and tests.
+class SMTPSink:
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        writer.write(b"220 nepsafe-sink ESMTP\r\n")
+        mail_from, recipients = None, []
+        while line := await reader.readline():
+            command = line.decode("utf-8", "replace").strip()
+            verb = command[:4].upper()
+            if verb == "EHLO":
+                writer.write(b"250-nepsafe-sink\r\n250-8BITMIME\r\n250 SMTPUTF8\r\n")
+            elif verb == "HELO":
+                writer.write(b"250 nepsafe-sink\r\n")
+            elif verb == "MAIL":
+                mail_from, recipients = command[10:].strip(), []
+                writer.write(b"250 OK\r\n")
+            elif verb == "RCPT":
+                recipients.append(command[8:].strip())
+                writer.write(b"250 OK\r\n")
+            elif verb == "DATA":
+                writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                await writer.drain()
+                lines = []
+                while (data := await reader.readline()) not in (b".\r\n", b".\n", b""):
+                    lines.append(data[1:] if data.startswith(b".") else data)
+                path = self.directory / f"{time.time_ns()}-{uuid.uuid4().hex[:8]}.eml"
+                path.write_bytes(b"".join(lines))
+                logging.info(f"[SMTP SINK] {mail_from} -> {', '.join(recipients)} saved to {path.name}")
+                writer.write(b"250 OK\r\n")
+            elif verb == "RSET":
+                mail_from, recipients = None, []
+                writer.write(b"250 OK\r\n")
+            elif verb == "NOOP":
+                writer.write(b"250 OK\r\n")
+            elif verb == "QUIT":
+                writer.write(b"221 Bye\r\n")
+                await writer.drain()
+                break
+            else:
+                writer.write(b"502 Command not implemented\r\n")
+            await writer.drain()
+        writer.close()
+
+async def run_smtp_sink(host: str = "127.0.0.1", port: int = 1025) -> None:
+    MAIL_SINK_DIR.mkdir(parents=True, exist_ok=True)
+    server = await asyncio.start_server(SMTPSink(MAIL_SINK_DIR).handle, host, port)
+    logging.info(f"[SMTP SINK] Listening on {host}:{port}, writing to {MAIL_SINK_DIR}")
+    async with server:
+        await server.serve_forever()
+
+# ==================== BLOB STORAGE ====================
+# Uploaded images and documents live on disk, addressed by the SHA-256 of their bytes.
+# Documents only keep the blob URL. Images are public and served by GET /api/blobs/{key};
+# permit documents (passport scans) live in a separate store that route cannot read and are
+# only served to the applicant and admins by GET /api/permits/{permit_id}/document.
+BLOB_STORAGE_DIR = Path(os.environ.get("BLOB_STORAGE_DIR", str(ROOT_DIR / "blob_storage")))
+DOCUMENT_STORAGE_DIR = Path(os.environ.get("DOCUMENT_STORAGE_DIR", str(ROOT_DIR / "document_storage")))
+# Public origin of this API, e.g. https://api.example.com. Leave empty to store relative URLs.
+BLOB_PUBLIC_BASE_URL = os.environ.get("BLOB_PUBLIC_BASE_URL", "").rstrip("/")
+BLOB_CHUNK_SIZE = 64 * 1024
+BLOB_KEY_RE = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]{1,8}$")
+
+# Magic-number signatures for the formats we accept; the client-declared type is only a fallback
+_BLOB_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"%PDF-", "application/pdf"),
+]
+
+def sniff_content_type(data: bytes, declared: Optional[str] = None) -> str:
+    """Detect the real content type from the leading bytes, falling back to the declared one."""
+    for signature, content_type in _BLOB_SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return declared or "application/octet-stream"
+
+def _extension_for(content_type: str) -> str:
+    if content_type == "image/jpeg":
+        return "jpg"
+    ext = mimetypes.guess_extension(content_type) or ".bin"
+    return ext.lstrip(".")
+
+class LocalBlobStore:
+    """Content-addressed blob store on the local filesystem.
+
+    Keys are "<sha256>.<ext>", so identical uploads are stored once and the
+    content type can be recovered from the key without a metadata lookup.
+    """
 
-def create_access_token(user_id: str, role: str) -> str:
-    """Create JWT access token for authentication"""
-    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode = {"sub": user_id, "role": role, "exp": expire}
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    def __init__(self, root: Path):
+        self.root = root
+
+    def path_for(self, key: str) -> Path:
+        return self.root / key[:2] / key[2:4] / key
+
+    def exists(self, key: str) -> bool:
+        return self.path_for(key).is_file()
+
+    def put(self, data: bytes, content_type: str) -> str:
+        key = f"{hashlib.sha256(data).hexdigest()}.{_extension_for(content_type)}"
+        path = self.path_for(key)
+        if path.is_file():
+            return key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so concurrent readers never see a partial file
+        tmp_path = path.with_name(f"{key}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return key
+
+    def put_file(self, source, declared_type: Optional[str], max_bytes: int) -> str:
+        """Copy a file object into the store in chunks, hashing as it goes.
+
+        Memory use is one chunk regardless of the file size. Raises ValueError once more than
+        `max_bytes` have been read; the partial temp file is removed.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.root / f"upload.{uuid.uuid4().hex}.tmp"
+        digest = hashlib.sha256()
+        content_type = None
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                while True:
+                    chunk = source.read(BLOB_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if content_type is None:
+                        content_type = sniff_content_type(chunk, declared_type)
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ValueError(f"File exceeds {max_bytes} bytes")
+                    digest.update(chunk)
+                    f.write(chunk)
+            key = f"{digest.hexdigest()}.{_extension_for(content_type or declared_type or 'application/octet-stream')}"
+            path = self.path_for(key)
+            if path.is_file():
+                tmp_path.unlink()
+            else:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_path, path)
+            return key
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    def iter_range(self, key: str, start: int, length: int):
+        with open(self.path_for(key), "rb") as f:
+            f.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = f.read(min(BLOB_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+blob_store = LocalBlobStore(BLOB_STORAGE_DIR)
+document_store = LocalBlobStore(DOCUMENT_STORAGE_DIR)
+
+def blob_url(key: str) -> str:
+    return f"{BLOB_PUBLIC_BASE_URL}/api/blobs/{key}"
+
+async def store_blob(data: bytes, declared_type: Optional[str] = None) -> str:
+    """Store bytes in the blob store (off the event loop) and return the public URL."""
+    content_type = sniff_content_type(data, declared_type)
+    key = await run_in_threadpool(blob_store.put, data, content_type)
+    return blob_url(key)
+
+def upload_limit(name: str) -> tuple:
+    """(max bytes per file, max files) for an UPLOAD_LIMITS entry."""
+    _, _, max_bytes, max_files = UPLOAD_LIMITS[name]
+    return max_bytes, max_files
+
+def check_upload_count(files: list, limit_name: str) -> None:
+    _, max_files = upload_limit(limit_name)
+    if len(files) > max_files:
+        raise HTTPException(status_code=400, detail=f"Too many files (max {max_files})")
+
+def permit_document_url(permit_id: str) -> str:
+    return f"{BLOB_PUBLIC_BASE_URL}/api/permits/{permit_id}/document"
+
+async def store_upload(upload: UploadFile, limit_name: str, store: LocalBlobStore = blob_store) -> str:
+    """Copy an uploaded file into a blob store in chunks and return its key.
+
+    Starlette has already spooled the upload by now; oversized files were cut off while the body
+    was received (MultipartLimiter), and the size check in put_file is only a backstop.
+    """
+    max_bytes, _ = upload_limit(limit_name)
+    await upload.seek(0)
+    try:
+        return await run_in_threadpool(store.put_file, upload.file, upload.content_type, max_bytes)
+    except ValueError:
+        raise HTTPException(status_code=413, detail=f"File too large (max {max_bytes} bytes)")
+
+def _parse_range(range_header: str, size: int):
+    """Parse a single 'bytes=start-end' range. Returns (start, end) inclusive, or None if unsatisfiable."""
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+    if not match or (not match.group(1) and not match.group(2)):
+        return None
+    if not match.group(1):
+        # Suffix range: last N bytes
+        length = int(match.group(2))
+        if length == 0:
+            return None
+        return max(size - length, 0), size - 1
+    start = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) else size - 1
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+def blob_response(store: LocalBlobStore, key: str, request: Request, cache_control: str) -> Response:
+    """Stream a stored blob with ETag and single-range support."""
+    etag = f'"{key.split(".")[0]}"'
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": cache_control}
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    size = store.path_for(key).stat().st_size
+    media_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+    range_header = request.headers.get("range")
+    if range_header and request.headers.get("if-range", etag) == etag:
+        byte_range = _parse_range(range_header, size)
+        if byte_range is None:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(store.iter_range(key, start, end - start + 1), status_code=206, media_type=media_type, headers=headers)
+
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(store.iter_range(key, 0, size), media_type=media_type, headers=headers)
+
+@api_router.get("/blobs/{key}")
+async def get_blob(key: str, request: Request):
+    """Serve a public blob (uploaded images)."""
+    if not BLOB_KEY_RE.match(key) or not blob_store.exists(key):
+        raise HTTPException(status_code=404, detail="Blob not found")
+    # Content-addressed: the bytes behind a key never change. Only images may sit in shared caches.
+    if (mimetypes.guess_type(key)[0] or "").startswith("image/"):
+        cache_control = "public, max-age=31536000, immutable"
+    else:
+        cache_control = "private, no-store"
+    return blob_response(blob_store, key, request, cache_control)
 
-async def log_admin_action(
-    admin_id: str,
-    action: str,
-    entity_type: str,
-    entity_id: Optional[str] = None,
-    before: Optional[dict] = None,
-    after: Optional[dict] = None
-) -> None:
-    log_record = {
-        "id": str(uuid.uuid4()),
-        "admin_id": admin_id,
-        "action": action,
-        "entity_type": entity_type,
-        "entity_id": entity_id,
-        "before": before,
-        "after": after,
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    await db.admin_audit_logs.insert_one(log_record)
+@api_router.get("/permits/{permit_id}/document")
+async def get_permit_document(permit_id: str, request: Request, current_user: dict = Depends(get_current_user)):
+    """Serve a permit's uploaded document to its applicant or an admin."""
+    query = {"id": permit_id}
+    if current_user["role"] != "admin":
+        query["user_id"] = current_user["user_id"]
+    permit = await db.permits.find_one(query, {"_id": 0, "document_key": 1})
+    key = (permit or {}).get("document_key")
+    if not key or not BLOB_KEY_RE.match(key) or not document_store.exists(key):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return blob_response(document_store, key, request, "private, no-store")
+
+# ==================== IMAGE PROCESSING ====================
+# Uploaded images are decoded, EXIF-stripped and re-encoded into fixed-size variants.
+# Pillow work runs in a process pool so decoding large photos never blocks the event loop.
+IMAGE_ALLOWED_FORMATS = {"JPEG", "PNG", "WEBP", "GIF"}
+IMAGE_VARIANT_SIZES = {"thumb": 320, "card": 800, "full": 1920}
+IMAGE_OUTPUT_FORMAT = os.environ.get("IMAGE_OUTPUT_FORMAT", "WEBP").upper()  # WEBP or JPEG
+IMAGE_OUTPUT_QUALITY = int(os.environ.get("IMAGE_OUTPUT_QUALITY", "82"))
+IMAGE_PROCESS_WORKERS = int(os.environ.get("IMAGE_PROCESS_WORKERS", "2"))
+
+_image_pool: Optional[ProcessPoolExecutor] = None
+
+def render_image_variants(source, output_format: str, quality: int) -> dict:
+    """Decode an upload (bytes or a file path) and return {variant_name: encoded_bytes}.
+    Runs in a worker process."""
+    with Image.open(BytesIO(source) if isinstance(source, bytes) else source) as original:
+        if original.format not in IMAGE_ALLOWED_FORMATS:
+            raise ValueError(f"Unsupported image format: {original.format}")
+        if original.format == "JPEG":
+            # Let the JPEG decoder downscale while decoding instead of materialising every pixel
+            largest = max(IMAGE_VARIANT_SIZES.values())
+            original.draft("RGB", (largest, largest))
+        # Apply the EXIF orientation, then drop all metadata by re-encoding without it
+        img = ImageOps.exif_transpose(original)
+        has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+        img = img.convert("RGBA" if has_alpha and output_format != "JPEG" else "RGB")
+
+        variants = {}
+        for name, max_side in IMAGE_VARIANT_SIZES.items():
+            variant = img.copy()
+            variant.thumbnail((max_side, max_side), Image.LANCZOS)
+            out = BytesIO()
+            variant.save(out, format=output_format, quality=quality)
+            variants[name] = out.getvalue()
+    return variants
+
+def _get_image_pool() -> ProcessPoolExecutor:
+    global _image_pool
+    if _image_pool is None:
+        _image_pool = ProcessPoolExecutor(max_workers=IMAGE_PROCESS_WORKERS)
+    return _image_pool
+
+async def _render_in_pool(path: str) -> dict:
+    """Run render_image_variants in the process pool. A worker that dies (e.g. killed for memory)
+    breaks the whole executor, so it is replaced and the image tried once more on a fresh one."""
+    global _image_pool
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        pool = _get_image_pool()
+        try:
+            return await loop.run_in_executor(pool, render_image_variants, path, IMAGE_OUTPUT_FORMAT, IMAGE_OUTPUT_QUALITY)
+        except BrokenProcessPool:
+            if _image_pool is pool:
+                _image_pool = None
+                pool.shutdown(wait=False, cancel_futures=True)
+            logging.error(f"[IMAGES] Image worker died, pool recreated (attempt {attempt + 1})")
+            if attempt:
+                raise
+
+def _spool_upload_to_disk(source, max_bytes: int) -> Path:
+    """Copy an upload to a temp file in chunks so the worker process can open it by path."""
+    BLOB_STORAGE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = BLOB_STORAGE_DIR / f"image.{uuid.uuid4().hex}.tmp"
+    size = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            while chunk := source.read(BLOB_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError(f"File exceeds {max_bytes} bytes")
+                f.write(chunk)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return tmp_path
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+async def store_image_variants(upload: UploadFile, limit_name: str) -> dict:
+    """Process an uploaded image and store every variant. Returns {variant_name: blob_url}.
+
+    The upload is streamed to a temp file with the size checked as it is copied; only the
+    encoded variants, whose size is bounded by IMAGE_VARIANT_SIZES, come back into memory.
+    """
+    max_bytes, _ = upload_limit(limit_name)
+    await upload.seek(0)
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        role: str = payload.get("role", "user")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return {"user_id": user_id, "role": role}
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+        tmp_path = await run_in_threadpool(_spool_upload_to_disk, upload.file, max_bytes)
+    except ValueError:
+        raise HTTPException(status_code=413, detail=f"File too large (max {max_bytes} bytes)")
 
-async def get_admin_user(current_user: dict = Depends(get_current_user)) -> str:
-    if current_user["role"] != "admin":
-        raise HTTPException(status_code=403, detail="Admin access required")
-    return current_user["user_id"]
+    try:
+        variants = await _render_in_pool(str(tmp_path))
+    except (ValueError, OSError, Image.DecompressionBombError, BrokenProcessPool) as e:
+        logging.warning(f"[IMAGES] Rejected upload: {str(e)}")
+        raise HTTPException(status_code=400, detail="Unsupported or corrupt image")
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    content_type = "image/jpeg" if IMAGE_OUTPUT_FORMAT == "JPEG" else f"image/{IMAGE_OUTPUT_FORMAT.lower()}"
+    return {name: await store_blob(encoded, content_type) for name, encoded in variants.items()}
+
+def use_thumbnails(doc: dict) -> dict:
+    """Swap full-size image URLs for their thumbnails in list responses."""
+    if doc.get("thumbnail_url"):
+        doc["image_url"] = doc["thumbnail_url"]
+    if doc.get("image_thumbnails"):
+        doc["images"] = doc["image_thumbnails"]
+    if doc.get("profile_thumbnail_url"):
+        doc["profile_picture"] = doc["profile_thumbnail_url"]
+    return doc
+
+# ==================== LIST PROJECTIONS ====================
+# List routes return a compact summary by default, projected inside Mongo so heavy
+# fields never leave the database. Clients can pick other fields with ?fields=a,b,c;
+# detail routes remain the place to get complete documents.
+SUMMARY_TEXT_LENGTH = 200
+
+def _truncated(field: str) -> dict:
+    """Projection expression that keeps only the first SUMMARY_TEXT_LENGTH characters of a text field."""
+    return {"$cond": [
+        {"$eq": [{"$type": f"${field}"}, "string"]},
+        {"$substrCP": [f"${field}", 0, SUMMARY_TEXT_LENGTH]},
+        f"${field}"
+    ]}
+
+SOS_ALERT_FIELDS = {
+    "id", "latitude", "longitude", "user_name", "user_email", "user_phone", "emergency_type",
+    "message", "status", "admin_note", "created_at", "resolved_at", "google_maps_link"
+}
+USER_LIST_FIELDS = set(User.model_fields)
+
+LIST_PROJECTIONS = {
+    "hotels": {
+        "allowed": set(Hotel.model_fields),
+        "summary": {
+            **{f: 1 for f in Hotel.model_fields if f not in ("description", "images", "image_thumbnails")},
+            "description": _truncated("description"),
+            "image_count": {"$size": {"$ifNull": ["$images", []]}},
+        },
+    },
+    "tourist_spots": {
+        "allowed": set(TouristSpot.model_fields),
+        "summary": {
+            **{f: 1 for f in TouristSpot.model_fields if f not in ("description", "attractions")},
+            "description": _truncated("description"),
+            "attractions": _truncated("attractions"),
+        },
+    },
+    "permits": {
+        # Passport scans are only returned by the permit detail route
+        "allowed": set(Permit.model_fields) - {"document_data"},
+        "summary": {f: 1 for f in Permit.model_fields if f != "document_data"},
+    },
+    "bookings": {
+        "allowed": set(Booking.model_fields),
+        "summary": {f: 1 for f in Booking.model_fields},
+    },
+    "users": {
+        "allowed": USER_LIST_FIELDS,
+        "summary": {f: 1 for f in USER_LIST_FIELDS},
+    },
+    "sos_alerts": {
+        "allowed": SOS_ALERT_FIELDS,
+        "summary": {f: 1 for f in SOS_ALERT_FIELDS},
+    },
+}
+
+# Requesting an image field also brings its thumbnail so use_thumbnails() can swap it in
+_COMPANION_FIELDS = {
+    "image_url": "thumbnail_url",
+    "images": "image_thumbnails",
+    "profile_picture": "profile_thumbnail_url",
+}
+
+def list_projection(resource: str, fields: Optional[str] = None) -> dict:
+    """Build the Mongo projection for a list route from its summary or a ?fields= selection."""
+    spec = LIST_PROJECTIONS[resource]
+    if not fields:
+        return {"_id": 0, "id": 1, **spec["summary"]}
+
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = sorted(set(requested) - spec["allowed"])
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown or unavailable fields: {', '.join(unknown)}")
+
+    projection = {"_id": 0, "id": 1}
+    for field in requested:
+        projection[field] = 1
+        companion = _COMPANION_FIELDS.get(field)
+        if companion and companion in spec["allowed"]:
+            projection[companion] = 1
+    return projection
+
+# ==================== PAGINATION ====================
+# Keyset pagination: each page continues strictly after the (sort value, id) of the last
+# item of the previous page, so deep pages cost the same as the first. The opaque cursor
+# for the next page is returned in the X-Next-Cursor header; list bodies stay plain arrays.
+PAGE_MAX_LIMIT = 1000
+
+def encode_cursor(sort_value, item_id: str) -> str:
+    if isinstance(sort_value, datetime):
+        sort_value = {"$date": sort_value.isoformat()}
+    raw = json.dumps([sort_value, item_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, item_id = json.loads(raw)
+        if isinstance(sort_value, dict):
+            sort_value = datetime.fromisoformat(sort_value["$date"])
+        return sort_value, str(item_id)
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def paginate(
+    collection,
+    query: dict,
+    projection: dict,
+    response: Response,
+    limit: int,
+    cursor: Optional[str] = None,
+    sort_field: str = "created_at",
+    direction: int = DESCENDING,
+    collation: Optional[Collation] = None
+) -> list:
+    """Fetch one page of `collection` ordered by (sort_field, id) and set X-Next-Cursor if more remain."""
+    limit = max(1, min(limit, PAGE_MAX_LIMIT))
+    if cursor:
+        last_value, last_id = decode_cursor(cursor)
+        op = "$lt" if direction == DESCENDING else "$gt"
+        query = {"$and": [query, {"$or": [
+            {sort_field: {op: last_value}},
+            {sort_field: last_value, "id": {op: last_id}}
+        ]}]}
+
+    # The cursor is built from these two fields, so they must be in the page
+    projection = {**projection, sort_field: 1, "id": 1}
+    docs = await collection.find(query, projection, collation=collation).sort(
+        [(sort_field, direction), ("id", direction)]
+    ).limit(limit + 1).to_list(limit + 1)
+
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.get(sort_field), last["id"])
+    return docs
+
+# ==================== REFERENCE CACHE ====================
+# Permit types, emergency contacts, safety tips and the public tourist-spot list only change
+# through admin routes, so each response is rendered once to JSON bytes with a strong ETag and
+# served from memory until invalidated. Writers call invalidate_reference, which drops the local
+# copy and bumps the collection's counter in reference_versions; every worker polls those
+# counters and drops its copy when one moves. If-None-Match on a cached response gets a 304
+# without touching Mongo.
+REFERENCE_COLLECTIONS = ("permit_types", "emergency_contacts", "safety_tips", "tourist_spots")
+REFERENCE_CACHE_MAX_VARIANTS = int(os.environ.get("REFERENCE_CACHE_MAX_VARIANTS", "64"))
+REFERENCE_CACHE_POLL_SECONDS = float(os.environ.get("REFERENCE_CACHE_POLL_SECONDS", "5"))
+
+class ReferenceCache:
+    """Rendered responses per collection, keyed by query string, with an LRU bound per collection."""
+
+    def __init__(self, names: tuple, max_variants: int):
+        self.max_variants = max_variants
+        self.entries = {name: OrderedDict() for name in names}
+        self.versions = {name: None for name in names}
+        # Bumped on every drop so a render that started before an invalidation is not stored
+        self.generations = {name: 0 for name in names}
+
+    def get(self, name: str, variant: str) -> Optional[tuple]:
+        entries = self.entries[name]
+        entry = entries.get(variant)
+        if entry is not None:
+            entries.move_to_end(variant)
+        return entry
+
+    def put(self, name: str, variant: str, entry: tuple, generation: int) -> None:
+        if generation != self.generations[name]:
+            return
+        entries = self.entries[name]
+        entries[variant] = entry
+        while len(entries) > self.max_variants:
+            entries.popitem(last=False)
+
+    def drop(self, name: str) -> None:
+        self.entries[name].clear()
+        self.generations[name] += 1
+
+    def sync(self, versions: dict) -> None:
+        for name in self.entries:
+            version = versions.get(name, 0)
+            if version != self.versions[name]:
+                self.drop(name)
+                self.versions[name] = version
+
+reference_cache = ReferenceCache(REFERENCE_COLLECTIONS, REFERENCE_CACHE_MAX_VARIANTS)
+
+async def invalidate_reference(name: str) -> None:
+    reference_cache.drop(name)
+    await db.reference_versions.update_one({"id": name}, {"$inc": {"version": 1}}, upsert=True)
+
+async def load_reference_versions() -> None:
+    docs = await db.reference_versions.find({}, {"_id": 0, "id": 1, "version": 1}).to_list(len(REFERENCE_COLLECTIONS))
+    reference_cache.sync({doc["id"]: doc["version"] for doc in docs})
+
+async def reference_versions_loop() -> None:
+    while True:
+        await asyncio.sleep(REFERENCE_CACHE_POLL_SECONDS)
+        try:
+            await load_reference_versions()
+        except PyMongoError as e:
+            logging.warning(f"[REFERENCE] Could not refresh cache versions: {str(e)}")
+
+def render_models(model, docs: list) -> bytes:
+    """Validate documents against `model` and serialize them, as response_model would."""
+    adapter = TypeAdapter(List[model])
+    return adapter.dump_json(adapter.validate_python(docs))
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return "*" in tags or etag in tags
+
+async def reference_response(request: Request, name: str, render) -> Response:
+    """Serve a cached reference response, calling `render` for (body, headers) on a miss."""
+    variant = str(request.query_params)
+    entry = reference_cache.get(name, variant)
+    if entry is None:
+        generation = reference_cache.generations[name]
+        body, headers = await render()
+        entry = (body, f'"{hashlib.sha256(body).hexdigest()[:32]}"', headers)
+        reference_cache.put(name, variant, entry, generation)
+
+    body, etag, headers = entry
+    headers = {**headers, "ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# ==================== DASHBOARD STATS ====================
+# Dashboard counters are computed with one $group pass per collection, run concurrently.
+# With STATS_MATERIALIZED=true the admin dashboard instead reads a single stats document
+# that write handlers keep current with $inc; it is rebuilt from scratch when missing.
+STATS_MATERIALIZED = os.environ.get("STATS_MATERIALIZED", "false").lower() == "true"
+STATS_DOC_ID = "dashboard"
+
+PERMIT_STATUS_COUNTERS = {"pending": "pending_permits", "approved": "approved_permits", "rejected": "rejected_permits"}
+BOOKING_STATUS_COUNTERS = {"confirmed": "confirmed_bookings", "cancelled": "cancelled_bookings"}
+HOTEL_STATUS_COUNTERS = {"pending": "pending_hotels", "approved": "approved_hotels", "rejected": "rejected_hotels"}
+USER_ROLE_COUNTERS = {"user": "total_users", "hotel_owner": "total_hotel_owners"}
+
+# Hotels created before the approval workflow have no approval_status and count as approved
+_HOTEL_APPROVED = {"$eq": [{"$ifNull": ["$approval_status", "approved"]}, "approved"]}
+
+async def count_where(collection, conditions: dict, match: Optional[dict] = None) -> dict:
+    """Count documents satisfying each aggregation condition in a single $group pass."""
+    pipeline = [{"$match": match}] if match else []
+    pipeline.append({"$group": {
+        "_id": None,
+        **{name: {"$sum": {"$cond": [expr, 1, 0]}} for name, expr in conditions.items()}
+    }})
+    rows = await collection.aggregate(pipeline).to_list(1)
+    row = rows[0] if rows else {}
+    return {name: row.get(name, 0) for name in conditions}
+
+async def compute_admin_stats() -> dict:
+    users, bookings, permits, hotels, total_tourist_spots = await asyncio.gather(
+        count_where(db.users, {
+            "total_users": {"$eq": ["$role", "user"]},
+            "total_hotel_owners": {"$eq": ["$role", "hotel_owner"]},
+            "banned_users": {"$eq": ["$is_banned", True]},
+        }),
+        count_where(db.bookings, {
+            "total_bookings": True,
+            "confirmed_bookings": {"$eq": ["$status", "confirmed"]},
+            "cancelled_bookings": {"$eq": ["$status", "cancelled"]},
+        }),
+        count_where(db.permits, {
+            "total_permits": True,
+            "pending_permits": {"$eq": ["$status", "pending"]},
+            "approved_permits": {"$eq": ["$status", "approved"]},
+            "rejected_permits": {"$eq": ["$status", "rejected"]},
+        }),
+        count_where(db.hotels, {
+            "total_hotels": True,
+            "pending_hotels": {"$eq": ["$approval_status", "pending"]},
+            "approved_hotels": _HOTEL_APPROVED,
+            "rejected_hotels": {"$eq": ["$approval_status", "rejected"]},
+        }),
+        db.tourist_spots.count_documents({})
+    )
+    return {**users, **bookings, **permits, **hotels, "total_tourist_spots": total_tourist_spots}
+
+async def rebuild_materialized_stats() -> dict:
+    stats = await compute_admin_stats()
+    await db.stats.replace_one(
+        {"id": STATS_DOC_ID},
+        {"id": STATS_DOC_ID, **stats, "rebuilt_at": datetime.now(timezone.utc).isoformat()},
+        upsert=True
+    )
+    return stats
 
-async def get_hotel_owner(current_user: dict = Depends(get_current_user)) -> str:
-    if current_user["role"] != "hotel_owner":
-        raise HTTPException(status_code=403, detail="Hotel owner access required")
-    return current_user["user_id"]
+async def bump_stats(changes: dict) -> None:
+    """Apply counter deltas to the materialized stats document (no-op unless enabled)."""
+    changes = {k: v for k, v in changes.items() if v}
+    if not STATS_MATERIALIZED or not changes:
+        return
+    try:
+        # No upsert: if the document is missing the next dashboard read rebuilds it
+        await db.stats.update_one({"id": STATS_DOC_ID}, {"$inc": changes})
+    except PyMongoError as e:
+        logging.error(f"[STATS] Failed to update materialized stats: {str(e)}")
+
+def status_change(counters: dict, before: Optional[str], after: Optional[str]) -> dict:
+    """Counter deltas for a status transition, e.g. pending -> approved."""
+    changes = {}
+    if before in counters:
+        changes[counters[before]] = changes.get(counters[before], 0) - 1
+    if after in counters:
+        changes[counters[after]] = changes.get(counters[after], 0) + 1
+    return changes
+
+# ==================== DENORMALIZATION ====================
+# Bookings and permits keep copies of hotel and user fields so list pages need no joins.
+# When a source document changes, a job is queued in denorm_jobs; a background worker fans the
+# new values out with one update_many per target collection. Jobs for the same entity coalesce
+# while pending, so a burst of edits costs one fan-out.
+DENORMALIZED_COPIES = {
+    # source collection -> [(target collection, foreign key in target, {source field: copied field})]
+    "hotels": [
+        ("bookings", "hotel_id", {"name": "hotel_name"}),
+    ],
+    "users": [
+        ("bookings", "user_id", {"name": "user_name", "email": "user_email"}),
+        ("permits", "user_id", {"name": "user_name", "email": "user_email"}),
+    ],
+}
+DENORM_POLL_SECONDS = 5
+DENORM_JOB_LEASE_SECONDS = 5 * 60
+DENORM_METRICS = {"processed": 0, "failed": 0, "documents_updated": 0, "last_lag_ms": None, "max_lag_ms": 0.0}
+_denorm_wakeup = asyncio.Event()
+
+def denormalized_fields_changed(source: str, before: dict, changes: dict) -> bool:
+    watched = {field for _, _, mapping in DENORMALIZED_COPIES[source] for field in mapping}
+    return any(field in changes and changes[field] != before.get(field) for field in watched)
+
+async def enqueue_propagation(source: str, source_id: str) -> None:
+    """Queue a fan-out of `source`/`source_id` to its denormalized copies."""
+    await db.denorm_jobs.update_one(
+        {"source": source, "source_id": source_id, "status": "pending"},
+        {"$setOnInsert": {"id": str(uuid.uuid4()), "created_at": datetime.now(timezone.utc), "attempts": 0}},
+        upsert=True
+    )
+    _denorm_wakeup.set()
+
+async def propagate_entity(source: str, source_id: str) -> int:
+    """Copy the current field values of one source document into every target. Returns documents updated."""
+    doc = await db[source].find_one({"id": source_id}, {"_id": 0})
+    if not doc:
+        return 0
+    updated = 0
+    for target, foreign_key, mapping in DENORMALIZED_COPIES[source]:
+        values = {copied: doc.get(field) for field, copied in mapping.items()}
+        result = await db[target].update_many(
+            {foreign_key: source_id, "$or": [{copied: {"$ne": value}} for copied, value in values.items()]},
+            {"$set": values}
+        )
+        updated += result.modified_count
+    return updated
+
+async def _claim_denorm_job() -> Optional[dict]:
+    now = datetime.now(timezone.utc)
+    return await db.denorm_jobs.find_one_and_update(
+        {"$or": [
+            {"status": "pending"},
+            {"status": "running", "claimed_at": {"$lt": now - timedelta(seconds=DENORM_JOB_LEASE_SECONDS)}},
+        ]},
+        {"$set": {"status": "running", "claimed_at": now, "claimed_by": WORKER_ID}, "$inc": {"attempts": 1}},
+        sort=[("created_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def run_denorm_jobs() -> int:
+    """Process queued jobs until none are left. Returns the number of jobs processed."""
+    processed = 0
+    while (job := await _claim_denorm_job()) is not None:
+        try:
+            DENORM_METRICS["documents_updated"] += await propagate_entity(job["source"], job["source_id"])
+        except PyMongoError as e:
+            DENORM_METRICS["failed"] += 1
+            logging.error(f"[DENORM] {job['source']}/{job['source_id']} failed: {str(e)}")
+            await db.denorm_jobs.update_one({"id": job["id"]}, {"$set": {"status": "pending"}})
+            break
+        await db.denorm_jobs.delete_one({"id": job["id"]})
+        created_at = job["created_at"]
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        lag_ms = (datetime.now(timezone.utc) - created_at).total_seconds() * 1000
+        DENORM_METRICS["processed"] += 1
+        DENORM_METRICS["last_lag_ms"] = round(lag_ms, 1)
+        DENORM_METRICS["max_lag_ms"] = round(max(DENORM_METRICS["max_lag_ms"], lag_ms), 1)
+        processed += 1
+    return processed
+
+async def denorm_worker_loop() -> None:
+    while True:
+        try:
+            await run_denorm_jobs()
+        except PyMongoError as e:
+            logging.error(f"[DENORM] Worker error: {str(e)}")
+        # Woken immediately by local enqueues; the timeout picks up jobs queued by other workers
+        try:
+            await asyncio.wait_for(_denorm_wakeup.wait(), timeout=DENORM_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _denorm_wakeup.clear()
+
+async def check_denormalization(repair: bool = False) -> dict:
+    """Count copies that disagree with their source, per source/target pair.
+
+    With `repair=True` a propagation job is queued for every source with stale copies.
+    """
+    report = {}
+    for source, targets in DENORMALIZED_COPIES.items():
+        for target, foreign_key, mapping in targets:
+            pipeline = [
+                {"$lookup": {"from": source, "localField": foreign_key, "foreignField": "id", "as": "_source"}},
+                {"$unwind": "$_source"},
+                {"$match": {"$expr": {"$or": [
+                    {"$ne": [f"${copied}", f"$_source.{field}"]} for field, copied in mapping.items()
+                ]}}},
+                {"$group": {"_id": f"${foreign_key}", "documents": {"$sum": 1}}},
+            ]
+            stale = await db[target].aggregate(pipeline).to_list(None)
+            if repair:
+                for row in stale:
+                    await enqueue_propagation(source, row["_id"])
+            report[f"{source}->{target}"] = {
+                "stale_documents": sum(row["documents"] for row in stale),
+                "stale_sources": len(stale),
+            }
+    return report
+
+@api_router.get("/admin/denormalization")
+async def get_denormalization_status(admin_id: str = Depends(get_admin_user)):
+    oldest = await db.denorm_jobs.find_one({"status": "pending"}, {"_id": 0, "created_at": 1}, sort=[("created_at", ASCENDING)])
+    lag_ms = None
+    if oldest:
+        created_at = oldest["created_at"]
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        lag_ms = round((datetime.now(timezone.utc) - created_at).total_seconds() * 1000, 1)
+    return {
+        **DENORM_METRICS,
+        "pending_jobs": await db.denorm_jobs.count_documents({"status": "pending"}),
+        "oldest_pending_lag_ms": lag_ms,
+    }
 
 # ==================== AUTH ROUTES ====================
 @api_router.post("/auth/register", response_model=AuthResponse)
-async def register(user_input: UserRegister, background: BackgroundTasks):
+async def register(user_input: UserRegister):
     # Check if user exists
     existing_user = await db.users.find_one({"email": user_input.email})
     if existing_user:
@@ -625,7 +2097,7 @@ async def register(user_input: UserRegister, background: BackgroundTasks):
         raise HTTPException(status_code=400, detail="Invalid role. Use 'user' or 'hotel_owner'")
     
     # Hash password
-    hashed_password = bcrypt.hashpw(user_input.password.encode('utf-8'), bcrypt.gensalt())
+    hashed_password = await hash_password(user_input.password)
     
     # Generate verification code
     verification_code = generate_verification_code()
@@ -638,14 +2110,15 @@ async def register(user_input: UserRegister, background: BackgroundTasks):
         email_verified=False
     )
     user_dict = user.model_dump()
-    user_dict['password'] = hashed_password.decode('utf-8')
+    user_dict['password'] = hashed_password
     user_dict['verification_code'] = verification_code
     user_dict['created_at'] = user_dict['created_at'].isoformat()
     
     await db.users.insert_one(user_dict)
+    await bump_stats(status_change(USER_ROLE_COUNTERS, None, user.role))
     
-    # Send verification email in background (or log code if SMTP not configured)
-    background.add_task(send_verification_email, user_input.email, verification_code)
+    # Queue the verification email (or log the code if SMTP is not configured)
+    await send_verification_email(user_input.email, verification_code)
     
     # Create token
     token = create_access_token(user.id, user.role)
@@ -689,7 +2162,7 @@ async def verify_email(verify_data: VerifyEmail):
     return AuthResponse(token=token, user=user, verification_required=False)
 
 @api_router.post("/auth/resend-verification")
-async def resend_verification(email: dict, background: BackgroundTasks):
+async def resend_verification(email: dict):
     user_doc = await db.users.find_one({"email": email.get('email')})
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
@@ -703,11 +2176,11 @@ async def resend_verification(email: dict, background: BackgroundTasks):
         {"email": email.get('email')},
         {"$set": {"verification_code": verification_code}}
     )
-    background.add_task(send_verification_email, email.get('email'), verification_code)
+    await send_verification_email(email.get('email'), verification_code)
     return {"message": "Verification code sent"}
 
 @api_router.post("/auth/forgot-password")
-async def forgot_password(email: dict, background: BackgroundTasks):
+async def forgot_password(email: dict):
     """Send password reset code to email"""
     user_doc = await db.users.find_one({"email": email.get('email')})
     if not user_doc:
@@ -726,7 +2199,7 @@ async def forgot_password(email: dict, background: BackgroundTasks):
     )
     
     # Send reset email
-    background.add_task(send_password_reset_email, email.get('email'), reset_code)
+    await send_password_reset_email(email.get('email'), reset_code)
     return {"message": "Password reset code sent to your email"}
 
 @api_router.post("/auth/reset-password")
@@ -786,11 +2259,11 @@ async def reset_password(reset_data: dict):
                 raise HTTPException(status_code=400, detail="Reset code expired")
         
         # Update password and clear reset fields
-        hashed_password = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
+        hashed_password = await hash_password(new_password)
         result = await db.users.update_one(
             {"email": email},
             {"$set": {
-                "password": hashed_password.decode('utf-8')
+                "password": hashed_password
             }, "$unset": {
                 "password_reset_code": "",
                 "password_reset_expiry": ""
@@ -820,24 +2293,13 @@ async def login(user_input: UserLogin):
     if user_doc.get("is_active", True) is False:
         raise HTTPException(status_code=403, detail="Account deactivated")
     
-    # Check password
+    # Check password (stored as str or, in older documents, bytes)
     stored_password = user_doc['password']
-    logging.info(f"[LOGIN] Stored password type: {type(stored_password)}, first 20 chars: {str(stored_password)[:20]}")
-    
-    # Handle both bytes and string formats from MongoDB
-    if isinstance(stored_password, str):
-        stored_password_bytes = stored_password.encode('utf-8')
-    else:
-        stored_password_bytes = stored_password
-    
-    incoming_password_bytes = user_input.password.encode('utf-8')
-    
-    logging.info(f"[LOGIN] Incoming password length: {len(incoming_password_bytes)}")
-    logging.info(f"[LOGIN] Stored password bytes length: {len(stored_password_bytes)}")
-    
     try:
-        password_match = bcrypt.checkpw(incoming_password_bytes, stored_password_bytes)
+        password_match = await verify_password(user_input.password, stored_password)
         logging.info(f"[LOGIN] Password match result: {password_match}")
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"[LOGIN] bcrypt.checkpw error: {str(e)}", exc_info=True)
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -845,6 +2307,13 @@ async def login(user_input: UserLogin):
     if not password_match:
         logging.error(f"[LOGIN] Password mismatch for user: {user_input.email}")
         raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    # Upgrade the stored hash when BCRYPT_ROUNDS has changed since it was made
+    if password_needs_rehash(stored_password):
+        await db.users.update_one(
+            {"id": user_doc['id'], "password": stored_password},
+            {"$set": {"password": await hash_password(user_input.password)}}
+        )
     
     # Create user object
     user = User(
@@ -883,38 +2352,342 @@ async def upload_profile_picture(
     file: UploadFile = File(...),
     current_user: dict = Depends(get_current_user)
 ):
-    # Read file
-    contents = await file.read()
-    
-    # Convert to base64
-    image_data = base64.b64encode(contents).decode('utf-8')
-    image_url = f"data:image/jpeg;base64,{image_data}"
+    # Stream the file and store its resized variants in the blob store
+    variants = await store_image_variants(file, "profile_picture")
+    image_url = variants["card"]
     
     # Update user profile
     await db.users.update_one(
         {"id": current_user["user_id"]},
-        {"$set": {"profile_picture": image_url}}
+        {"$set": {"profile_picture": image_url, "profile_thumbnail_url": variants["thumb"]}}
     )
     
     return {"message": "Profile picture uploaded", "profile_picture": image_url}
 
+# ==================== ROOM INVENTORY ====================
+# A hotel's available_rooms is its room count. Reservations are tracked per night in room_nights
+# ({hotel_id, date, booked}); each night is reserved with a conditional $inc that only matches
+# while booked + rooms <= capacity, so concurrent bookings can never oversell a night. A stay is
+# reserved night by night and the nights already taken are released if a later one is full.
+# Correctness rests on the unique (hotel_id, date) index, so bookings are refused while it is
+# missing. Confirmed bookings from before inventory tracking are counted in at startup.
+BOOKING_MAX_NIGHTS = 30
+BOOKING_MAX_GUESTS_PER_ROOM = int(os.environ.get("BOOKING_MAX_GUESTS_PER_ROOM", "4"))
+
+_room_inventory_indexed = False
+
+def stay_nights(check_in: str, check_out: str) -> list:
+    """The nights of a stay as ISO dates (check-out day excluded). Raises 400 for invalid ranges."""
+    try:
+        start = datetime.fromisoformat(check_in).date()
+        end = datetime.fromisoformat(check_out).date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="check_in and check_out must be ISO dates")
+    nights = (end - start).days
+    if nights < 1:
+        raise HTTPException(status_code=400, detail="check_out must be after check_in")
+    if nights > BOOKING_MAX_NIGHTS:
+        raise HTTPException(status_code=400, detail=f"Stays are limited to {BOOKING_MAX_NIGHTS} nights")
+    return [(start + timedelta(days=i)).isoformat() for i in range(nights)]
+
+def rooms_for(guests: int, rooms: Optional[int] = None) -> int:
+    if guests < 1:
+        raise HTTPException(status_code=400, detail="guests must be at least 1")
+    if rooms is None:
+        return -(-guests // BOOKING_MAX_GUESTS_PER_ROOM)
+    if rooms < 1 or guests > rooms * BOOKING_MAX_GUESTS_PER_ROOM:
+        raise HTTPException(status_code=400, detail=f"At most {BOOKING_MAX_GUESTS_PER_ROOM} guests per room")
+    return rooms
+
+async def room_inventory_ready() -> bool:
+    """True once the unique (hotel_id, date) index exists. Without it the upsert in _reserve_night
+    would insert a second row for a full night instead of failing, so bookings are refused."""
+    global _room_inventory_indexed
+    if not _room_inventory_indexed:
+        try:
+            indexes = await db.room_nights.index_information()
+        except PyMongoError as e:
+            logging.error(f"[INVENTORY] Could not list room_nights indexes: {str(e)}")
+            return False
+        _room_inventory_indexed = any(
+            info.get("unique") and [field for field, _ in info["key"]] == ["hotel_id", "date"]
+            for info in indexes.values()
+        )
+    return _room_inventory_indexed
+
+async def _reserve_night(hotel_id: str, night: str, rooms: int, capacity: int) -> bool:
+    night_filter = {"hotel_id": hotel_id, "date": night, "booked": {"$lte": capacity - rooms}}
+    try:
+        # Matches an existing night only while it has room; otherwise the upsert tries to insert
+        # a second document for the night and hits the unique index.
+        await db.room_nights.update_one(night_filter, {"$inc": {"booked": rooms}}, upsert=True)
+        return True
+    except DuplicateKeyError:
+        # Either the night is full, or another booking created its row first. Only a conditional
+        # $inc on the now-existing row can tell the two apart.
+        result = await db.room_nights.update_one(night_filter, {"$inc": {"booked": rooms}})
+        return result.matched_count == 1
+
+async def _add_booked(hotel_id: str, night: str, rooms: int) -> None:
+    """Count rooms against a night unconditionally (for bookings that already exist)."""
+    try:
+        await db.room_nights.update_one({"hotel_id": hotel_id, "date": night}, {"$inc": {"booked": rooms}}, upsert=True)
+    except DuplicateKeyError:
+        await db.room_nights.update_one({"hotel_id": hotel_id, "date": night}, {"$inc": {"booked": rooms}})
+
+async def release_nights(hotel_id: str, nights: list, rooms: int) -> None:
+    if nights:
+        await db.room_nights.update_many(
+            {"hotel_id": hotel_id, "date": {"$in": nights}},
+            {"$inc": {"booked": -rooms}}
+        )
+
+async def reserve_stay(hotel_id: str, nights: list, rooms: int, capacity: int) -> bool:
+    """Reserve `rooms` on every night or none of them."""
+    if rooms > capacity:
+        return False
+    reserved = []
+    try:
+        for night in nights:
+            if not await _reserve_night(hotel_id, night, rooms, capacity):
+                await release_nights(hotel_id, reserved, rooms)
+                return False
+            reserved.append(night)
+    except PyMongoError:
+        # No booking will be recorded, so the nights taken so far must not stay counted
+        try:
+            await release_nights(hotel_id, reserved, rooms)
+        except PyMongoError as e:
+            logging.error(f"[INVENTORY] Could not release {rooms} room(s) on {reserved} for hotel {hotel_id}: {str(e)}")
+        raise
+    return True
+
+async def peak_booked_rooms(hotel_id: str) -> int:
+    """Most rooms booked on any night from today on."""
+    today = datetime.now(timezone.utc).date().isoformat()
+    row = await db.room_nights.find_one(
+        {"hotel_id": hotel_id, "date": {"$gte": today}}, {"_id": 0, "booked": 1}, sort=[("booked", DESCENDING)]
+    )
+    return row["booked"] if row else 0
+
+async def release_booking(booking: dict) -> None:
+    """Give a confirmed booking's nights back. Bookings made before inventory tracking hold none."""
+    if booking.get("status") == "confirmed" and booking.get("inventory_reserved"):
+        await release_nights(booking["hotel_id"], stay_nights(booking["check_in"], booking["check_out"]), booking.get("rooms", 1))
+
+async def migrate_room_inventory() -> dict:
+    """Count confirmed bookings made before inventory tracking against their nights.
+
+    Runs at startup. Each booking is claimed by flipping inventory_reserved first, so concurrent
+    workers count it once, and its nights are added with $inc so live reservations are kept.
+    """
+    migrated = 0
+    while booking := await db.bookings.find_one_and_update(
+        {"status": "confirmed", "inventory_reserved": {"$exists": False}},
+        {"$set": {"inventory_reserved": True}},
+        projection={"_id": 0, "id": 1, "hotel_id": 1, "check_in": 1, "check_out": 1, "rooms": 1}
+    ):
+        try:
+            nights = stay_nights(booking["check_in"], booking["check_out"])
+        except HTTPException:
+            continue
+        for night in nights:
+            await _add_booked(booking["hotel_id"], night, booking.get("rooms", 1))
+        migrated += 1
+    if migrated:
+        logging.info(f"[INVENTORY] Counted {migrated} existing bookings against room_nights")
+    return {"bookings_migrated": migrated}
+
+async def rebuild_room_inventory() -> dict:
+    """Recompute room_nights from confirmed bookings, e.g. to repair counters after an import.
+
+    Rows are corrected in place with $set upserts (nights no booking covers are set to 0)
+    rather than wiped and reinserted, so availability never drops to empty while it runs.
+    A booking confirmed between the scan and the write can still be miscounted; run it again
+    if bookings were being made.
+    """
+    counts: dict = {}
+    async for booking in db.bookings.find(
+        {"status": "confirmed"}, {"_id": 0, "id": 1, "hotel_id": 1, "check_in": 1, "check_out": 1, "rooms": 1}
+    ):
+        try:
+            nights = stay_nights(booking["check_in"], booking["check_out"])
+        except HTTPException:
+            continue
+        for night in nights:
+            key = (booking["hotel_id"], night)
+            counts[key] = counts.get(key, 0) + booking.get("rooms", 1)
+    operations = [
+        UpdateOne({"hotel_id": hotel_id, "date": night}, {"$set": {"booked": booked}}, upsert=True)
+        for (hotel_id, night), booked in counts.items()
+    ]
+    async for row in db.room_nights.find({"booked": {"$ne": 0}}, {"_id": 0, "hotel_id": 1, "date": 1}):
+        if (row["hotel_id"], row["date"]) not in counts:
+            operations.append(UpdateOne({"hotel_id": row["hotel_id"], "date": row["date"]}, {"$set": {"booked": 0}}))
+    for i in range(0, len(operations), 1000):
+        await db.room_nights.bulk_write(operations[i:i + 1000], ordered=False)
+    await db.bookings.update_many({"status": "confirmed"}, {"$set": {"inventory_reserved": True}})
+    return {"room_nights": len(counts), "updated": len(operations)}
+
+# ==================== GEO PROXIMITY ====================
+# Hotels, tourist spots and emergency contacts carry a GeoJSON point in `geo` (next to the
+# plain latitude/longitude fields the API returns), indexed with 2dsphere. find_near is the
+# one place distance queries are built; it returns documents ordered by true distance.
+GEO_COLLECTIONS = ("hotels", "tourist_spots", "emergency_contacts")
+NEAR_MAX_RADIUS_KM = 500
+
+def geo_point(latitude, longitude) -> Optional[dict]:
+    """GeoJSON point for valid coordinates, else None (documents without one are not indexed)."""
+    if not isinstance(latitude, (int, float)) or not isinstance(longitude, (int, float)):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return {"type": "Point", "coordinates": [float(longitude), float(latitude)]}
+
+def with_geo(doc: dict) -> dict:
+    doc["geo"] = geo_point(doc.get("latitude"), doc.get("longitude"))
+    return doc
+
+def validate_coordinates(lat: float, lon: float) -> None:
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise HTTPException(status_code=400, detail="lat must be within [-90, 90] and lon within [-180, 180]")
+
+async def find_near(
+    collection,
+    lat: float,
+    lon: float,
+    projection: dict,
+    query: Optional[dict] = None,
+    max_distance_m: Optional[float] = None,
+    limit: int = 20,
+    key: str = "geo"
+) -> list:
+    """Documents nearest to (lat, lon), closest first, each with `distance_km`."""
+    geo_near = {
+        "near": {"type": "Point", "coordinates": [lon, lat]},
+        "distanceField": "distance_m",
+        "spherical": True,
+        "key": key,
+        "query": query or {},
+    }
+    if max_distance_m is not None:
+        geo_near["maxDistance"] = max_distance_m
+    # Inclusion projections must name the distance field; exclusion ones keep it implicitly
+    if any(value for field, value in projection.items() if field != "_id"):
+        projection = {**projection, "distance_m": 1}
+    docs = await collection.aggregate([
+        {"$geoNear": geo_near},
+        {"$limit": limit},
+        {"$project": projection},
+    ]).to_list(limit)
+    for doc in docs:
+        doc["distance_km"] = round(doc.pop("distance_m") / 1000, 2)
+    return docs
+
+async def backfill_geo_points() -> dict:
+    """Add `geo` to documents stored before it existed."""
+    report = {}
+    for name in GEO_COLLECTIONS:
+        operations = []
+        async for doc in db[name].find({"geo": {"$exists": False}}, {"_id": 1, "latitude": 1, "longitude": 1}):
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"geo": geo_point(doc.get("latitude"), doc.get("longitude"))}}))
+        if operations:
+            await db[name].bulk_write(operations, ordered=False)
+        report[name] = len(operations)
+    return report
+
 # ==================== HOTEL ROUTES (Public) ====================
-@api_router.get("/hotels", response_model=List[Hotel])
-async def get_hotels(city: Optional[str] = None):
+@api_router.get("/hotels")
+async def get_hotels(
+    response: Response,
+    city: Optional[str] = None,
+    fields: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None
+):
     query = {
         "$or": [
             {"approval_status": {"$exists": False}},
             {"approval_status": "approved"}
         ]
     }
+    # Only the city prefix needs the case-insensitive collation; without it the default listing
+    # must run under the simple collation to use the approval/created_at indexes
+    collation = None
     if city:
-        query['city'] = {"$regex": city, "$options": "i"}
+        query['city'] = prefix_range(city)
+        collation = CASE_INSENSITIVE
     
-    hotels = await db.hotels.find(query, {"_id": 0}).to_list(100)
+    hotels = await paginate(
+        db.hotels, query, list_projection("hotels", fields), response, limit, cursor, collation=collation
+    )
+    return [use_thumbnails(hotel) for hotel in hotels]
+
+@api_router.get("/hotels/availability")
+async def get_hotel_availability(
+    response: Response,
+    check_in: str,
+    check_out: str,
+    guests: int = 1,
+    rooms: Optional[int] = None,
+    city: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None
+):
+    """Approved hotels with enough free rooms on every night of the stay, with rooms_left.
+    Paged like /hotels (newest first, X-Next-Cursor)."""
+    nights = stay_nights(check_in, check_out)
+    rooms = rooms_for(guests, rooms)
+
+    # Busiest night per hotel with bookings in the stay, read through the (date, hotel_id) index.
+    # Hotels that cannot fit `rooms` on that night are excluded from the hotel query itself,
+    # so every page holds only available hotels and the cursor walks all of them.
+    busiest = {
+        row["_id"]: row["booked"]
+        for row in await db.room_nights.aggregate([
+            {"$match": {"date": {"$gte": nights[0], "$lte": nights[-1]}, "booked": {"$gt": 0}}},
+            {"$group": {"_id": "$hotel_id", "booked": {"$max": "$booked"}}},
+        ]).to_list(None)
+    }
+    full = [
+        hotel["id"] for hotel in await db.hotels.find(
+            {"id": {"$in": list(busiest)}}, {"_id": 0, "id": 1, "available_rooms": 1}
+        ).to_list(None)
+        if (hotel.get("available_rooms") or 0) - busiest[hotel["id"]] < rooms
+    ]
+
+    query = {
+        "$or": [
+            {"approval_status": {"$exists": False}},
+            {"approval_status": "approved"}
+        ],
+        "available_rooms": {"$gte": rooms}
+    }
+    if full:
+        query["id"] = {"$nin": full}
+    collation = None
+    if city:
+        query["city"] = prefix_range(city)
+        collation = CASE_INSENSITIVE
+
+    hotels = await paginate(
+        db.hotels, query, list_projection("hotels", None), response, limit, cursor, collation=collation
+    )
     for hotel in hotels:
-        if isinstance(hotel['created_at'], str):
-            hotel['created_at'] = datetime.fromisoformat(hotel['created_at'])
-    return hotels
+        hotel["rooms_left"] = hotel["available_rooms"] - busiest.get(hotel["id"], 0)
+    return [use_thumbnails(hotel) for hotel in hotels]
+
+@api_router.get("/hotels/near")
+async def get_hotels_near(lat: float, lon: float, radius_km: float = 25, limit: int = 20):
+    """Approved hotels within radius_km of (lat, lon), nearest first, with distance_km."""
+    validate_coordinates(lat, lon)
+    radius_km = max(0.1, min(radius_km, NEAR_MAX_RADIUS_KM))
+    hotels = await find_near(
+        db.hotels, lat, lon, list_projection("hotels"),
+        query={"approval_status": {"$in": [None, "approved"]}},
+        max_distance_m=radius_km * 1000, limit=max(1, min(limit, 100))
+    )
+    return [use_thumbnails(hotel) for hotel in hotels]
 
 @api_router.get("/hotels/{hotel_id}", response_model=Hotel)
 async def get_hotel(hotel_id: str):
@@ -956,16 +2729,20 @@ async def create_hotel(hotel_input: HotelCreate, current_user: dict = Depends(ge
     if hotel_dict.get('approved_at'):
         hotel_dict['approved_at'] = hotel_dict['approved_at'].isoformat()
     
-    await db.hotels.insert_one(hotel_dict)
+    await db.hotels.insert_one(with_geo(hotel_dict))
+    await bump_stats({"total_hotels": 1, **status_change(HOTEL_STATUS_COUNTERS, None, hotel.approval_status)})
     return hotel
 
-@api_router.get("/hotel-owner/hotels", response_model=List[Hotel])
-async def get_owner_hotels(owner_id: str = Depends(get_hotel_owner)):
-    hotels = await db.hotels.find({"owner_id": owner_id}, {"_id": 0}).to_list(100)
-    for hotel in hotels:
-        if isinstance(hotel['created_at'], str):
-            hotel['created_at'] = datetime.fromisoformat(hotel['created_at'])
-    return hotels
+@api_router.get("/hotel-owner/hotels")
+async def get_owner_hotels(
+    response: Response,
+    fields: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    owner_id: str = Depends(get_hotel_owner)
+):
+    hotels = await paginate(db.hotels, {"owner_id": owner_id}, list_projection("hotels", fields), response, limit, cursor)
+    return [use_thumbnails(hotel) for hotel in hotels]
 
 @api_router.patch("/hotel-owner/hotels/{hotel_id}")
 async def update_hotel(hotel_id: str, hotel_update: HotelUpdate, owner_id: str = Depends(get_hotel_owner)):
@@ -976,8 +2753,24 @@ async def update_hotel(hotel_id: str, hotel_update: HotelUpdate, owner_id: str =
     
     # Update only provided fields
     update_data = {k: v for k, v in hotel_update.model_dump().items() if v is not None}
+    if "available_rooms" in update_data:
+        if update_data["available_rooms"] < 0:
+            raise HTTPException(status_code=400, detail="available_rooms cannot be negative")
+        if update_data["available_rooms"] < hotel.get("available_rooms", 0):
+            peak = await peak_booked_rooms(hotel_id)
+            if update_data["available_rooms"] < peak:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"{peak} rooms are already booked on some upcoming nights; cancel bookings before lowering available_rooms"
+                )
+    if "latitude" in update_data or "longitude" in update_data:
+        update_data["geo"] = geo_point(
+            update_data.get("latitude", hotel.get("latitude")), update_data.get("longitude", hotel.get("longitude"))
+        )
     if update_data:
         await db.hotels.update_one({"id": hotel_id}, {"$set": update_data})
+        if denormalized_fields_changed("hotels", hotel, update_data):
+            await enqueue_propagation("hotels", hotel_id)
     
     return {"message": "Hotel updated successfully"}
 
@@ -993,35 +2786,50 @@ async def upload_hotel_images(
         raise HTTPException(status_code=404, detail="Hotel not found or access denied")
     
     # Process images
+    check_upload_count(files, "hotel_images")
     image_urls = []
+    thumbnail_urls = []
     for file in files:
-        contents = await file.read()
-        image_data = base64.b64encode(contents).decode('utf-8')
-        image_url = f"data:image/jpeg;base64,{image_data}"
-        image_urls.append(image_url)
+        variants = await store_image_variants(file, "hotel_images")
+        image_urls.append(variants["full"])
+        thumbnail_urls.append(variants["thumb"])
     
     # Update hotel with images - handle None case properly
     existing_images = hotel.get('images') if hotel.get('images') is not None else []
+    existing_thumbnails = hotel.get('image_thumbnails') or []
+    if len(existing_thumbnails) != len(existing_images):
+        # Images uploaded before thumbnails existed serve as their own thumbnail
+        existing_thumbnails = list(existing_images)
     all_images = existing_images + image_urls
+    all_thumbnails = existing_thumbnails + thumbnail_urls
     
     await db.hotels.update_one(
         {"id": hotel_id},
-        {"$set": {"images": all_images, "image_url": all_images[0] if all_images else None}}
+        {"$set": {
+            "images": all_images,
+            "image_thumbnails": all_thumbnails,
+            "image_url": all_images[0] if all_images else None,
+            "thumbnail_url": all_thumbnails[0] if all_thumbnails else None
+        }}
     )
     
     return {"message": f"{len(image_urls)} images uploaded successfully", "images": image_urls}
 
-@api_router.get("/hotel-owner/bookings", response_model=List[Booking])
-async def get_owner_bookings(owner_id: str = Depends(get_hotel_owner)):
+@api_router.get("/hotel-owner/bookings")
+async def get_owner_bookings(
+    response: Response,
+    fields: Optional[str] = None,
+    limit: int = 1000,
+    cursor: Optional[str] = None,
+    owner_id: str = Depends(get_hotel_owner)
+):
     # Get all hotels owned by this owner
-    hotels = await db.hotels.find({"owner_id": owner_id}, {"_id": 0, "id": 1}).to_list(100)
-    hotel_ids = [h['id'] for h in hotels]
+    hotel_ids = await db.hotels.distinct("id", {"owner_id": owner_id})
     
     # Get bookings for these hotels
-    bookings = await db.bookings.find({"hotel_id": {"$in": hotel_ids}}, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    for booking in bookings:
-        if isinstance(booking['created_at'], str):
-            booking['created_at'] = datetime.fromisoformat(booking['created_at'])
+    bookings = await paginate(
+        db.bookings, {"hotel_id": {"$in": hotel_ids}}, list_projection("bookings", fields), response, limit, cursor
+    )
     return bookings
 
 @api_router.patch("/hotel-owner/bookings/{booking_id}/cancel")
@@ -1039,37 +2847,47 @@ async def owner_cancel_booking(booking_id: str, owner_id: str = Depends(get_hote
     if booking['status'] == 'cancelled':
         raise HTTPException(status_code=400, detail="Booking already cancelled")
     
-    await db.bookings.update_one(
-        {"id": booking_id},
+    result = await db.bookings.update_one(
+        {"id": booking_id, "status": booking['status']},
         {"$set": {"status": "cancelled"}}
     )
+    if result.modified_count == 0:
+        raise HTTPException(status_code=409, detail="Booking was modified concurrently, please retry")
+    await release_booking(booking)
+    await bump_stats(status_change(BOOKING_STATUS_COUNTERS, booking['status'], "cancelled"))
     return {"message": "Booking cancelled successfully"}
 
 @api_router.get("/hotel-owner/stats")
 async def get_owner_stats(owner_id: str = Depends(get_hotel_owner)):
-    # Get all hotels owned by this owner
-    hotels = await db.hotels.find({"owner_id": owner_id}, {"_id": 0, "id": 1}).to_list(100)
-    hotel_ids = [h['id'] for h in hotels]
-    
-    total_hotels = len(hotels)
-    total_bookings = await db.bookings.count_documents({"hotel_id": {"$in": hotel_ids}})
-    confirmed_bookings = await db.bookings.count_documents({"hotel_id": {"$in": hotel_ids}, "status": "confirmed"})
-    cancelled_bookings = await db.bookings.count_documents({"hotel_id": {"$in": hotel_ids}, "status": "cancelled"})
-    pending_hotels = await db.hotels.count_documents({"owner_id": owner_id, "approval_status": "pending"})
-    approved_hotels = await db.hotels.count_documents({
-        "owner_id": owner_id,
-        "$or": [{"approval_status": "approved"}, {"approval_status": {"$exists": False}}]
-    })
-    rejected_hotels = await db.hotels.count_documents({"owner_id": owner_id, "approval_status": "rejected"})
+    # One pass over the owner's hotels collects both the approval counts and the hotel ids
+    rows = await db.hotels.aggregate([
+        {"$match": {"owner_id": owner_id}},
+        {"$group": {
+            "_id": None,
+            "hotel_ids": {"$push": "$id"},
+            "total_hotels": {"$sum": 1},
+            "pending_hotels": {"$sum": {"$cond": [{"$eq": ["$approval_status", "pending"]}, 1, 0]}},
+            "approved_hotels": {"$sum": {"$cond": [_HOTEL_APPROVED, 1, 0]}},
+            "rejected_hotels": {"$sum": {"$cond": [{"$eq": ["$approval_status", "rejected"]}, 1, 0]}},
+        }}
+    ]).to_list(1)
+    hotel_stats = rows[0] if rows else {}
+    hotel_ids = hotel_stats.get("hotel_ids", [])
+
+    booking_stats = {"total_bookings": 0, "confirmed_bookings": 0, "cancelled_bookings": 0}
+    if hotel_ids:
+        booking_stats = await count_where(db.bookings, {
+            "total_bookings": True,
+            "confirmed_bookings": {"$eq": ["$status", "confirmed"]},
+            "cancelled_bookings": {"$eq": ["$status", "cancelled"]},
+        }, match={"hotel_id": {"$in": hotel_ids}})
     
     return {
-        "total_hotels": total_hotels,
-        "approved_hotels": approved_hotels,
-        "pending_hotels": pending_hotels,
-        "rejected_hotels": rejected_hotels,
-        "total_bookings": total_bookings,
-        "confirmed_bookings": confirmed_bookings,
-        "cancelled_bookings": cancelled_bookings
+        "total_hotels": hotel_stats.get("total_hotels", 0),
+        "approved_hotels": hotel_stats.get("approved_hotels", 0),
+        "pending_hotels": hotel_stats.get("pending_hotels", 0),
+        "rejected_hotels": hotel_stats.get("rejected_hotels", 0),
+        **booking_stats
     }
 
 # ==================== BOOKING ROUTES (User) ====================
@@ -1083,12 +2901,16 @@ async def create_booking(booking_input: BookingCreate, current_user: dict = Depe
     # Get user details
     user = await db.users.find_one({"id": current_user["user_id"]}, {"_id": 0})
     
+    # Reserve the rooms for every night before recording the booking
+    nights = stay_nights(booking_input.check_in, booking_input.check_out)
+    rooms = rooms_for(booking_input.guests, booking_input.rooms)
+    if not await room_inventory_ready():
+        raise HTTPException(status_code=503, detail="Bookings are temporarily unavailable")
+    if not await reserve_stay(booking_input.hotel_id, nights, rooms, hotel.get('available_rooms', 0)):
+        raise HTTPException(status_code=409, detail="No rooms available for the selected dates")
+    
     # Calculate total price
-    from datetime import datetime as dt
-    check_in_date = dt.fromisoformat(booking_input.check_in)
-    check_out_date = dt.fromisoformat(booking_input.check_out)
-    nights = (check_out_date - check_in_date).days
-    total_price = nights * hotel['price_per_night']
+    total_price = len(nights) * rooms * hotel['price_per_night']
     
     # Create booking
     booking = Booking(
@@ -1100,22 +2922,34 @@ async def create_booking(booking_input: BookingCreate, current_user: dict = Depe
         check_in=booking_input.check_in,
         check_out=booking_input.check_out,
         guests=booking_input.guests,
+        rooms=rooms,
         total_price=total_price,
         status="confirmed"
     )
     
     booking_dict = booking.model_dump()
     booking_dict['created_at'] = booking_dict['created_at'].isoformat()
+    booking_dict['inventory_reserved'] = True
     
-    await db.bookings.insert_one(booking_dict)
-    return booking
+    try:
+        await db.bookings.insert_one(booking_dict)
+    except PyMongoError:
+        await release_nights(booking_input.hotel_id, nights, rooms)
+        raise
+    await bump_stats({"total_bookings": 1, **status_change(BOOKING_STATUS_COUNTERS, None, booking.status)})
+    return booking
 
-@api_router.get("/bookings", response_model=List[Booking])
-async def get_bookings(current_user: dict = Depends(get_current_user)):
-    bookings = await db.bookings.find({"user_id": current_user["user_id"]}, {"_id": 0}).to_list(100)
-    for booking in bookings:
-        if isinstance(booking['created_at'], str):
-            booking['created_at'] = datetime.fromisoformat(booking['created_at'])
+@api_router.get("/bookings")
+async def get_bookings(
+    response: Response,
+    fields: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    bookings = await paginate(
+        db.bookings, {"user_id": current_user["user_id"]}, list_projection("bookings", fields), response, limit, cursor
+    )
     return bookings
 
 @api_router.patch("/bookings/{booking_id}/cancel")
@@ -1127,10 +2961,14 @@ async def cancel_booking(booking_id: str, current_user: dict = Depends(get_curre
     if booking['status'] == 'cancelled':
         raise HTTPException(status_code=400, detail="Booking already cancelled")
     
-    await db.bookings.update_one(
-        {"id": booking_id},
+    result = await db.bookings.update_one(
+        {"id": booking_id, "status": booking['status']},
         {"$set": {"status": "cancelled"}}
     )
+    if result.modified_count == 0:
+        raise HTTPException(status_code=409, detail="Booking was modified concurrently, please retry")
+    await release_booking(booking)
+    await bump_stats(status_change(BOOKING_STATUS_COUNTERS, booking['status'], "cancelled"))
     return {"message": "Booking cancelled successfully"}
 
 # ==================== PERMIT ROUTES (User) ====================
@@ -1149,12 +2987,6 @@ async def create_permit(
     # Get user details
     user = await db.users.find_one({"id": current_user["user_id"]}, {"_id": 0})
     
-    # Process document if uploaded
-    document_data = None
-    if document:
-        contents = await document.read()
-        document_data = base64.b64encode(contents).decode('utf-8')
-    
     # Create permit
     permit = Permit(
         user_id=current_user["user_id"],
@@ -1167,22 +2999,31 @@ async def create_permit(
         trek_area=trek_area,
         start_date=start_date,
         end_date=end_date,
-        status="pending",
-        document_data=document_data
+        status="pending"
     )
     
     permit_dict = permit.model_dump()
     permit_dict['created_at'] = permit_dict['created_at'].isoformat()
+    # The document goes to the private store; only the access-checked route URL is exposed
+    if document:
+        permit_dict['document_key'] = await store_upload(document, "permit_document", document_store)
+        permit_dict['document_data'] = permit_document_url(permit.id)
     
     await db.permits.insert_one(permit_dict)
+    await bump_stats({"total_permits": 1, **status_change(PERMIT_STATUS_COUNTERS, None, permit.status)})
     return {"message": "Permit application submitted successfully", "permit_id": permit.id}
 
-@api_router.get("/permits", response_model=List[Permit])
-async def get_permits(current_user: dict = Depends(get_current_user)):
-    permits = await db.permits.find({"user_id": current_user["user_id"]}, {"_id": 0}).to_list(100)
-    for permit in permits:
-        if isinstance(permit['created_at'], str):
-            permit['created_at'] = datetime.fromisoformat(permit['created_at'])
+@api_router.get("/permits")
+async def get_permits(
+    response: Response,
+    fields: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    permits = await paginate(
+        db.permits, {"user_id": current_user["user_id"]}, list_projection("permits", fields), response, limit, cursor
+    )
     return permits
 
 @api_router.patch("/permits/{permit_id}/cancel")
@@ -1198,15 +3039,19 @@ async def cancel_permit(permit_id: str, current_user: dict = Depends(get_current
         {"id": permit_id},
         {"$set": {"status": "cancelled", "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
+    await bump_stats(status_change(PERMIT_STATUS_COUNTERS, permit['status'], "cancelled"))
     return {"message": "Permit application cancelled successfully"}
 
 # ==================== ADMIN ROUTES ====================
-@api_router.get("/admin/permits", response_model=List[Permit])
-async def admin_get_permits(admin_id: str = Depends(get_admin_user)):
-    permits = await db.permits.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    for permit in permits:
-        if isinstance(permit['created_at'], str):
-            permit['created_at'] = datetime.fromisoformat(permit['created_at'])
+@api_router.get("/admin/permits")
+async def admin_get_permits(
+    response: Response,
+    fields: Optional[str] = None,
+    limit: int = 1000,
+    cursor: Optional[str] = None,
+    admin_id: str = Depends(get_admin_user)
+):
+    permits = await paginate(db.permits, {}, list_projection("permits", fields), response, limit, cursor)
     return permits
 
 @api_router.get("/admin/permits/{permit_id}", response_model=Permit)
@@ -1236,6 +3081,7 @@ async def admin_update_permit(permit_id: str, update: PermitUpdate, admin_id: st
         update_data["admin_note"] = update.admin_note
     
     await db.permits.update_one({"id": permit_id}, {"$set": update_data})
+    await bump_stats(status_change(PERMIT_STATUS_COUNTERS, permit.get("status"), update.status))
     await log_admin_action(
         admin_id=admin_id,
         action="permit_status_update",
@@ -1246,19 +3092,28 @@ async def admin_update_permit(permit_id: str, update: PermitUpdate, admin_id: st
     )
     return {"message": "Permit updated successfully"}
 
-@api_router.get("/admin/bookings", response_model=List[Booking])
-async def admin_get_bookings(admin_id: str = Depends(get_admin_user)):
-    bookings = await db.bookings.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    for booking in bookings:
-        if isinstance(booking['created_at'], str):
-            booking['created_at'] = datetime.fromisoformat(booking['created_at'])
+@api_router.get("/admin/bookings")
+async def admin_get_bookings(
+    response: Response,
+    fields: Optional[str] = None,
+    limit: int = 1000,
+    cursor: Optional[str] = None,
+    admin_id: str = Depends(get_admin_user)
+):
+    bookings = await paginate(db.bookings, {}, list_projection("bookings", fields), response, limit, cursor)
     return bookings
 
 @api_router.get("/admin/users")
-async def admin_get_users(admin_id: str = Depends(get_admin_user)):
+async def admin_get_users(
+    response: Response,
+    fields: Optional[str] = None,
+    limit: int = 1000,
+    cursor: Optional[str] = None,
+    admin_id: str = Depends(get_admin_user)
+):
     """Get all users with their details"""
-    users = await db.users.find({}, {"_id": 0, "password": 0, "verification_code": 0}).sort("created_at", -1).to_list(1000)
-    return users
+    users = await paginate(db.users, {}, list_projection("users", fields), response, limit, cursor)
+    return [use_thumbnails(user) for user in users]
 
 @api_router.patch("/admin/users/{user_id}/status")
 async def admin_update_user_status(user_id: str, update: UserStatusUpdate, admin_id: str = Depends(get_admin_user)):
@@ -1305,6 +3160,9 @@ async def admin_update_user_status(user_id: str, update: UserStatusUpdate, admin
         update_ops["$unset"] = unset_data
 
     await db.users.update_one({"id": user_id}, update_ops)
+    await record_user_status_change(user_id, {**user_doc, **update_data})
+    if update.is_banned is not None and update.is_banned != before["is_banned"]:
+        await bump_stats({"banned_users": 1 if update.is_banned else -1})
     await log_admin_action(
         admin_id=admin_id,
         action="user_status_update",
@@ -1317,49 +3175,32 @@ async def admin_update_user_status(user_id: str, update: UserStatusUpdate, admin
 
 @api_router.get("/admin/stats")
 async def admin_get_stats(admin_id: str = Depends(get_admin_user)):
-    total_users = await db.users.count_documents({"role": "user"})
-    total_hotel_owners = await db.users.count_documents({"role": "hotel_owner"})
-    total_bookings = await db.bookings.count_documents({})
-    total_permits = await db.permits.count_documents({})
-    pending_permits = await db.permits.count_documents({"status": "pending"})
-    approved_permits = await db.permits.count_documents({"status": "approved"})
-    rejected_permits = await db.permits.count_documents({"status": "rejected"})
-    cancelled_bookings = await db.bookings.count_documents({"status": "cancelled"})
-    confirmed_bookings = await db.bookings.count_documents({"status": "confirmed"})
-    total_hotels = await db.hotels.count_documents({})
-    pending_hotels = await db.hotels.count_documents({"approval_status": "pending"})
-    approved_hotels = await db.hotels.count_documents({
-        "$or": [{"approval_status": "approved"}, {"approval_status": {"$exists": False}}]
-    })
-    rejected_hotels = await db.hotels.count_documents({"approval_status": "rejected"})
-    banned_users = await db.users.count_documents({"is_banned": True})
-    total_tourist_spots = await db.tourist_spots.count_documents({})
-    
-    return {
-        "total_users": total_users,
-        "total_hotel_owners": total_hotel_owners,
-        "banned_users": banned_users,
-        "total_bookings": total_bookings,
-        "confirmed_bookings": confirmed_bookings,
-        "total_permits": total_permits,
-        "pending_permits": pending_permits,
-        "approved_permits": approved_permits,
-        "rejected_permits": rejected_permits,
-        "cancelled_bookings": cancelled_bookings,
-        "total_hotels": total_hotels,
-        "pending_hotels": pending_hotels,
-        "approved_hotels": approved_hotels,
-        "rejected_hotels": rejected_hotels,
-        "total_tourist_spots": total_tourist_spots
-    }
+    if STATS_MATERIALIZED:
+        stats = await db.stats.find_one({"id": STATS_DOC_ID}, {"_id": 0, "id": 0, "rebuilt_at": 0})
+        if stats:
+            return stats
+        return await rebuild_materialized_stats()
+    return await compute_admin_stats()
 
 @api_router.get("/admin/audit-logs")
-async def admin_get_audit_logs(limit: int = 200, admin_id: str = Depends(get_admin_user)):
-    logs = await db.admin_audit_logs.find({}, {"_id": 0}).sort("created_at", -1).to_list(limit)
+async def admin_get_audit_logs(
+    response: Response,
+    limit: int = 200,
+    cursor: Optional[str] = None,
+    admin_id: str = Depends(get_admin_user)
+):
+    logs = await paginate(db.admin_audit_logs, {}, {"_id": 0}, response, limit, cursor)
     return logs
 
 @api_router.get("/admin/hotels")
-async def admin_get_hotels(status: Optional[str] = None, admin_id: str = Depends(get_admin_user)):
+async def admin_get_hotels(
+    response: Response,
+    status: Optional[str] = None,
+    fields: Optional[str] = None,
+    limit: int = 1000,
+    cursor: Optional[str] = None,
+    admin_id: str = Depends(get_admin_user)
+):
     query = {}
     if status:
         if status == "approved":
@@ -1367,11 +3208,8 @@ async def admin_get_hotels(status: Optional[str] = None, admin_id: str = Depends
         else:
             query = {"approval_status": status}
 
-    hotels = await db.hotels.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    for hotel in hotels:
-        if isinstance(hotel.get('created_at'), str):
-            hotel['created_at'] = datetime.fromisoformat(hotel['created_at'])
-    return hotels
+    hotels = await paginate(db.hotels, query, list_projection("hotels", fields), response, limit, cursor)
+    return [use_thumbnails(hotel) for hotel in hotels]
 
 @api_router.patch("/admin/hotels/{hotel_id}/approval")
 async def admin_update_hotel_approval(hotel_id: str, update: HotelApprovalUpdate, admin_id: str = Depends(get_admin_user)):
@@ -1394,6 +3232,7 @@ async def admin_update_hotel_approval(hotel_id: str, update: HotelApprovalUpdate
     }
 
     await db.hotels.update_one({"id": hotel_id}, {"$set": update_data})
+    await bump_stats(status_change(HOTEL_STATUS_COUNTERS, hotel.get("approval_status") or "approved", update.status))
     await log_admin_action(
         admin_id=admin_id,
         action="hotel_approval_update",
@@ -1412,39 +3251,101 @@ async def create_permit_type(permit_type: PermitTypeCreate, admin_id: str = Depe
     permit_type_dict['created_at'] = permit_type_dict['created_at'].isoformat()
     
     await db.permit_types.insert_one(permit_type_dict)
+    await invalidate_reference("permit_types")
     return new_permit_type
 
 @api_router.get("/permit-types", response_model=List[PermitType])
-async def get_permit_types():
+async def get_permit_types(request: Request):
     """Get all permit types (public endpoint)"""
-    permit_types = await db.permit_types.find({}, {"_id": 0}).to_list(100)
-    for pt in permit_types:
-        if isinstance(pt['created_at'], str):
-            pt['created_at'] = datetime.fromisoformat(pt['created_at'])
-    return permit_types
+    async def render():
+        permit_types = await db.permit_types.find({}, {"_id": 0}).to_list(100)
+        return render_models(PermitType, permit_types), {}
+    return await reference_response(request, "permit_types", render)
 
 # ==================== EMERGENCY CONTACTS ====================
 @api_router.get("/emergency-contacts", response_model=List[EmergencyContact])
-async def get_emergency_contacts():
-    contacts = await db.emergency_contacts.find({}, {"_id": 0}).to_list(100)
-    return contacts
+async def get_emergency_contacts(request: Request):
+    async def render():
+        contacts = await db.emergency_contacts.find({}, {"_id": 0}).to_list(100)
+        return render_models(EmergencyContact, contacts), {}
+    return await reference_response(request, "emergency_contacts", render)
+
+@api_router.get("/emergency-contacts/near")
+async def get_emergency_contacts_near(lat: float, lon: float, limit: int = 10):
+    """Emergency contacts ordered by distance from (lat, lon), with distance_km."""
+    validate_coordinates(lat, lon)
+    return await find_near(
+        db.emergency_contacts, lat, lon, {"_id": 0, "geo": 0}, limit=max(1, min(limit, 50))
+    )
 
 # ==================== SAFETY TIPS ====================
 @api_router.get("/safety-tips", response_model=List[SafetyTip])
-async def get_safety_tips():
-    tips = await db.safety_tips.find({}, {"_id": 0}).to_list(100)
-    return tips
+async def get_safety_tips(request: Request):
+    async def render():
+        tips = await db.safety_tips.find({}, {"_id": 0}).to_list(100)
+        return render_models(SafetyTip, tips), {}
+    return await reference_response(request, "safety_tips", render)
 
 # ==================== TOURIST SPOTS ====================
-@api_router.get("/tourist-spots", response_model=List[TouristSpot])
-async def get_tourist_spots():
-    spots = await db.tourist_spots.find({}, {"_id": 0}).to_list(100)
-    return spots
+@api_router.get("/tourist-spots")
+async def get_tourist_spots(
+    request: Request,
+    category: Optional[str] = None,
+    region: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    permit: Optional[bool] = None,
+    fields: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None
+):
+    query = {
+        field: value for field, value in
+        {"category": category, "region": region, "difficulty": difficulty, "permit": permit}.items()
+        if value is not None
+    }
+    projection = list_projection("tourist_spots", fields)
 
-@api_router.get("/admin/tourist-spots", response_model=List[TouristSpot])
-async def admin_get_tourist_spots(admin_id: str = Depends(get_admin_user)):
-    spots = await db.tourist_spots.find({}, {"_id": 0}).sort("name", 1).to_list(1000)
-    return spots
+    async def render():
+        page = Response()
+        spots = await paginate(
+            db.tourist_spots, query, projection, page, limit, cursor,
+            sort_field="name", direction=ASCENDING
+        )
+        body = json.dumps(jsonable_encoder([use_thumbnails(spot) for spot in spots])).encode("utf-8")
+        return body, {k: v for k, v in page.headers.items() if k == "x-next-cursor"}
+    return await reference_response(request, "tourist_spots", render)
+
+@api_router.get("/tourist-spots/near")
+async def get_tourist_spots_near(lat: float, lon: float, radius_km: float = 50, limit: int = 20):
+    """Tourist spots within radius_km of (lat, lon), nearest first, with distance_km."""
+    validate_coordinates(lat, lon)
+    radius_km = max(0.1, min(radius_km, NEAR_MAX_RADIUS_KM))
+    spots = await find_near(
+        db.tourist_spots, lat, lon, list_projection("tourist_spots"),
+        max_distance_m=radius_km * 1000, limit=max(1, min(limit, 100))
+    )
+    return [use_thumbnails(spot) for spot in spots]
+
+@api_router.get("/tourist-spots/{spot_id}", response_model=TouristSpot)
+async def get_tourist_spot(spot_id: str):
+    spot = await db.tourist_spots.find_one({"id": spot_id}, {"_id": 0})
+    if not spot:
+        raise HTTPException(status_code=404, detail="Tourist spot not found")
+    return TouristSpot(**spot)
+
+@api_router.get("/admin/tourist-spots")
+async def admin_get_tourist_spots(
+    response: Response,
+    fields: Optional[str] = None,
+    limit: int = 1000,
+    cursor: Optional[str] = None,
+    admin_id: str = Depends(get_admin_user)
+):
+    spots = await paginate(
+        db.tourist_spots, {}, list_projection("tourist_spots", fields), response, limit, cursor,
+        sort_field="name", direction=ASCENDING
+    )
+    return [use_thumbnails(spot) for spot in spots]
 
 @api_router.post("/admin/tourist-spots/import")
 async def admin_import_tourist_spots(
@@ -1454,7 +3355,7 @@ async def admin_import_tourist_spots(
     if not spots:
         raise HTTPException(status_code=400, detail="No destinations provided")
 
-    existing = await db.tourist_spots.find({}, {"_id": 0, "name": 1, "id": 1, "rating": 1}).to_list(5000)
+    existing = await db.tourist_spots.find({}, {"_id": 0, "name": 1, "id": 1, "rating": 1, "image_url": 1}).to_list(5000)
     existing_by_name = {s.get("name"): s for s in existing}
 
     def get_value(item: dict, *keys, default=None):
@@ -1508,7 +3409,12 @@ async def admin_import_tourist_spots(
             }
             update_data = {k: v for k, v in update_data.items() if v is not None and v != ""}
             if update_data:
-                await db.tourist_spots.update_one({"name": name}, {"$set": update_data})
+                update = {"$set": update_data}
+                # An imported image is an external URL with no generated thumbnail; drop the old
+                # one so list views (use_thumbnails) don't keep showing the previous image
+                if "image_url" in update_data and update_data["image_url"] != existing_record.get("image_url"):
+                    update["$unset"] = {"thumbnail_url": ""}
+                await db.tourist_spots.update_one({"name": name}, update)
                 updated += 1
             continue
 
@@ -1533,10 +3439,13 @@ async def admin_import_tourist_spots(
             cost=str(cost) if cost else None,
             image_url=str(image_url) if image_url else None
         )
-        to_insert.append(spot.model_dump())
+        to_insert.append(with_geo(spot.model_dump()))
 
     if to_insert:
         await db.tourist_spots.insert_many(to_insert)
+        await bump_stats({"total_tourist_spots": len(to_insert)})
+    if to_insert or updated:
+        await invalidate_reference("tourist_spots")
 
     await log_admin_action(
         admin_id=admin_id,
@@ -1570,11 +3479,11 @@ async def admin_create_tourist_spot(
     admin_id: str = Depends(get_admin_user)
 ):
     image_url = None
+    thumbnail_url = None
     if image:
-        contents = await image.read()
-        image_data = base64.b64encode(contents).decode('utf-8')
-        content_type = image.content_type or "image/jpeg"
-        image_url = f"data:{content_type};base64,{image_data}"
+        variants = await store_image_variants(image, "tourist_spot_image")
+        image_url = variants["full"]
+        thumbnail_url = variants["thumb"]
 
     spot = TouristSpot(
         name=name.strip(),
@@ -1594,9 +3503,12 @@ async def admin_create_tourist_spot(
         duration=duration.strip() if duration else None,
         attractions=attractions.strip() if attractions else None,
         cost=cost.strip() if cost else None,
-        image_url=image_url
+        image_url=image_url,
+        thumbnail_url=thumbnail_url
     )
-    await db.tourist_spots.insert_one(spot.model_dump())
+    await db.tourist_spots.insert_one(with_geo(spot.model_dump()))
+    await bump_stats({"total_tourist_spots": 1})
+    await invalidate_reference("tourist_spots")
     await log_admin_action(
         admin_id=admin_id,
         action="tourist_spot_create",
@@ -1670,15 +3582,19 @@ async def admin_update_tourist_spot(
         update_data["cost"] = cost.strip() if cost else None
 
     if image:
-        contents = await image.read()
-        image_data = base64.b64encode(contents).decode('utf-8')
-        content_type = image.content_type or "image/jpeg"
-        update_data["image_url"] = f"data:{content_type};base64,{image_data}"
+        variants = await store_image_variants(image, "tourist_spot_image")
+        update_data["image_url"] = variants["full"]
+        update_data["thumbnail_url"] = variants["thumb"]
 
     if not update_data:
         raise HTTPException(status_code=400, detail="No valid updates provided")
+    if "latitude" in update_data or "longitude" in update_data:
+        update_data["geo"] = geo_point(
+            update_data.get("latitude", existing.get("latitude")), update_data.get("longitude", existing.get("longitude"))
+        )
 
     await db.tourist_spots.update_one({"id": spot_id}, {"$set": update_data})
+    await invalidate_reference("tourist_spots")
     await log_admin_action(
         admin_id=admin_id,
         action="tourist_spot_update",
@@ -1696,6 +3612,8 @@ async def admin_delete_tourist_spot(spot_id: str, admin_id: str = Depends(get_ad
         raise HTTPException(status_code=404, detail="Tourist spot not found")
 
     await db.tourist_spots.delete_one({"id": spot_id})
+    await bump_stats({"total_tourist_spots": -1})
+    await invalidate_reference("tourist_spots")
     await log_admin_action(
         admin_id=admin_id,
         action="tourist_spot_delete",
@@ -1706,7 +3624,440 @@ async def admin_delete_tourist_spot(spot_id: str, admin_id: str = Depends(get_ad
     return {"message": "Tourist spot deleted"}
 
 
+# ==================== SEARCH ====================
+# Relevance search runs on one weighted text index per collection; facet counts come from the
+# same aggregation via $facet. Prefix matching (autocomplete, the hotel city filter) uses range
+# queries under a case-insensitive collation, which indexes built with that collation can serve.
+CASE_INSENSITIVE = Collation(locale="en", strength=2)
+# Nightly prices are in USD (seed hotels are $60-$100)
+HOTEL_PRICE_BUCKETS = [0, 25, 50, 100, 200, 500]
+SEARCH_MAX_LIMIT = 100
+
+def prefix_range(prefix: str) -> dict:
+    """Range matching every string that starts with `prefix` (use with CASE_INSENSITIVE)."""
+    # U+FFFF has the highest primary weight in the root collation, so it bounds the range
+    return {"$gte": prefix, "$lt": prefix + "\uffff"}
+
+SEARCH_RESOURCES = {
+    "hotels": {
+        "match": {"approval_status": {"$in": [None, "approved"]}},
+        "facets": {"city": "city"},
+    },
+    "tourist_spots": {
+        "match": {},
+        "facets": {"category": "category", "region": "region", "difficulty": "difficulty", "permit": "permit"},
+    },
+}
+
+async def search_collection(
+    resource: str, q: Optional[str], filters: dict, limit: int, collation: Optional[Collation] = None
+) -> dict:
+    spec = SEARCH_RESOURCES[resource]
+    match = {**spec["match"], **filters}
+    if q:
+        match["$text"] = {"$search": q}
+    pipeline = [{"$match": match}]
+    projection = list_projection(resource)
+    if q:
+        pipeline.append({"$addFields": {"score": {"$meta": "textScore"}}})
+        projection["score"] = 1
+        sort = {"score": -1, "rating": -1, "id": 1}
+    else:
+        sort = {"rating": -1, "name": 1, "id": 1}
+
+    facets = {
+        name: [
+            {"$match": {field: {"$ne": None}}},
+            {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}},
+            {"$limit": 50},
+        ]
+        for name, field in spec["facets"].items()
+    }
+    if resource == "hotels":
+        facets["price"] = [{"$bucket": {
+            "groupBy": "$price_per_night",
+            "boundaries": HOTEL_PRICE_BUCKETS + [float("inf")],
+            "default": "unknown",
+            "output": {"count": {"$sum": 1}},
+        }}]
+    pipeline.append({"$facet": {
+        "results": [{"$sort": sort}, {"$limit": limit}, {"$project": projection}],
+        "total": [{"$count": "count"}],
+        **facets,
+    }})
+
+    options = {"collation": collation} if collation else {}
+    rows = await db[resource].aggregate(pipeline, **options).to_list(1)
+    row = rows[0] if rows else {}
+    facet_counts = {name: [{"value": r["_id"], "count": r["count"]} for r in row.get(name, [])] for name in facets}
+    if "price" in facet_counts:
+        for bucket in facet_counts["price"]:
+            if bucket["value"] == "unknown":
+                continue
+            upper = next((b for b in HOTEL_PRICE_BUCKETS if b > bucket["value"]), None)
+            bucket["value"] = {"min": bucket["value"], "max": upper}
+    return {
+        "total": row["total"][0]["count"] if row.get("total") else 0,
+        "results": [use_thumbnails(doc) for doc in row.get("results", [])],
+        "facets": facet_counts,
+    }
+
+@api_router.get("/search")
+async def search(
+    q: Optional[str] = None,
+    type: str = "all",
+    city: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    category: Optional[str] = None,
+    region: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    permit: Optional[bool] = None,
+    limit: int = 20
+):
+    """Ranked search over hotels and tourist spots with facet counts.
+
+    Hotel filters: city, min_price, max_price. Tourist spot filters: category, region,
+    difficulty, permit. Facet counts reflect the query and the filters applied.
+    """
+    resources = list(SEARCH_RESOURCES) if type == "all" else [type]
+    if any(r not in SEARCH_RESOURCES for r in resources):
+        raise HTTPException(status_code=400, detail="type must be hotels, tourist_spots or all")
+    q = q.strip() if q else None
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+
+    # The city filter is the same case-insensitive prefix match as /hotels. Text indexes only
+    # support the simple collation, so alongside q it is an anchored case-insensitive regex
+    # applied to the text matches instead
+    hotel_filters = {}
+    collations = {}
+    if city and q:
+        hotel_filters["city"] = {"$regex": f"^{re.escape(city)}", "$options": "i"}
+    elif city:
+        hotel_filters["city"] = prefix_range(city)
+        collations["hotels"] = CASE_INSENSITIVE
+    if min_price is not None or max_price is not None:
+        hotel_filters["price_per_night"] = {
+            **({"$gte": min_price} if min_price is not None else {}),
+            **({"$lte": max_price} if max_price is not None else {}),
+        }
+    spot_filters = {
+        field: value for field, value in
+        {"category": category, "region": region, "difficulty": difficulty, "permit": permit}.items()
+        if value is not None
+    }
+    filters = {"hotels": hotel_filters, "tourist_spots": spot_filters}
+
+    results = await asyncio.gather(*(search_collection(r, q, filters[r], limit, collations.get(r)) for r in resources))
+    return dict(zip(resources, results))
+
+@api_router.get("/search/autocomplete")
+async def search_autocomplete(q: str, type: str = "all", limit: int = 8):
+    """Names starting with `q` (case-insensitive), for search-as-you-type."""
+    q = q.strip()
+    if not q:
+        return []
+    if type not in ("all", *SEARCH_RESOURCES):
+        raise HTTPException(status_code=400, detail="type must be hotels, tourist_spots or all")
+    limit = max(1, min(limit, 20))
+    lookups = []
+    if type in ("all", "hotels"):
+        lookups.append(("hotels", {**SEARCH_RESOURCES["hotels"]["match"], "name": prefix_range(q)}))
+    if type in ("all", "tourist_spots"):
+        lookups.append(("tourist_spots", {"$or": [{"name": prefix_range(q)}, {"name_ne": prefix_range(q)}]}))
+
+    async def _suggest(resource: str, query: dict) -> list:
+        docs = await db[resource].find(
+            query, {"_id": 0, "id": 1, "name": 1, "name_ne": 1}, collation=CASE_INSENSITIVE
+        ).sort("name", ASCENDING).limit(limit).to_list(limit)
+        return [{**doc, "type": resource} for doc in docs]
+
+    suggestions = [s for group in await asyncio.gather(*(_suggest(r, query) for r, query in lookups)) for s in group]
+    suggestions.sort(key=lambda s: s["name"].lower())
+    return suggestions[:limit]
+
+# ==================== OUTBOUND HTTP ====================
+# One long-lived httpx client per upstream host, so keep-alive connections (and HTTP/2 where
+# the optional `h2` package is installed) are reused across requests. Each upstream has its
+# own connection limit and default timeout, and every call is recorded in UPSTREAM_METRICS.
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+UPSTREAMS = {
+    "overpass": {"base_url": "https://overpass-api.de", "timeout": 60.0, "max_connections": 4},
+    "openweathermap": {"base_url": "https://api.openweathermap.org", "timeout": 20.0, "max_connections": 20},
+    "open-meteo": {"base_url": "https://api.open-meteo.com", "timeout": 10.0, "max_connections": 20},
+}
+
+UPSTREAM_METRICS = {
+    name: {"requests": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "last_error": None}
+    for name in UPSTREAMS
+}
+
+_upstream_clients: dict = {}
+
+def upstream_client(name: str) -> httpx.AsyncClient:
+    http_client = _upstream_clients.get(name)
+    if http_client is None:
+        spec = UPSTREAMS[name]
+        http_client = httpx.AsyncClient(
+            base_url=spec["base_url"],
+            timeout=httpx.Timeout(spec["timeout"], connect=5.0),
+            limits=httpx.Limits(
+                max_connections=spec["max_connections"],
+                max_keepalive_connections=spec["max_connections"],
+                keepalive_expiry=60.0
+            ),
+            http2=HTTP2_AVAILABLE
+        )
+        _upstream_clients[name] = http_client
+    return http_client
+
+async def upstream_request(name: str, method: str, url: str, **kwargs) -> httpx.Response:
+    """Send a request through the shared client for `name`, recording latency and errors."""
+    metrics = UPSTREAM_METRICS[name]
+    started = time.perf_counter()
+    try:
+        resp = await upstream_client(name).request(method, url, **kwargs)
+    except httpx.HTTPError as e:
+        metrics["errors"] += 1
+        metrics["last_error"] = f"{type(e).__name__}: {str(e)}"
+        raise
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        metrics["requests"] += 1
+        metrics["total_ms"] += elapsed_ms
+        metrics["max_ms"] = max(metrics["max_ms"], elapsed_ms)
+    if resp.status_code >= 400:
+        metrics["errors"] += 1
+        metrics["last_error"] = f"HTTP {resp.status_code}"
+    return resp
+
+async def close_upstream_clients() -> None:
+    for http_client in _upstream_clients.values():
+        await http_client.aclose()
+    _upstream_clients.clear()
+
+class CircuitBreaker:
+    """Stop calling an upstream after `failure_threshold` consecutive failures.
+
+    While open, `allow()` returns False until `reset_timeout` seconds have passed; then a single
+    trial call is let through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial_running or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+# Upstreams that have a fallback register a breaker here so its state shows up in the metrics
+UPSTREAM_BREAKERS: dict = {}
+
+@api_router.get("/admin/upstream-metrics")
+async def get_upstream_metrics(admin_id: str = Depends(get_admin_user)):
+    return {
+        name: {
+            **m,
+            "avg_ms": round(m["total_ms"] / m["requests"], 1) if m["requests"] else None,
+            "total_ms": round(m["total_ms"], 1),
+            "max_ms": round(m["max_ms"], 1),
+            "circuit": UPSTREAM_BREAKERS[name].state if name in UPSTREAM_BREAKERS else None,
+        }
+        for name, m in UPSTREAM_METRICS.items()
+    }
+
+# ==================== RESPONSE CACHE ====================
+class SWRCache:
+    """TTL cache with stale-while-revalidate and request coalescing.
+
+    Entries younger than `fresh_ttl` are served as-is. Entries up to `stale_ttl` past that are
+    served immediately while a single background refresh runs. Concurrent misses for the same
+    key share one upstream call. With `persistent=True` entries are also written to the
+    `api_cache` collection (expired by a TTL index) so they survive restarts and are shared
+    between workers.
+    """
+
+    def __init__(self, namespace: str, fresh_ttl: float, stale_ttl: float, max_entries: int = 1024, persistent: bool = True):
+        self.namespace = namespace
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.persistent = persistent
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: dict = {}
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+        elif self.persistent:
+            entry = await self._load(key)
+
+        if entry is not None:
+            value, fetched_at = entry
+            age = time.time() - fetched_at
+            if age < self.fresh_ttl:
+                return value
+            if age < self.fresh_ttl + self.stale_ttl:
+                self._refresh_in_background(key, fetch)
+                return value
+
+        return await self._fetch(key, fetch)
+
+    async def refresh(self, key: str, fetch: Callable[[], Awaitable[Any]], min_age: float = 0.0) -> bool:
+        """Re-fetch `key` unless its entry is younger than `min_age` seconds. Returns True if fetched.
+
+        The persistent copy is checked first, so an entry another worker just refreshed is reused.
+        """
+        entry = await self._load(key) if self.persistent else self._memory.get(key)
+        if entry is not None and time.time() - entry[1] < min_age:
+            return False
+        await self._fetch(key, fetch)
+        return True
+
+    async def _fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._run(key, fetch))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: one caller disconnecting must not cancel the fetch the others are waiting on
+        return await asyncio.shield(task)
+
+    def _refresh_in_background(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> None:
+        if key in self._inflight:
+            return
+        task = asyncio.create_task(self._run(key, fetch))
+        self._inflight[key] = task
+
+        def _done(t):
+            self._inflight.pop(key, None)
+            if not t.cancelled() and t.exception() is not None:
+                logging.warning(f"[CACHE] Background refresh of {self.namespace}:{key} failed: {t.exception()}")
+
+        task.add_done_callback(_done)
+
+    async def _run(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        value = await fetch()
+        fetched_at = time.time()
+        self._remember(key, value, fetched_at)
+        if self.persistent:
+            await self._save(key, value, fetched_at)
+        return value
+
+    def _remember(self, key: str, value: Any, fetched_at: float) -> None:
+        self._memory[key] = (value, fetched_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def _load(self, key: str) -> Optional[tuple]:
+        try:
+            doc = await db.api_cache.find_one({"key": f"{self.namespace}:{key}"}, {"_id": 0, "value": 1, "fetched_at": 1})
+        except PyMongoError as e:
+            logging.warning(f"[CACHE] Read from api_cache failed: {str(e)}")
+            return None
+        if not doc:
+            return None
+        entry = (json.loads(doc["value"]), doc["fetched_at"])
+        self._remember(key, *entry)
+        return entry
+
+    async def _save(self, key: str, value: Any, fetched_at: float) -> None:
+        expires_at = datetime.fromtimestamp(fetched_at + self.fresh_ttl + self.stale_ttl, tz=timezone.utc)
+        try:
+            # Stored as a JSON string: upstream payloads may contain keys Mongo rejects
+            await db.api_cache.update_one(
+                {"key": f"{self.namespace}:{key}"},
+                {"$set": {"value": json.dumps(value), "fetched_at": fetched_at, "expires_at": expires_at}},
+                upsert=True
+            )
+        except PyMongoError as e:
+            logging.warning(f"[CACHE] Write to api_cache failed: {str(e)}")
+
 # ==================== POINTS OF INTEREST (POI) - Overpass (OSM) PROXY ====================
+# Overpass is slow and rate limited, so results are cached on quantized request parameters:
+# coordinates are rounded to ~110 m and the radius is rounded up to a 250 m step.
+POI_CACHE_TTL_SECONDS = int(os.environ.get("POI_CACHE_TTL_SECONDS", str(6 * 60 * 60)))
+POI_CACHE_STALE_SECONDS = int(os.environ.get("POI_CACHE_STALE_SECONDS", str(7 * 24 * 60 * 60)))
+POI_COORD_PRECISION = 3
+POI_RADIUS_STEP = 250
+poi_cache = SWRCache("pois", POI_CACHE_TTL_SECONDS, POI_CACHE_STALE_SECONDS)
+
+def normalize_overpass_elements(elements: list, type_keys: tuple, default_type: str) -> list:
+    """Simplify Overpass elements into POI dicts, skipping ones without coordinates and duplicates.
+
+    `type_keys` are the tags checked, in order, for the POI type (e.g. amenity before shop).
+    """
+    pois = []
+    seen = set()
+    for el in elements:
+        tags = el.get('tags', {}) or {}
+        name = tags.get('name') or tags.get('operator') or tags.get('brand') or 'Unknown'
+        # node has lat/lon, way/relation have center
+        if el.get('type') == 'node':
+            lat_e = el.get('lat')
+            lon_e = el.get('lon')
+        else:
+            center = el.get('center') or {}
+            lat_e = center.get('lat')
+            lon_e = center.get('lon')
+
+        if lat_e is None or lon_e is None:
+            continue
+
+        # De-duplicate by (osm_type,id)
+        key = (el.get('type'), el.get('id'))
+        if key in seen:
+            continue
+        seen.add(key)
+
+        pois.append({
+            'id': el.get('id'),
+            'osm_type': el.get('type'),
+            'name': str(name).strip(),
+            'type': next((tags[k] for k in type_keys if tags.get(k)), default_type),
+            'latitude': lat_e,
+            'longitude': lon_e,
+            'tags': tags
+        })
+    return pois
+
+def _normalize_poi_types(types: Optional[str]) -> str:
+    """Lowercase, de-duplicate and sort the types; drop anything that is not a plain tag value."""
+    tokens = {t.strip().lower() for t in (types or "").split("|")}
+    return "|".join(sorted(t for t in tokens if re.fullmatch(r"[a-z0-9_]+", t)))
+
 @api_router.get('/pois')
 async def get_pois(lat: float, lon: float, radius: int = 1500, types: Optional[str] = 'restaurant|hotel|cafe|atm'):
     """Query Overpass API for nearby POIs (restaurants, hotels, ATMs, etc.) and return simplified list."""
@@ -1714,194 +4065,433 @@ async def get_pois(lat: float, lon: float, radius: int = 1500, types: Optional[s
     if not lat or not lon:
         raise HTTPException(status_code=400, detail="lat and lon are required")
 
-    # limit types to amenity and shop tags commonly used for POIs
-    overpass_query = f"""[out:json][timeout:25];(node["amenity"~"{types}"](around:{radius},{lat},{lon});way["amenity"~"{types}"](around:{radius},{lat},{lon});relation["amenity"~"{types}"](around:{radius},{lat},{lon});node["shop"~"{types}"](around:{radius},{lat},{lon});way["shop"~"{types}"](around:{radius},{lat},{lon});relation["shop"~"{types}"](around:{radius},{lat},{lon}););out center;"""
+    lat = round(lat, POI_COORD_PRECISION)
+    lon = round(lon, POI_COORD_PRECISION)
+    radius = max(POI_RADIUS_STEP, -(-radius // POI_RADIUS_STEP) * POI_RADIUS_STEP)
+    types = _normalize_poi_types(types)
+    if not types:
+        raise HTTPException(status_code=400, detail="types must be a |-separated list of tag values")
+
+    if poi_index_covers(lat, lon):
+        return await query_poi_index_near(lat, lon, radius, types)
 
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            resp = await client.post('https://overpass-api.de/api/interpreter', data=overpass_query)
-            resp.raise_for_status()
-            data = resp.json()
-
-        pois = []
-        for el in data.get('elements', []):
-            tags = el.get('tags', {}) or {}
-            name = tags.get('name') or tags.get('operator') or tags.get('brand') or 'Unknown'
-            # node has lat/lon, way/relation have center
-            if el.get('type') == 'node':
-                lat_e = el.get('lat')
-                lon_e = el.get('lon')
-            else:
-                center = el.get('center') or {}
-                lat_e = center.get('lat')
-                lon_e = center.get('lon')
+        return await poi_cache.get_or_fetch(f"{lat}:{lon}:{radius}:{types}", lambda: _fetch_pois(lat, lon, radius, types))
+    except httpx.HTTPError as e:
+        logging.error(f"Overpass request failed: {str(e)}")
+        raise HTTPException(status_code=502, detail="Failed to fetch POIs from Overpass")
 
-            if lat_e is None or lon_e is None:
-                continue
 
-            # Normalize type: prefer amenity, then shop or tourism
-            poi_type = tags.get('amenity') or tags.get('shop') or tags.get('tourism') or 'unknown'
+async def _fetch_pois(lat: float, lon: float, radius: int, types: str) -> list:
+    # limit types to amenity and shop tags commonly used for POIs
+    overpass_query = f"""[out:json][timeout:25];(node["amenity"~"{types}"](around:{radius},{lat},{lon});way["amenity"~"{types}"](around:{radius},{lat},{lon});relation["amenity"~"{types}"](around:{radius},{lat},{lon});node["shop"~"{types}"](around:{radius},{lat},{lon});way["shop"~"{types}"](around:{radius},{lat},{lon});relation["shop"~"{types}"](around:{radius},{lat},{lon}););out center;"""
 
-            # Clean up name (strip whitespace)
-            name = str(name).strip()
+    resp = await upstream_request("overpass", "POST", "/api/interpreter", data=overpass_query, timeout=30.0)
+    resp.raise_for_status()
+    data = resp.json()
+
+    # Normalize type: prefer amenity, then shop or tourism. Limit results to 2000 for safety
+    return normalize_overpass_elements(data.get('elements', []), ('amenity', 'shop', 'tourism'), 'unknown')[:2000]
+
+
+# ==================== WEATHER ====================
+# /weather serves OpenWeatherMap when it is configured and healthy, and fails over to Open-Meteo
+# otherwise. Results are cached per ~1 km cell, and the coordinates of every tourist spot are
+# refreshed on a schedule so destination pages are answered from the cache. The prefetch is off by
+# default (it spends upstream quota); when enabled, a lease lets one worker per interval run it.
+WEATHER_CACHE_TTL_SECONDS = int(os.environ.get("WEATHER_CACHE_TTL_SECONDS", "600"))
+WEATHER_CACHE_STALE_SECONDS = int(os.environ.get("WEATHER_CACHE_STALE_SECONDS", "3600"))
+WEATHER_COORD_PRECISION = 2
+WEATHER_PREFETCH_ENABLED = os.environ.get("WEATHER_PREFETCH_ENABLED", "false").lower() == "true"
+WEATHER_PREFETCH_INTERVAL_SECONDS = int(os.environ.get("WEATHER_PREFETCH_INTERVAL_SECONDS", "300"))
+WEATHER_PREFETCH_CONCURRENCY = 4
+weather_cache = SWRCache("weather", WEATHER_CACHE_TTL_SECONDS, WEATHER_CACHE_STALE_SECONDS, max_entries=4096)
+UPSTREAM_BREAKERS["openweathermap"] = CircuitBreaker(
+    failure_threshold=int(os.environ.get("WEATHER_BREAKER_FAILURES", "3")),
+    reset_timeout=float(os.environ.get("WEATHER_BREAKER_RESET_SECONDS", "120"))
+)
 
-            pois.append({
-                'id': el.get('id'),
-                'osm_type': el.get('type'),
-                'name': name,
-                'type': poi_type,
-                'latitude': lat_e,
-                'longitude': lon_e,
-                'tags': tags
-            })
+async def _fetch_openweathermap(lat: float, lon: float, api_key: str) -> dict:
+    # Use One Call API (v2.5/3.0 compatibility). Exclude minutely and hourly to keep response small
+    params = {"lat": lat, "lon": lon, "exclude": "minutely,hourly", "units": "metric", "appid": api_key}
+    resp = await upstream_request("openweathermap", "GET", "/data/2.5/onecall", params=params)
+    resp.raise_for_status()
+    data = resp.json()
 
-        # De-duplicate by (osm_type,id)
-        seen = set()
-        unique_pois = []
-        for p in pois:
-            key = (p['osm_type'], p['id'])
-            if key not in seen:
-                seen.add(key)
-                unique_pois.append(p)
-
-        # Limit results to 2000 for safety
-        return unique_pois[:2000]
-    except httpx.HTTPError as e:
-        logging.error(f"Overpass request failed: {str(e)}")
-        raise HTTPException(status_code=502, detail="Failed to fetch POIs from Overpass")
+    # Only return useful fields to the frontend
+    return {
+        'lat': lat,
+        'lon': lon,
+        'current': {
+            'temp': data.get('current', {}).get('temp'),
+            'weather': data.get('current', {}).get('weather', []),
+            'humidity': data.get('current', {}).get('humidity'),
+            'wind_speed': data.get('current', {}).get('wind_speed'),
+        },
+        'alerts': data.get('alerts', []),
+        'source': 'openweathermap'
+    }
 
+async def _fetch_open_meteo(lat: float, lon: float) -> dict:
+    params = {"latitude": lat, "longitude": lon, "current_weather": "true", "timezone": "UTC"}
+    resp = await upstream_request("open-meteo", "GET", "/v1/forecast", params=params)
+    resp.raise_for_status()
+    data = resp.json()
 
-# ==================== WEATHER PROXY (OpenWeatherMap) ====================
-@api_router.get('/weather')
-async def get_weather(lat: float, lon: float):
-    """Return current weather and alerts for the given coordinates using OpenWeatherMap One Call API.
-    Requires OPENWEATHER_API_KEY in environment.
-    """
+    cw = data.get('current_weather', {})
+    return {
+        'lat': lat,
+        'lon': lon,
+        'current': {
+            'temp': cw.get('temperature'),
+            'weather': [{'description': 'Current weather from Open-Meteo'}],
+            'humidity': None,
+            'wind_speed': cw.get('windspeed')
+        },
+        'alerts': [],
+        'source': 'open-meteo'
+    }
+
+async def _fetch_weather(lat: float, lon: float) -> dict:
+    """OpenWeatherMap first (it has alerts); Open-Meteo when there is no key or the circuit is open."""
     api_key = os.environ.get('OPENWEATHER_API_KEY')
-    if not api_key:
-        return JSONResponse(status_code=400, content={"detail": "OPENWEATHER_API_KEY not configured"})
+    breaker = UPSTREAM_BREAKERS["openweathermap"]
+    if api_key and breaker.allow():
+        try:
+            result = await _fetch_openweathermap(lat, lon, api_key)
+            breaker.record_success()
+            return result
+        except httpx.HTTPStatusError as e:
+            # A 4xx (bad key, bad request) says nothing about OpenWeatherMap's health; only
+            # rate limiting and server errors count against the breaker
+            status_code = e.response.status_code
+            if status_code == 429 or status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            logging.warning(f"OpenWeather request failed, using Open-Meteo: {str(e)}")
+        except (httpx.HTTPError, ValueError) as e:
+            breaker.record_failure()
+            logging.warning(f"OpenWeather request failed, using Open-Meteo: {str(e)}")
+    return await _fetch_open_meteo(lat, lon)
 
-    # Use One Call API (v2.5/3.0 compatibility). Exclude minutely and hourly to keep response small
-    url = f"https://api.openweathermap.org/data/2.5/onecall?lat={lat}&lon={lon}&exclude=minutely,hourly&units=metric&appid={api_key}"
+def _weather_cell(lat: float, lon: float) -> tuple:
+    return round(lat, WEATHER_COORD_PRECISION), round(lon, WEATHER_COORD_PRECISION)
 
+@api_router.get('/weather')
+async def get_weather(lat: float, lon: float):
+    """Return current weather (and alerts, when OpenWeatherMap is available) for the given coordinates."""
+    cell_lat, cell_lon = _weather_cell(lat, lon)
     try:
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            resp = await client.get(url)
-            resp.raise_for_status()
-            data = resp.json()
-
-        # Only return useful fields to the frontend
-        result = {
-            'lat': lat,
-            'lon': lon,
-            'current': {
-                'temp': data.get('current', {}).get('temp'),
-                'weather': data.get('current', {}).get('weather', []),
-                'humidity': data.get('current', {}).get('humidity'),
-                'wind_speed': data.get('current', {}).get('wind_speed'),
-            },
-            'alerts': data.get('alerts', [])
-        }
-        return result
-    except httpx.HTTPError as e:
-        logging.error(f"OpenWeather request failed: {str(e)}")
+        result = await weather_cache.get_or_fetch(f"{cell_lat}:{cell_lon}", lambda: _fetch_weather(cell_lat, cell_lon))
+    except (httpx.HTTPError, ValueError) as e:
+        logging.error(f"Weather request failed: {str(e)}")
         raise HTTPException(status_code=502, detail="Failed to fetch weather data")
+    return {**result, 'lat': lat, 'lon': lon}
 
 
 @api_router.get('/weather/fallback')
 async def get_weather_fallback(lat: float, lon: float):
-    """Fallback weather using Open-Meteo (no API key required). Returns basic current weather only."""
+    """Fallback weather using Open-Meteo (no API key required). Returns basic current weather only.
+    Kept for older clients; /weather already fails over to Open-Meteo on its own.
+    """
+    cell_lat, cell_lon = _weather_cell(lat, lon)
     try:
-        url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current_weather=true&timezone=UTC"
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.get(url)
-            resp.raise_for_status()
-            data = resp.json()
-
-        cw = data.get('current_weather', {})
-        result = {
-            'lat': lat,
-            'lon': lon,
-            'current': {
-                'temp': cw.get('temperature'),
-                'weather': [{'description': 'Current weather from Open-Meteo'}],
-                'humidity': None,
-                'wind_speed': cw.get('windspeed')
-            },
-            'alerts': [],
-            'source': 'open-meteo'
-        }
-        return result
-    except httpx.HTTPError as e:
+        result = await weather_cache.get_or_fetch(
+            f"open-meteo:{cell_lat}:{cell_lon}", lambda: _fetch_open_meteo(cell_lat, cell_lon)
+        )
+    except (httpx.HTTPError, ValueError) as e:
         logging.error(f"Open-Meteo request failed: {str(e)}")
         raise HTTPException(status_code=502, detail="Failed to fetch fallback weather data")
+    return {**result, 'lat': lat, 'lon': lon}
+
+async def prefetch_spot_weather() -> dict:
+    """Refresh the cached weather for every tourist spot cell that is due.
+
+    A cell is due once half its TTL has passed, so a cell is refreshed before it goes stale and
+    cells another worker has just refreshed are skipped.
+    """
+    cells = set()
+    async for spot in db.tourist_spots.find(
+        {"latitude": {"$ne": None}, "longitude": {"$ne": None}}, {"_id": 0, "latitude": 1, "longitude": 1}
+    ):
+        cells.add(_weather_cell(spot["latitude"], spot["longitude"]))
+
+    semaphore = asyncio.Semaphore(WEATHER_PREFETCH_CONCURRENCY)
+    refreshed, failed = 0, 0
+
+    async def _refresh(cell_lat: float, cell_lon: float) -> None:
+        nonlocal refreshed, failed
+        async with semaphore:
+            try:
+                if await weather_cache.refresh(
+                    f"{cell_lat}:{cell_lon}", lambda: _fetch_weather(cell_lat, cell_lon),
+                    min_age=WEATHER_CACHE_TTL_SECONDS / 2
+                ):
+                    refreshed += 1
+            except (httpx.HTTPError, ValueError) as e:
+                failed += 1
+                logging.warning(f"[WEATHER] Prefetch for {cell_lat},{cell_lon} failed: {str(e)}")
+
+    await asyncio.gather(*(_refresh(cell_lat, cell_lon) for cell_lat, cell_lon in cells))
+    report = {"cells": len(cells), "refreshed": refreshed, "failed": failed}
+    logging.info(f"[WEATHER] Prefetch finished: {report}")
+    return report
+
+async def _acquire_weather_prefetch_lease() -> bool:
+    """One worker prefetches per interval; the lease is simply left to expire."""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.job_leases.find_one_and_update(
+            {"id": "weather_prefetch", "expires_at": {"$lt": now}},
+            {"$set": {"owner": WORKER_ID, "expires_at": now + timedelta(seconds=WEATHER_PREFETCH_INTERVAL_SECONDS * 0.9)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+async def weather_prefetch_loop() -> None:
+    while True:
+        try:
+            if await _acquire_weather_prefetch_lease():
+                await prefetch_spot_weather()
+        except PyMongoError as e:
+            logging.error(f"[WEATHER] Prefetch scheduler error: {str(e)}")
+        await asyncio.sleep(WEATHER_PREFETCH_INTERVAL_SECONDS)
 
 
 # ==================== TOURIST POIS (Overpass) ====================
+# Bounding boxes are widened outward to a 0.01° grid so nearby map views share cache entries
+TOURIST_POI_BBOX_STEP = 0.01
+
+def _snap_bbox(minlat: float, minlon: float, maxlat: float, maxlon: float) -> tuple:
+    step = TOURIST_POI_BBOX_STEP
+    return (
+        round(math.floor(minlat / step) * step, 2),
+        round(math.floor(minlon / step) * step, 2),
+        round(math.ceil(maxlat / step) * step, 2),
+        round(math.ceil(maxlon / step) * step, 2),
+    )
+
 @api_router.get('/tourist-pois')
 async def get_tourist_pois(bbox: Optional[str] = None, country: Optional[str] = None, limit: int = 1000):
     """Query Overpass API for tourist-related POIs. Use bbox (minlat,minlon,maxlat,maxlon) or country name (e.g., 'Nepal')."""
     if not bbox and not country:
         raise HTTPException(status_code=400, detail="Provide bbox or country")
 
+    limit = max(1, min(limit, 5000))
     if country:
         # Use area query for country
+        country = country.strip()
+        if not re.fullmatch(r"[\w .'-]+", country):
+            raise HTTPException(status_code=400, detail="Invalid country name")
+        if _poi_index_ready and country.lower() == POI_INDEX_COUNTRY.lower():
+            return await query_poi_index_tourism(None, limit)
+        cache_key = f"country:{country.lower()}:{limit}"
         overpass_query = f"[out:json][timeout:60];area[name=\"{country}\"][admin_level=2]->.searchArea;(node[\"tourism\"](area.searchArea);way[\"tourism\"](area.searchArea);relation[\"tourism\"](area.searchArea););out center {limit};"
     else:
         # bbox format: minlat,minlon,maxlat,maxlon
         try:
-            minlat, minlon, maxlat, maxlon = map(float, bbox.split(','))
+            minlat, minlon, maxlat, maxlon = _snap_bbox(*map(float, bbox.split(',')))
         except Exception:
             raise HTTPException(status_code=400, detail="bbox must be minlat,minlon,maxlat,maxlon")
+        if poi_index_covers(minlat, minlon) and poi_index_covers(maxlat, maxlon):
+            return await query_poi_index_tourism((minlat, minlon, maxlat, maxlon), limit)
+        cache_key = f"bbox:{minlat},{minlon},{maxlat},{maxlon}:{limit}"
         overpass_query = f"[out:json][timeout:60];(node[\"tourism\"]({minlat},{minlon},{maxlat},{maxlon});way[\"tourism\"]({minlat},{minlon},{maxlat},{maxlon});relation[\"tourism\"]({minlat},{minlon},{maxlat},{maxlon}););out center {limit};"
 
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            resp = await client.post('https://overpass-api.de/api/interpreter', data=overpass_query)
-            resp.raise_for_status()
-            data = resp.json()
-
-        pois = []
-        for el in data.get('elements', []):
-            tags = el.get('tags', {}) or {}
-            name = tags.get('name') or tags.get('operator') or tags.get('brand') or 'Unknown'
-            if el.get('type') == 'node':
-                lat_e = el.get('lat')
-                lon_e = el.get('lon')
-            else:
-                center = el.get('center') or {}
-                lat_e = center.get('lat')
-                lon_e = center.get('lon')
-
-            if lat_e is None or lon_e is None:
-                continue
-
-            poi_type = tags.get('tourism') or tags.get('amenity') or 'tourist_spot'
-
-            pois.append({
-                'id': el.get('id'),
-                'osm_type': el.get('type'),
-                'name': str(name).strip(),
-                'type': poi_type,
-                'latitude': lat_e,
-                'longitude': lon_e,
-                'tags': tags
-            })
-
-        # Deduplicate and limit
-        seen = set()
-        unique = []
-        for p in pois:
-            key = (p['osm_type'], p['id'])
-            if key not in seen:
-                seen.add(key)
-                unique.append(p)
-
-        return unique[:min(limit, 5000)]
+        return await poi_cache.get_or_fetch(cache_key, lambda: _fetch_tourist_pois(overpass_query, limit))
     except httpx.HTTPError as e:
         logging.error(f"Overpass tourist request failed: {str(e)}")
         raise HTTPException(status_code=502, detail="Failed to fetch tourist POIs from Overpass")
 
+
+async def _fetch_tourist_pois(overpass_query: str, limit: int) -> list:
+    resp = await upstream_request("overpass", "POST", "/api/interpreter", data=overpass_query)
+    resp.raise_for_status()
+    data = resp.json()
+
+    return normalize_overpass_elements(data.get('elements', []), ('tourism', 'amenity'), 'tourist_spot')[:limit]
+
+# ==================== LOCAL POI INDEX ====================
+# The POI universe for Nepal is finite, so a background job bulk-loads tourism/amenity/shop
+# POIs for the configured bounding boxes into the 2dsphere-indexed `pois` collection.
+# Once a full ingestion has completed, /pois and /tourist-pois are answered from that index;
+# Overpass is only hit by the scheduled refresh (or by the cached proxy when disabled).
+POI_INDEX_ENABLED = os.environ.get("POI_INDEX_ENABLED", "false").lower() == "true"
+# minlat,minlon,maxlat,maxlon; separate multiple boxes with ';'. Default covers Nepal.
+POI_INDEX_BBOXES = [
+    tuple(float(v) for v in box.split(","))
+    for box in os.environ.get("POI_INDEX_BBOXES", "26.3,80.0,30.5,88.3").split(";") if box.strip()
+]
+POI_INDEX_COUNTRY = os.environ.get("POI_INDEX_COUNTRY", "Nepal")
+POI_INDEX_TILE_DEGREES = float(os.environ.get("POI_INDEX_TILE_DEGREES", "0.5"))
+POI_INDEX_REFRESH_HOURS = float(os.environ.get("POI_INDEX_REFRESH_HOURS", "24"))
+POI_INDEX_TILE_PAUSE_SECONDS = float(os.environ.get("POI_INDEX_TILE_PAUSE_SECONDS", "5"))
+# Renewed before every tile, so it only has to outlast one tile query (up to 200 s) and the pause
+POI_INDEX_LEASE_SECONDS = 15 * 60
+WORKER_ID = f"{os.uname().nodename if hasattr(os, 'uname') else 'worker'}:{os.getpid()}"
+
+_poi_index_ready = False
+
+def _poi_index_tiles() -> list:
+    """Split the configured bounding boxes into tiles small enough for one Overpass query each."""
+    step = POI_INDEX_TILE_DEGREES
+    tiles = []
+    for minlat, minlon, maxlat, maxlon in POI_INDEX_BBOXES:
+        lat = minlat
+        while lat < maxlat:
+            lon = minlon
+            while lon < maxlon:
+                tiles.append((round(lat, 4), round(lon, 4), round(min(lat + step, maxlat), 4), round(min(lon + step, maxlon), 4)))
+                lon += step
+            lat += step
+    return tiles
+
+def _bbox_polygon(minlat: float, minlon: float, maxlat: float, maxlon: float) -> dict:
+    return {"type": "Polygon", "coordinates": [[
+        [minlon, minlat], [maxlon, minlat], [maxlon, maxlat], [minlon, maxlat], [minlon, minlat]
+    ]]}
+
+def poi_index_covers(lat: float, lon: float) -> bool:
+    return _poi_index_ready and any(
+        minlat <= lat <= maxlat and minlon <= lon <= maxlon for minlat, minlon, maxlat, maxlon in POI_INDEX_BBOXES
+    )
+
+def _poi_from_index(doc: dict, type_keys: tuple, default_type: str) -> dict:
+    """Shape an indexed POI exactly like the Overpass proxy responses."""
+    tags = doc.get("tags") or {}
+    return {
+        'id': doc["osm_id"],
+        'osm_type': doc["osm_type"],
+        'name': doc["name"],
+        'type': next((tags[k] for k in type_keys if tags.get(k)), default_type),
+        'latitude': doc["latitude"],
+        'longitude': doc["longitude"],
+        'tags': tags
+    }
+
+async def query_poi_index_near(lat: float, lon: float, radius: int, types: str, limit: int = 2000) -> list:
+    # Same unanchored match as the Overpass proxy's ["amenity"~"<types>"], so e.g. "cafe" also
+    # returns internet_cafe; types is already restricted to [a-z0-9_] words joined by |
+    docs = await find_near(
+        db.pois, lat, lon, {"_id": 0, "location": 0}, query={"categories": {"$regex": types}},
+        max_distance_m=radius, limit=limit, key="location"
+    )
+    return [_poi_from_index(d, ('amenity', 'shop', 'tourism'), 'unknown') for d in docs]
+
+async def query_poi_index_tourism(bbox: Optional[tuple], limit: int) -> list:
+    query = {"tourism": {"$ne": None}}
+    if bbox:
+        query["location"] = {"$geoWithin": {"$geometry": _bbox_polygon(*bbox)}}
+    docs = await db.pois.find(query, {"_id": 0}).limit(limit).to_list(limit)
+    return [_poi_from_index(d, ('tourism', 'amenity'), 'tourist_spot') for d in docs]
+
+async def _ingest_poi_tile(tile: tuple, run_started: datetime) -> int:
+    minlat, minlon, maxlat, maxlon = tile
+    area = f"({minlat},{minlon},{maxlat},{maxlon})"
+    overpass_query = f'[out:json][timeout:180];(nwr["tourism"]{area};nwr["amenity"]{area};nwr["shop"]{area};);out center tags;'
+    resp = await upstream_request("overpass", "POST", "/api/interpreter", data=overpass_query, timeout=200.0)
+    resp.raise_for_status()
+    pois = normalize_overpass_elements(resp.json().get('elements', []), ('amenity', 'shop', 'tourism'), 'unknown')
+
+    operations = []
+    for poi in pois:
+        tags = poi['tags']
+        operations.append(UpdateOne({"osm_key": f"{poi['osm_type']}/{poi['id']}"}, {"$set": {
+            "osm_id": poi['id'],
+            "osm_type": poi['osm_type'],
+            "name": poi['name'],
+            "latitude": poi['latitude'],
+            "longitude": poi['longitude'],
+            "location": {"type": "Point", "coordinates": [poi['longitude'], poi['latitude']]},
+            "amenity": tags.get('amenity'),
+            "shop": tags.get('shop'),
+            "tourism": tags.get('tourism'),
+            # amenity/shop values in one array so /pois can filter both with one regex next to $nearSphere
+            "categories": [v for v in (tags.get('amenity'), tags.get('shop')) if v],
+            "tags": tags,
+            "refreshed_at": run_started
+        }}, upsert=True))
+    for i in range(0, len(operations), 1000):
+        await db.pois.bulk_write(operations[i:i + 1000], ordered=False)
+
+    # POIs in this tile that the refresh did not return were removed from OSM
+    await db.pois.delete_many({
+        "location": {"$geoWithin": {"$geometry": _bbox_polygon(*tile)}},
+        "refreshed_at": {"$lt": run_started}
+    })
+    return len(pois)
+
+async def _acquire_poi_index_lease() -> bool:
+    """Only one worker ingests at a time; the lease expires in case that worker dies.
+    The holder calls this again to renew it."""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.poi_index_state.find_one_and_update(
+            {"id": "lease", "$or": [{"expires_at": {"$lt": now}}, {"owner": WORKER_ID}]},
+            {"$set": {"owner": WORKER_ID, "expires_at": now + timedelta(seconds=POI_INDEX_LEASE_SECONDS)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+async def ingest_poi_index(leased: bool = False) -> dict:
+    """Refresh every tile from Overpass. Failed tiles keep their previous data.
+    With leased=True the lease is renewed before each tile and the run stops if it was lost."""
+    global _poi_index_ready
+    run_started = datetime.now(timezone.utc)
+    tiles = _poi_index_tiles()
+    loaded, failed = 0, []
+    for index, tile in enumerate(tiles):
+        if leased and not await _acquire_poi_index_lease():
+            logging.warning(f"[POI INDEX] Lease lost after {index} of {len(tiles)} tiles; stopping")
+            failed.extend(tiles[index:])
+            break
+        try:
+            loaded += await _ingest_poi_tile(tile, run_started)
+        except (httpx.HTTPError, ValueError, PyMongoError) as e:
+            failed.append(tile)
+            logging.error(f"[POI INDEX] Tile {tile} failed: {str(e)}")
+        if index < len(tiles) - 1:
+            # Overpass rate-limits per client; space the tile queries out
+            await asyncio.sleep(POI_INDEX_TILE_PAUSE_SECONDS)
+
+    report = {"tiles": len(tiles), "failed_tiles": len(failed), "pois_loaded": loaded}
+    if not failed:
+        await db.poi_index_state.update_one(
+            {"id": "state"},
+            {"$set": {**report, "last_completed_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+        _poi_index_ready = True
+    logging.info(f"[POI INDEX] Ingestion finished: {report}")
+    return report
+
+async def _load_poi_index_state() -> Optional[dict]:
+    global _poi_index_ready
+    state = await db.poi_index_state.find_one({"id": "state"}, {"_id": 0})
+    _poi_index_ready = bool(state and state.get("last_completed_at"))
+    return state
+
+async def poi_index_loop() -> None:
+    """Scheduler: refresh the index whenever the last complete ingestion is older than the refresh interval."""
+    while True:
+        try:
+            state = await _load_poi_index_state()
+            last = state.get("last_completed_at") if state else None
+            if last is not None and last.tzinfo is None:
+                last = last.replace(tzinfo=timezone.utc)
+            due = last is None or datetime.now(timezone.utc) - last > timedelta(hours=POI_INDEX_REFRESH_HOURS)
+            if due and await _acquire_poi_index_lease():
+                await ingest_poi_index(leased=True)
+        except PyMongoError as e:
+            logging.error(f"[POI INDEX] Scheduler error: {str(e)}")
+        await asyncio.sleep(10 * 60)
+
 # ==================== SOS EMERGENCY ENDPOINT ====================
 class SOSRequest(BaseModel):
     latitude: float
@@ -1909,7 +4499,7 @@ class SOSRequest(BaseModel):
     user_name: Optional[str] = None
     user_email: Optional[str] = None
     user_phone: Optional[str] = None
-    emergency_type: str = "general"  # general, medical, accident, lost
+    emergency_type: Literal["general", "medical", "accident", "lost", "altitude", "weather"] = "general"
     message: Optional[str] = None
 
 class SOSResponse(BaseModel):
@@ -1918,9 +4508,215 @@ class SOSResponse(BaseModel):
     message: str
     nearest_contacts: List[dict]
 
+# ---- SOS dispatch ----
+# Alert notifications never share a queue, worker or SMTP connection with ordinary mail. Each
+# SOS writes one row per notification to sos_deliveries in the request itself, and a fixed
+# set of dispatcher workers (woken immediately in this process, polling for rows created by
+# other workers) sends them over a dedicated connection pool. SMTP and network failures are
+# retried with a short capped backoff and never abandoned; a row left "sending" by a dead worker
+# is claimed again after its lease, so every alert is notified at least once. A row that fails
+# for any other reason is parked as "dead" after a few attempts and reported as a breach. Each sent row records the
+# latency from the POST arriving to the notification leaving, tracked against SOS_P99_TARGET_MS.
+# An alert is stored with delivery_queued=false until its rows exist; if queueing fails in the
+# request, the dispatcher queues it after SOS_RECONCILE_AFTER_SECONDS. Queueing is idempotent
+# per (alert, channel), so the request and the dispatcher can never queue an alert twice.
+SOS_DISPATCH_WORKERS = int(os.environ.get("SOS_DISPATCH_WORKERS", "2"))
+SOS_DISPATCH_POLL_SECONDS = float(os.environ.get("SOS_DISPATCH_POLL_SECONDS", "2"))
+SOS_RETRY_BASE_SECONDS = 2
+SOS_RETRY_MAX_SECONDS = 60
+SOS_DELIVERY_LEASE_SECONDS = 60
+# A row that keeps failing for reasons other than SMTP/network errors is parked as "dead"
+SOS_DEAD_LETTER_ATTEMPTS = 5
+SOS_RECONCILE_AFTER_SECONDS = 5
+SOS_P99_TARGET_MS = float(os.environ.get("SOS_P99_TARGET_MS", "10000"))
+SOS_LATENCY_WINDOW_MINUTES = int(os.environ.get("SOS_LATENCY_WINDOW_MINUTES", "60"))
+
+SOS_DISPATCH_METRICS = {"queued": 0, "sent": 0, "retried": 0, "over_target": 0, "dead": 0}
+
+sos_mail_pool = SMTPPool(SOS_DISPATCH_WORKERS, MAIL_IDLE_SECONDS)
+_sos_wakeup = asyncio.Event()
+
+def _sos_email_context(sos_record: dict) -> dict:
+    return {
+        "emergency_type": sos_record['emergency_type'],
+        "emergency_label": sos_record['emergency_type'].upper(),
+        "user_name": sos_record['user_name'],
+        "user_email": sos_record.get('user_email') or 'Not provided',
+        "user_phone": sos_record.get('user_phone') or 'Not provided',
+        "message": sos_record.get('message') or 'No message',
+        "latitude": sos_record['latitude'],
+        "longitude": sos_record['longitude'],
+        "google_maps_link": sos_record['google_maps_link'],
+        "created_at": sos_record['created_at'],
+    }
+
+async def enqueue_sos_deliveries(sos_record: dict, received_at: datetime) -> None:
+    """Persist the notifications for one alert. Without SMTP_HOST the alert is only logged."""
+    if not SMTP_HOST:
+        logging.info(f"[SOS EMAIL] Would send alert for: {sos_record['id']} - Location: {sos_record['google_maps_link']}")
+        return
+    subject, text_body, html_body = render_email("sos_alert", _sos_email_context(sos_record))
+    try:
+        result = await db.sos_deliveries.update_one({"alert_id": sos_record["id"], "channel": "email"}, {"$setOnInsert": {
+            "id": str(uuid.uuid4()),
+            "to": SOS_ALERT_EMAIL,
+            "subject": subject,
+            "text": text_body,
+            "html": html_body,
+            "status": "pending",
+            "attempts": 0,
+            "received_at": received_at,
+            "next_attempt_at": received_at,
+        }}, upsert=True)
+    except DuplicateKeyError:
+        return
+    if result.upserted_id is None:
+        return
+    SOS_DISPATCH_METRICS["queued"] += 1
+    _sos_wakeup.set()
+
+async def queue_unqueued_sos_alerts() -> int:
+    """Queue notifications for alerts that send_sos stored but could not queue."""
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=SOS_RECONCILE_AFTER_SECONDS)).isoformat()
+    alerts = await db.sos_alerts.find(
+        {"delivery_queued": False, "created_at": {"$lt": cutoff}}, {"_id": 0}
+    ).sort("created_at", ASCENDING).to_list(100)
+    for alert in alerts:
+        logging.warning(f"[SOS] Queueing notification for alert {alert['id']} missed by the request")
+        await enqueue_sos_deliveries(alert, datetime.fromisoformat(alert["created_at"]))
+        await db.sos_alerts.update_one({"id": alert["id"]}, {"$set": {"delivery_queued": True}})
+    return len(alerts)
+
+async def _claim_sos_delivery() -> Optional[dict]:
+    now = datetime.now(timezone.utc)
+    return await db.sos_deliveries.find_one_and_update(
+        {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "claimed_at": {"$lt": now - timedelta(seconds=SOS_DELIVERY_LEASE_SECONDS)}},
+        ]},
+        {"$set": {"status": "sending", "claimed_at": now, "claimed_by": WORKER_ID}, "$inc": {"attempts": 1}},
+        sort=[("received_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def _retry_sos_delivery(job: dict, error: Exception) -> None:
+    SOS_DISPATCH_METRICS["retried"] += 1
+    delay = min(SOS_RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1), SOS_RETRY_MAX_SECONDS)
+    logging.error(f"[SOS] Notification for alert {job.get('alert_id')} failed (attempt {job['attempts']}), retrying in {delay}s: {error!r}")
+    await db.sos_deliveries.update_one({"id": job["id"]}, {"$set": {
+        "status": "pending",
+        "last_error": repr(error),
+        "next_attempt_at": datetime.now(timezone.utc) + timedelta(seconds=delay),
+    }})
+
+async def dispatch_sos_delivery(job: dict) -> bool:
+    """Send one alert notification, rescheduling it on failure. Returns True when sent."""
+    try:
+        await sos_mail_pool.send(build_email(job["to"], job["subject"], job["text"], job["html"]))
+    except (aiosmtplib.SMTPException, OSError) as e:
+        await _retry_sos_delivery(job, e)
+        return False
+    except Exception as e:
+        # Not a transport problem, so the row itself is bad; retrying forever would only take
+        # the dispatcher down on every claim. Park it as "dead" once the retries run out.
+        if job["attempts"] < SOS_DEAD_LETTER_ATTEMPTS:
+            await _retry_sos_delivery(job, e)
+            return False
+        SOS_DISPATCH_METRICS["dead"] += 1
+        logging.critical(f"[SOS] Notification for alert {job.get('alert_id')} is undeliverable after {job['attempts']} attempts: {e!r}")
+        await db.sos_deliveries.update_one({"id": job["id"]}, {"$set": {"status": "dead", "last_error": repr(e)}})
+        return False
+
+    sent_at = datetime.now(timezone.utc)
+    received_at = job["received_at"]
+    if received_at.tzinfo is None:
+        received_at = received_at.replace(tzinfo=timezone.utc)
+    latency_ms = round((sent_at - received_at).total_seconds() * 1000, 1)
+    SOS_DISPATCH_METRICS["sent"] += 1
+    if latency_ms > SOS_P99_TARGET_MS:
+        SOS_DISPATCH_METRICS["over_target"] += 1
+        logging.warning(f"[SOS] Alert {job['alert_id']} notified after {latency_ms} ms (target {SOS_P99_TARGET_MS:.0f} ms)")
+    await db.sos_deliveries.update_one(
+        {"id": job["id"]},
+        {"$set": {"status": "sent", "sent_at": sent_at, "latency_ms": latency_ms}, "$unset": {"html": "", "text": ""}}
+    )
+    await db.sos_alerts.update_one(
+        {"id": job["alert_id"], "notified_at": {"$exists": False}}, {"$set": {"notified_at": sent_at.isoformat()}}
+    )
+    logging.info(f"[SOS] Email notification sent for alert {job['alert_id']} in {latency_ms} ms")
+    return True
+
+async def sos_dispatcher_loop() -> None:
+    while True:
+        # Cleared before draining so an alert queued mid-drain wakes the next wait at once
+        _sos_wakeup.clear()
+        try:
+            await queue_unqueued_sos_alerts()
+            while (job := await _claim_sos_delivery()) is not None:
+                await dispatch_sos_delivery(job)
+        except Exception as e:
+            # Whatever went wrong, this worker must keep dispatching alerts
+            logging.exception(f"[SOS] Dispatcher error: {str(e)}")
+        try:
+            await asyncio.wait_for(_sos_wakeup.wait(), timeout=SOS_DISPATCH_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+def _percentile(sorted_values: list, fraction: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1)]
+
+async def sos_latency_report() -> dict:
+    """Notification latency percentiles over the last SOS_LATENCY_WINDOW_MINUTES, plus the backlog."""
+    now = datetime.now(timezone.utc)
+    since = now - timedelta(minutes=SOS_LATENCY_WINDOW_MINUTES)
+    rows = await db.sos_deliveries.find(
+        {"status": "sent", "sent_at": {"$gte": since}}, {"_id": 0, "latency_ms": 1}
+    ).to_list(None)
+    latencies = sorted(row["latency_ms"] for row in rows)
+    oldest = await db.sos_deliveries.find_one(
+        {"status": {"$in": ["pending", "sending"]}}, {"_id": 0, "received_at": 1}, sort=[("received_at", ASCENDING)]
+    )
+    oldest_age_ms = None
+    if oldest:
+        received_at = oldest["received_at"]
+        if received_at.tzinfo is None:
+            received_at = received_at.replace(tzinfo=timezone.utc)
+        oldest_age_ms = round((now - received_at).total_seconds() * 1000, 1)
+    p99 = _percentile(latencies, 0.99)
+    dead = await db.sos_deliveries.count_documents({"status": "dead", "received_at": {"$gte": since}})
+    return {
+        "window_minutes": SOS_LATENCY_WINDOW_MINUTES,
+        "sent": len(latencies),
+        "p50_ms": _percentile(latencies, 0.50),
+        "p95_ms": _percentile(latencies, 0.95),
+        "p99_ms": p99,
+        "max_ms": latencies[-1] if latencies else None,
+        "p99_target_ms": SOS_P99_TARGET_MS,
+        "pending": await db.sos_deliveries.count_documents({"status": {"$in": ["pending", "sending"]}}),
+        "oldest_pending_ms": oldest_age_ms,
+        "dead": dead,
+        # An undelivered alert older than the target breaches it even before it is sent
+        "breached": (p99 is not None and p99 > SOS_P99_TARGET_MS)
+                    or (oldest_age_ms is not None and oldest_age_ms > SOS_P99_TARGET_MS)
+                    or dead > 0,
+    }
+
+async def nearest_sos_contacts(latitude: float, longitude: float) -> list:
+    """Emergency contacts ranked by distance from the caller"""
+    contact_fields = {"_id": 0, "name": 1, "phone": 1, "category": 1}
+    try:
+        return await find_near(db.emergency_contacts, latitude, longitude, contact_fields, limit=10)
+    except PyMongoError as e:
+        # Never fail an SOS over ranking (e.g. the 2dsphere index is missing)
+        logging.error(f"[SOS] Nearest-contact query failed, using unranked contacts: {str(e)}")
+        return await db.emergency_contacts.find({}, contact_fields).to_list(10)
+
 @api_router.post("/sos", response_model=SOSResponse)
-async def send_sos(sos_request: SOSRequest, background: BackgroundTasks):
+async def send_sos(sos_request: SOSRequest):
     """Send emergency SOS alert with GPS location to rescue teams"""
+    received_at = datetime.now(timezone.utc)
     try:
         # Create SOS record
         sos_id = str(uuid.uuid4())
@@ -1934,27 +4730,29 @@ async def send_sos(sos_request: SOSRequest, background: BackgroundTasks):
             "emergency_type": sos_request.emergency_type,
             "message": sos_request.message,
             "status": "active",
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "google_maps_link": f"https://www.google.com/maps?q={sos_request.latitude},{sos_request.longitude}"
+            "created_at": received_at.isoformat(),
+            "google_maps_link": f"https://www.google.com/maps?q={sos_request.latitude},{sos_request.longitude}",
+            "delivery_queued": False
         }
-        
+
         await db.sos_alerts.insert_one(sos_record)
-        
-        # Get nearest emergency contacts
-        emergency_contacts = await db.emergency_contacts.find({}).to_list(10)
-        nearest_contacts = []
-        
-        for contact in emergency_contacts:
-            nearest_contacts.append({
-                "name": contact.get("name"),
-                "phone": contact.get("phone"),
-                "category": contact.get("category")
-            })
-        
-        # Send email notification to rescue team (background task)
-        background.add_task(send_sos_notification, sos_record, nearest_contacts)
+
+        # Queue the notification to the rescue team. The SOS is already recorded, so a failure
+        # here is not returned to the caller (inviting a duplicate retry): the alert keeps
+        # delivery_queued=false and the dispatcher queues it instead
+        try:
+            await enqueue_sos_deliveries(sos_record, received_at)
+            await db.sos_alerts.update_one({"id": sos_id}, {"$set": {"delivery_queued": True}})
+        except PyMongoError as e:
+            logging.error(f"[SOS] Could not queue alert notification for {sos_id}, the dispatcher will retry: {str(e)}")
+
+        nearest_contacts = await nearest_sos_contacts(sos_request.latitude, sos_request.longitude)
         
         logging.info(f"[SOS] Emergency alert created: {sos_id} at ({sos_request.latitude}, {sos_request.longitude})")
+        try:
+            await publish_sos_event("sos.created", {k: v for k, v in sos_record.items() if k in SOS_ALERT_FIELDS})
+        except PyMongoError as e:
+            logging.error(f"[SOS] Could not publish event for {sos_id}: {str(e)}")
         
         return SOSResponse(
             id=sos_id,
@@ -1967,61 +4765,25 @@ async def send_sos(sos_request: SOSRequest, background: BackgroundTasks):
         logging.error(f"[SOS] Error: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to send SOS alert")
 
-def send_sos_notification(sos_record: dict, contacts: list):
-    """Send SOS email notification to rescue teams"""
-    smtp_host = os.environ.get('SMTP_HOST')
-    smtp_user = os.environ.get('SMTP_USER')
-    smtp_pass = os.environ.get('SMTP_PASS')
-    
-    if not smtp_host or not smtp_user or not smtp_pass:
-        logging.info(f"[SOS EMAIL] Would send alert for: {sos_record['id']} - Location: {sos_record['google_maps_link']}")
-        return
-    
-    try:
-        subject = f"🚨 EMERGENCY SOS ALERT - {sos_record['emergency_type'].upper()}"
-        html_body = f"""
-        <html>
-        <body style="font-family: Arial; padding: 20px;">
-            <div style="background: #DC143C; color: white; padding: 20px; border-radius: 8px;">
-                <h1>🚨 EMERGENCY SOS ALERT</h1>
-            </div>
-            <div style="padding: 20px; background: #f9f9f9; margin-top: 10px; border-radius: 8px;">
-                <h2>Emergency Details</h2>
-                <p><strong>Type:</strong> {sos_record['emergency_type']}</p>
-                <p><strong>Name:</strong> {sos_record['user_name']}</p>
-                <p><strong>Email:</strong> {sos_record.get('user_email', 'Not provided')}</p>
-                <p><strong>Phone:</strong> {sos_record.get('user_phone', 'Not provided')}</p>
-                <p><strong>Message:</strong> {sos_record.get('message', 'No message')}</p>
-                <h2>📍 Location</h2>
-                <p><strong>Coordinates:</strong> {sos_record['latitude']}, {sos_record['longitude']}</p>
-                <p><a href="{sos_record['google_maps_link']}" style="background: #003893; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px;">View on Google Maps</a></p>
-                <p><strong>Time:</strong> {sos_record['created_at']}</p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        msg = EmailMessage()
-        msg['Subject'] = subject
-        msg['From'] = smtp_user
-        msg['To'] = smtp_user  # Send to admin email
-        msg.set_content(f"SOS Alert from {sos_record['user_name']} at {sos_record['google_maps_link']}")
-        msg.add_alternative(html_body, subtype='html')
-        
-        with smtplib.SMTP(smtp_host, 587, timeout=10) as server:
-            server.starttls()
-            server.login(smtp_user, smtp_pass)
-            server.send_message(msg)
-        
-        logging.info(f"[SOS] Email notification sent for alert {sos_record['id']}")
-    except Exception as e:
-        logging.error(f"[SOS] Failed to send email: {str(e)}")
+@api_router.get("/admin/sos-dispatch-metrics")
+async def get_sos_dispatch_metrics(admin_id: str = Depends(get_admin_user)):
+    return {**SOS_DISPATCH_METRICS, "workers": SOS_DISPATCH_WORKERS, **await sos_latency_report()}
 
 @api_router.get("/admin/sos-alerts")
-async def get_sos_alerts(status: Optional[str] = None, admin_id: str = Depends(get_admin_user)):
+async def get_sos_alerts(
+    response: Response,
+    status: Optional[str] = None,
+    fields: Optional[str] = None,
+    limit: int = 200,
+    cursor: Optional[str] = None,
+    admin_id: str = Depends(get_admin_user)
+):
     """Get all SOS alerts (admin only)"""
     query = {"status": status} if status else {}
-    alerts = await db.sos_alerts.find(query, {"_id": 0}).sort("created_at", -1).to_list(200)
+    # Alerts are written before their event takes a sequence number, so this page reflects every
+    # event up to X-Event-Seq; the console resumes the stream from there
+    response.headers["X-Event-Seq"] = str(await _allocated_sos_event_seq())
+    alerts = await paginate(db.sos_alerts, query, list_projection("sos_alerts", fields), response, limit, cursor)
     return alerts
 
 @api_router.patch("/admin/sos-alerts/{alert_id}")
@@ -2039,6 +4801,10 @@ async def update_sos_alert(alert_id: str, update: SosStatusUpdate, admin_id: str
     }
 
     await db.sos_alerts.update_one({"id": alert_id}, {"$set": update_data})
+    try:
+        await publish_sos_event("sos.updated", {"id": alert_id, **update_data})
+    except PyMongoError as e:
+        logging.error(f"[SOS] Could not publish event for {alert_id}: {str(e)}")
     await log_admin_action(
         admin_id=admin_id,
         action="sos_status_update",
@@ -2049,9 +4815,249 @@ async def update_sos_alert(alert_id: str, update: SosStatusUpdate, admin_id: str
     )
     return {"message": "Alert updated"}
 
+# ---- Real-time SOS events ----
+# New alerts and status changes are appended to sos_events with an increasing sequence number
+# and pushed to connected admin consoles over Server-Sent Events. With the default
+# SOS_EVENTS_BACKEND=changestream every worker wakes its streams from a change stream on
+# sos_events, polling the log instead when the deployment has no replica set; "memory" only
+# sees events published by the same process and is for single-worker runs. Sequence numbers
+# are taken before the insert, so events can land out of order; streams always re-read the log
+# through an SOSEventCursor rather than trusting the order they are woken in. Clients reconnect
+# with Last-Event-ID and receive what they missed (possibly repeating an event they already
+# have); if that is older than the retained log they get a "reset" event and reload the list.
+SOS_EVENTS_BACKEND = os.environ.get("SOS_EVENTS_BACKEND", "changestream").lower()
+SOS_EVENTS_RETENTION_HOURS = int(os.environ.get("SOS_EVENTS_RETENTION_HOURS", "24"))
+SOS_EVENTS_POLL_SECONDS = 1
+# A missing sequence number still absent after this long (its publisher died) is skipped
+SOS_EVENTS_GAP_SECONDS = 10
+SOS_STREAM_HEARTBEAT_SECONDS = 15
+SOS_STREAM_QUEUE_SIZE = 256
+
+class SOSEventBus:
+    """Wakes the streams connected to this worker when an event is published."""
+
+    def __init__(self):
+        self._subscribers: set = set()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SOS_STREAM_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    def publish(self, event: dict) -> None:
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Cut off a consumer this far behind; it catches up from the log when it reconnects
+                self._subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+sos_event_bus = SOSEventBus()
+
+class SOSEventCursor:
+    """Reads sos_events in sequence order without dropping events that commit late.
+
+    `low` is the highest seq with nothing missing at or below it. Every read starts from there
+    and skips the seqs above it that were already returned, so seq 5 inserted after seq 6 is
+    still delivered. Each event comes back with the `low` reached once it is delivered, which is
+    what a client can safely resume from.
+    """
+
+    def __init__(self, low: int):
+        self.low = low
+        self._seen: set = set()
+        self._gap_since: Optional[float] = None
+
+    @property
+    def has_gap(self) -> bool:
+        return bool(self._seen)
+
+    def _advance(self) -> None:
+        while self.low + 1 in self._seen:
+            self.low += 1
+            self._seen.discard(self.low)
+
+    async def fetch(self) -> list:
+        """New events in seq order as (event, resume_seq) pairs."""
+        rows = await db.sos_events.find({"seq": {"$gt": self.low}}, {"_id": 0}).sort("seq", ASCENDING).to_list(None)
+        fresh = []
+        for event in rows:
+            if event["seq"] <= self.low or event["seq"] in self._seen:
+                continue
+            self._seen.add(event["seq"])
+            self._advance()
+            fresh.append((event, self.low))
+        if not self._seen:
+            self._gap_since = None
+        elif self._gap_since is None:
+            self._gap_since = time.monotonic()
+        elif time.monotonic() - self._gap_since > SOS_EVENTS_GAP_SECONDS:
+            logging.warning(f"[SOS EVENTS] Sequence {self.low + 1} never arrived; skipping it")
+            self.low = min(self._seen) - 1
+            self._advance()
+            self._gap_since = None
+        return fresh
+
+async def publish_sos_event(event_type: str, alert: dict) -> None:
+    counter = await db.counters.find_one_and_update(
+        {"id": "sos_events"}, {"$inc": {"seq": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    event = {"seq": counter["seq"], "type": event_type, "alert": alert, "created_at": datetime.now(timezone.utc)}
+    await db.sos_events.insert_one(dict(event))
+    if SOS_EVENTS_BACKEND != "changestream":
+        sos_event_bus.publish(event)
+
+async def _latest_sos_event_seq() -> int:
+    latest = await db.sos_events.find_one({}, {"_id": 0, "seq": 1}, sort=[("seq", DESCENDING)])
+    return latest["seq"] if latest else 0
+
+async def _allocated_sos_event_seq() -> int:
+    """Highest sequence number handed out, including events still being inserted."""
+    counter = await db.counters.find_one({"id": "sos_events"}, {"_id": 0, "seq": 1})
+    return counter["seq"] if counter else 0
+
+async def sos_event_feed_loop() -> None:
+    """Wake this worker's streams for events published by any worker."""
+    cursor = SOSEventCursor(await _latest_sos_event_seq())
+    use_change_stream = True
+    while True:
+        try:
+            # Catch up on anything inserted while the stream was down before (re)opening it
+            for event, _ in await cursor.fetch():
+                sos_event_bus.publish(event)
+            if not use_change_stream:
+                await asyncio.sleep(SOS_EVENTS_POLL_SECONDS)
+                continue
+            async with db.sos_events.watch([{"$match": {"operationType": "insert"}}]) as stream:
+                async for change in stream:
+                    event = change["fullDocument"]
+                    event.pop("_id", None)
+                    sos_event_bus.publish(event)
+        except OperationFailure as e:
+            if use_change_stream:
+                logging.warning(f"[SOS EVENTS] Change streams unavailable, polling sos_events instead: {str(e)}")
+                use_change_stream = False
+        except PyMongoError as e:
+            logging.error(f"[SOS EVENTS] Feed error: {str(e)}")
+            await asyncio.sleep(SOS_EVENTS_POLL_SECONDS)
+
+def sse_event(event_type: str, data, event_id: Optional[int] = None) -> bytes:
+    """Encode one Server-Sent Events message with a JSON payload."""
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event_type}\ndata: {json.dumps(jsonable_encoder(data))}\n\n".encode("utf-8")
+
+@api_router.get("/admin/sos-alerts/stream")
+async def stream_sos_alerts(request: Request, admin_id: str = Depends(get_admin_user)):
+    """Server-Sent Events feed of new alerts (sos.created) and status changes (sos.updated)."""
+    last_event_id = request.headers.get("last-event-id") or request.query_params.get("last_event_id")
+    # Subscribe before reading the log so nothing published in between is missed
+    queue = sos_event_bus.subscribe()
+
+    async def events():
+        try:
+            yield b"retry: 3000\n\n"
+            latest = await _latest_sos_event_seq()
+            allocated = await _allocated_sos_event_seq()
+            last_seq = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+            oldest = await db.sos_events.find_one({}, {"_id": 0, "seq": 1}, sort=[("seq", ASCENDING)])
+            if last_seq is None:
+                yield sse_event("ready", {}, latest)
+                last_seq = latest
+            elif last_seq > allocated or (oldest and oldest["seq"] > last_seq + 1):
+                # The events after last_seq are gone (pruned or a different database); reload
+                yield sse_event("reset", {}, latest)
+                last_seq = latest
+            cursor = SOSEventCursor(last_seq)
+
+            while True:
+                for event, resume_seq in await cursor.fetch():
+                    yield sse_event(event["type"], event["alert"], resume_seq)
+                # While a sequence number is missing, poll until it lands or is given up on
+                timeout = SOS_EVENTS_POLL_SECONDS if cursor.has_gap else SOS_STREAM_HEARTBEAT_SECONDS
+                try:
+                    woken = await asyncio.wait_for(queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    if not cursor.has_gap:
+                        yield b": keepalive\n\n"
+                    continue
+                # Wake-ups only say "something new"; what to send is read from the log
+                while woken is not None and not queue.empty():
+                    woken = queue.get_nowait()
+                if woken is None:
+                    return
+        finally:
+            sos_event_bus.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # ==================== CHATBOT ENDPOINT ====================
-# Store conversation history in memory (for production, use a database)
-conversation_history = {}
+# Replies come from one process-wide AsyncOpenAI client, so connections to the API are reused
+# and the event loop is never blocked while the model works. Every call is bounded by
+# CHATBOT_TIMEOUT_SECONDS; the streaming endpoint also gives the model
+# CHATBOT_FIRST_TOKEN_SECONDS to start answering before it falls back to the built-in reply.
+OPENAI_AVAILABLE = importlib.util.find_spec("openai") is not None
+if OPENAI_AVAILABLE:
+    from openai import AsyncOpenAI, OpenAIError
+
+OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+CHATBOT_MODEL = os.environ.get("CHATBOT_MODEL", "gpt-3.5-turbo")
+CHATBOT_TIMEOUT_SECONDS = float(os.environ.get("CHATBOT_TIMEOUT_SECONDS", "20"))
+CHATBOT_FIRST_TOKEN_SECONDS = float(os.environ.get("CHATBOT_FIRST_TOKEN_SECONDS", "4"))
+CHATBOT_MAX_TOKENS = 500
+CHATBOT_UPSTREAM_ERRORS = (asyncio.TimeoutError, OpenAIError) if OPENAI_AVAILABLE else (asyncio.TimeoutError,)
+CHATBOT_ERROR_REPLY = "I apologize, but I'm having trouble right now. Please try again later or use the SOS button for emergencies."
+
+CHATBOT_SYSTEM_MESSAGE = """You are NepSafe AI Assistant, an expert travel guide for Nepal tourism.
+
+Your expertise includes:
+- Trekking permits (TIMS, Annapurna, Everest, Langtang, Manaslu)
+- Visa requirements and immigration
+- Hotels and accommodation across Nepal
+- Best times to visit different regions
+- Weather conditions and seasonal advice
+- Safety tips and emergency procedures  
+- Local culture, festivals, and traditions
+- Food recommendations and dietary tips
+- Transportation and logistics
+- Altitude sickness prevention
+
+Guidelines:
+- Be friendly, helpful, and concise
+- Provide practical, actionable advice
+- Include safety warnings when relevant
+- Suggest alternatives when appropriate
+- You can respond in English or Nepali based on the user's language
+- For emergencies, always recommend using the SOS button"""
+
+_openai_client = None
+
+def get_openai_client():
+    """The shared AsyncOpenAI client, or None when no API key is set or openai is not installed."""
+    global _openai_client
+    if _openai_client is None and OPENAI_API_KEY and OPENAI_AVAILABLE:
+        # Retries are left to the caller's deadline rather than multiplying it
+        _openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, timeout=CHATBOT_TIMEOUT_SECONDS, max_retries=0)
+    return _openai_client
+
+async def close_openai_client() -> None:
+    global _openai_client
+    if _openai_client is not None:
+        await _openai_client.close()
+        _openai_client = None
+
+def _chat_messages(message: str) -> list:
+    return [
+        {"role": "system", "content": CHATBOT_SYSTEM_MESSAGE},
+        {"role": "user", "content": message}
+    ]
 
 def _local_chatbot_reply(message: str) -> str:
     """Fallback response generator when external LLM is unavailable."""
@@ -2087,69 +5093,274 @@ def _local_chatbot_reply(message: str) -> str:
         "What would you like to know?"
     )
 
+# ---- Answer cache ----
+# Most questions are the same handful of FAQs, so model answers are cached by normalized
+# question text (case, accents, punctuation and spacing ignored): first in a per-worker LRU,
+# then in chatbot_answers, which all workers share and Mongo expires by TTL. By default only
+# exact (normalized) repeats hit. With CHATBOT_CACHE_SIMILARITY > 0 a miss may also be served
+# by a cached question whose content-word set overlaps at least that much (Jaccard), so
+# paraphrases hit too. Only model answers are cached; the built-in fallback is already instant.
+CHATBOT_CACHE_TTL_SECONDS = int(os.environ.get("CHATBOT_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+CHATBOT_CACHE_MAX_ENTRIES = int(os.environ.get("CHATBOT_CACHE_MAX_ENTRIES", "1000"))
+CHATBOT_CACHE_SIMILARITY = float(os.environ.get("CHATBOT_CACHE_SIMILARITY", "0"))
+# Shared-tier candidates scored per near-duplicate lookup, newest first so the result does
+# not depend on the order Mongo happens to return matches in
+CHATBOT_CACHE_SIMILAR_CANDIDATES = 200
+
+_QUESTION_STOPWORDS = frozenset(
+    "a an and are as at be can could do does for from how i in is it me my of on or please should "
+    "tell the there to what when where which who why will with would you your".split()
+)
+
+CHATBOT_CACHE_METRICS = {"memory_hits": 0, "shared_hits": 0, "similar_hits": 0, "misses": 0, "stores": 0}
+
+def normalize_question(message: str) -> str:
+    text = unicodedata.normalize("NFKD", message or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return " ".join(re.findall(r"\w+", text))
+
+def question_tokens(normalized: str) -> frozenset:
+    return frozenset(word for word in normalized.split() if word not in _QUESTION_STOPWORDS)
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+class ChatAnswerCache:
+    """Per-worker LRU of answers with TTL, in front of the shared chatbot_answers collection."""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    @staticmethod
+    def key_for(normalized: str) -> str:
+        # The model is part of the key so switching models does not serve the old model's answers
+        return hashlib.sha256(f"{CHATBOT_MODEL}\n{normalized}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, answer: str, tokens: frozenset, expires_at: float) -> None:
+        self._entries[key] = (answer, tokens, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _local(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _local_similar(self, tokens: frozenset) -> Optional[str]:
+        now = time.time()
+        best, best_score = None, CHATBOT_CACHE_SIMILARITY
+        for answer, cached_tokens, expires_at in self._entries.values():
+            if expires_at > now:
+                score = _jaccard(tokens, cached_tokens)
+                if score >= best_score:
+                    best, best_score = answer, score
+        return best
+
+    async def _shared_similar(self, tokens: frozenset) -> Optional[dict]:
+        candidates = await db.chatbot_answers.find(
+            {"model": CHATBOT_MODEL, "tokens": {"$in": list(tokens)}, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+            {"_id": 0, "key": 1, "answer": 1, "tokens": 1, "expires_at": 1}
+        ).sort([("expires_at", DESCENDING), ("key", ASCENDING)]).limit(
+            CHATBOT_CACHE_SIMILAR_CANDIDATES
+        ).to_list(CHATBOT_CACHE_SIMILAR_CANDIDATES)
+        best, best_score = None, CHATBOT_CACHE_SIMILARITY
+        for doc in candidates:
+            score = _jaccard(tokens, frozenset(doc["tokens"]))
+            # Strictly greater keeps the newest of equally similar answers
+            if score > best_score or (best is None and score >= best_score):
+                best, best_score = doc, score
+        return best
+
+    async def get(self, message: str) -> Optional[str]:
+        normalized = normalize_question(message)
+        if not normalized:
+            return None
+        key = self.key_for(normalized)
+        answer = self._local(key)
+        if answer is not None:
+            CHATBOT_CACHE_METRICS["memory_hits"] += 1
+            return answer
+
+        tokens = question_tokens(normalized)
+        try:
+            doc = await db.chatbot_answers.find_one(
+                {"key": key, "expires_at": {"$gt": datetime.now(timezone.utc)}}, {"_id": 0, "answer": 1, "expires_at": 1}
+            )
+            kind = "shared_hits"
+            if doc is None and CHATBOT_CACHE_SIMILARITY > 0 and tokens:
+                answer = self._local_similar(tokens)
+                if answer is not None:
+                    CHATBOT_CACHE_METRICS["similar_hits"] += 1
+                    return answer
+                doc = await self._shared_similar(tokens)
+                kind = "similar_hits"
+        except PyMongoError as e:
+            logging.warning(f"[CHATBOT CACHE] Shared lookup failed: {str(e)}")
+            doc = None
+        if doc is None:
+            CHATBOT_CACHE_METRICS["misses"] += 1
+            return None
+
+        CHATBOT_CACHE_METRICS[kind] += 1
+        expires_at = doc["expires_at"]
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        self._remember(key, doc["answer"], tokens, expires_at.timestamp())
+        return doc["answer"]
+
+    async def put(self, message: str, answer: str) -> None:
+        normalized = normalize_question(message)
+        if not normalized or not answer:
+            return
+        key = self.key_for(normalized)
+        tokens = question_tokens(normalized)
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds)
+        self._remember(key, answer, tokens, expires_at.timestamp())
+        CHATBOT_CACHE_METRICS["stores"] += 1
+        try:
+            await db.chatbot_answers.update_one({"key": key}, {"$set": {
+                "key": key,
+                "model": CHATBOT_MODEL,
+                "question": normalized,
+                "tokens": sorted(tokens),
+                "answer": answer,
+                "expires_at": expires_at,
+            }}, upsert=True)
+        except PyMongoError as e:
+            logging.warning(f"[CHATBOT CACHE] Could not store answer: {str(e)}")
+
+chat_answer_cache = ChatAnswerCache(CHATBOT_CACHE_MAX_ENTRIES, CHATBOT_CACHE_TTL_SECONDS)
+
+@api_router.get("/admin/chatbot-cache-metrics")
+async def get_chatbot_cache_metrics(admin_id: str = Depends(get_admin_user)):
+    m = CHATBOT_CACHE_METRICS
+    hits = m["memory_hits"] + m["shared_hits"] + m["similar_hits"]
+    lookups = hits + m["misses"]
+    return {
+        **m,
+        "hit_rate": round(hits / lookups, 3) if lookups else None,
+        "memory_entries": len(chat_answer_cache._entries),
+        "shared_entries": await db.chatbot_answers.estimated_document_count(),
+        "similarity_threshold": CHATBOT_CACHE_SIMILARITY,
+    }
+
 @api_router.post("/chatbot", response_model=ChatResponse)
 async def chat_with_bot(chat_input: ChatMessage):
     """AI-powered travel assistant using OpenAI ChatGPT"""
-    try:
-        from openai import OpenAI
-        
-        session_id = chat_input.session_id or str(uuid.uuid4())
-        api_key = os.environ.get('OPENAI_API_KEY')
-        
-        if not api_key:
-            logging.warning("OPENAI_API_KEY not configured, using fallback")
-            return ChatResponse(
-                response=_local_chatbot_reply(chat_input.message),
-                session_id=session_id
-            )
-        
-        # Initialize OpenAI client with new API
-        client = OpenAI(api_key=api_key)
+    session_id = chat_input.session_id or str(uuid.uuid4())
+    client = get_openai_client()
+    if client is None:
+        logging.warning("OPENAI_API_KEY not configured, using fallback")
+        return ChatResponse(response=_local_chatbot_reply(chat_input.message), session_id=session_id)
 
-        system_message = """You are NepSafe AI Assistant, an expert travel guide for Nepal tourism.
+    cached = await chat_answer_cache.get(chat_input.message)
+    if cached is not None:
+        return ChatResponse(response=cached, session_id=session_id)
 
-Your expertise includes:
-- Trekking permits (TIMS, Annapurna, Everest, Langtang, Manaslu)
-- Visa requirements and immigration
-- Hotels and accommodation across Nepal
-- Best times to visit different regions
-- Weather conditions and seasonal advice
-- Safety tips and emergency procedures  
-- Local culture, festivals, and traditions
-- Food recommendations and dietary tips
-- Transportation and logistics
-- Altitude sickness prevention
-
-Guidelines:
-- Be friendly, helpful, and concise
-- Provide practical, actionable advice
-- Include safety warnings when relevant
-- Suggest alternatives when appropriate
-- You can respond in English or Nepali based on the user's language
-- For emergencies, always recommend using the SOS button"""
-        
-        # Call OpenAI API with new client
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": chat_input.message}
-            ],
-            temperature=0.7,
-            max_tokens=500
+    try:
+        response = await asyncio.wait_for(
+            client.chat.completions.create(
+                model=CHATBOT_MODEL,
+                messages=_chat_messages(chat_input.message),
+                temperature=0.7,
+                max_tokens=CHATBOT_MAX_TOKENS
+            ),
+            timeout=CHATBOT_TIMEOUT_SECONDS
         )
-        
-        bot_response = response.choices[0].message.content
-        
-        logging.info(f"[CHATBOT] Response generated for session {session_id}")
-        return ChatResponse(response=bot_response, session_id=session_id)
-        
+    except CHATBOT_UPSTREAM_ERRORS as e:
+        logging.warning(f"[CHATBOT] OpenAI unavailable, using fallback: {e!r}")
+        return ChatResponse(response=_local_chatbot_reply(chat_input.message), session_id=session_id)
     except Exception as e:
         logging.error(f"Chatbot error: {str(e)}")
-        return ChatResponse(
-            response="I apologize, but I'm having trouble right now. Please try again later or use the SOS button for emergencies.",
-            session_id=chat_input.session_id or str(uuid.uuid4())
-        )
+        return ChatResponse(response=CHATBOT_ERROR_REPLY, session_id=session_id)
+
+    bot_response = response.choices[0].message.content
+    await chat_answer_cache.put(chat_input.message, bot_response)
+    logging.info(f"[CHATBOT] Response generated for session {session_id}")
+    return ChatResponse(response=bot_response, session_id=session_id)
+
+async def _next_reply_text(chunks) -> Optional[str]:
+    """Next non-empty piece of reply text from a completion stream, or None at its end."""
+    while True:
+        try:
+            chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            return None
+        if chunk.choices and chunk.choices[0].delta.content:
+            return chunk.choices[0].delta.content
+
+@api_router.post("/chatbot/stream")
+async def chat_with_bot_stream(chat_input: ChatMessage):
+    """Stream the reply as Server-Sent Events: `token` events carrying text, then `done`.
+
+    If the model has not produced its first token within CHATBOT_FIRST_TOKEN_SECONDS the
+    built-in reply is sent instead; `done` says which one the client got.
+    """
+    session_id = chat_input.session_id or str(uuid.uuid4())
+    client = get_openai_client()
+
+    async def events():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        stream, text = None, None
+        try:
+            cached = await chat_answer_cache.get(chat_input.message) if client is not None else None
+            if cached is not None:
+                yield sse_event("token", {"text": cached})
+                yield sse_event("done", {"session_id": session_id, "source": "cache"})
+                return
+
+            if client is not None:
+                first_token_deadline = started + CHATBOT_FIRST_TOKEN_SECONDS
+                try:
+                    stream = await asyncio.wait_for(
+                        client.chat.completions.create(
+                            model=CHATBOT_MODEL,
+                            messages=_chat_messages(chat_input.message),
+                            temperature=0.7,
+                            max_tokens=CHATBOT_MAX_TOKENS,
+                            stream=True
+                        ),
+                        timeout=CHATBOT_FIRST_TOKEN_SECONDS
+                    )
+                    chunks = stream.__aiter__()
+                    text = await asyncio.wait_for(_next_reply_text(chunks), max(0, first_token_deadline - loop.time()))
+                except CHATBOT_UPSTREAM_ERRORS as e:
+                    logging.warning(f"[CHATBOT] No first token within {CHATBOT_FIRST_TOKEN_SECONDS}s, using fallback: {e!r}")
+
+            if text is None:
+                yield sse_event("token", {"text": _local_chatbot_reply(chat_input.message)})
+                yield sse_event("done", {"session_id": session_id, "source": "local"})
+                return
+
+            yield sse_event("token", {"text": text})
+            reply = [text]
+            deadline = started + CHATBOT_TIMEOUT_SECONDS
+            try:
+                while (text := await asyncio.wait_for(_next_reply_text(chunks), max(0, deadline - loop.time()))) is not None:
+                    reply.append(text)
+                    yield sse_event("token", {"text": text})
+            except CHATBOT_UPSTREAM_ERRORS as e:
+                logging.warning(f"[CHATBOT] Stream for session {session_id} cut short: {e!r}")
+                yield sse_event("error", {"detail": "The reply was cut short. Please try again."})
+            else:
+                await chat_answer_cache.put(chat_input.message, "".join(reply))
+            yield sse_event("done", {"session_id": session_id, "source": "openai"})
+        finally:
+            if stream is not None:
+                await stream.close()
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # ==================== SEED DATA ====================
 @api_router.post("/seed-data")
@@ -2157,14 +5368,14 @@ async def seed_data():
     # Always create admin user if not exists
     admin_exists = await db.users.find_one({"email": "nepsafetourism@gmail.com"})
     if not admin_exists:
-        hashed_password = bcrypt.hashpw("admin123".encode('utf-8'), bcrypt.gensalt())
+        hashed_password = await hash_password("admin123")
         admin_user = {
             "id": str(uuid.uuid4()),
             "email": "nepsafetourism@gmail.com",
             "name": " Admin",
             "role": "admin",
             "email_verified": True,
-            "password": hashed_password.decode('utf-8'),
+            "password": hashed_password,
             "created_at": datetime.now(timezone.utc).isoformat()
         }
         await db.users.insert_one(admin_user)
@@ -2225,7 +5436,7 @@ async def seed_data():
             "created_at": datetime.now(timezone.utc).isoformat()
         }
     ]
-    await db.hotels.insert_many(hotels)
+    await db.hotels.insert_many([with_geo(doc) for doc in hotels])
     
     # Seed Emergency Contacts with coordinates
     emergency_contacts = [
@@ -2270,7 +5481,7 @@ async def seed_data():
             "available_24_7": True
         }
     ]
-    await db.emergency_contacts.insert_many(emergency_contacts)
+    await db.emergency_contacts.insert_many([with_geo(doc) for doc in emergency_contacts])
     
     # Seed Safety Tips
     safety_tips = [
@@ -2352,7 +5563,7 @@ async def seed_data():
             "best_time_to_visit": "October to March"
         }
     ]
-    await db.tourist_spots.insert_many(tourist_spots)
+    await db.tourist_spots.insert_many([with_geo(doc) for doc in tourist_spots])
     
     # Seed default permit types
     permit_types = [
@@ -2379,9 +5590,354 @@ async def seed_data():
         }
     ]
     await db.permit_types.insert_many(permit_types)
+    for name in REFERENCE_COLLECTIONS:
+        await invalidate_reference(name)
+    if STATS_MATERIALIZED:
+        await rebuild_materialized_stats()
     
     return {"message": "Data seeded successfully. Admin credentials: admin@nepsafe.com / admin123"}
 
+# ==================== DATABASE INDEXES ====================
+# Every collection the API filters or sorts on, with the indexes those queries need.
+# Index names are fixed so re-running the bootstrapper is a no-op once they exist.
+INDEX_SPECS = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+    ],
+    "hotels": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("geo", GEOSPHERE)], name="geo_2dsphere"),
+        IndexModel([("owner_id", ASCENDING), ("approval_status", ASCENDING)], name="owner_approval"),
+        IndexModel([("owner_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="owner_created_at_id"),
+        IndexModel([("approval_status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="approval_created_at_id"),
+        IndexModel([("city", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="city_ci_created_at_id", collation=CASE_INSENSITIVE),
+        IndexModel([("name", ASCENDING)], name="name_ci", collation=CASE_INSENSITIVE),
+        IndexModel(
+            [("name", TEXT), ("city", TEXT), ("location", TEXT), ("description", TEXT), ("amenities", TEXT)],
+            name="search_text",
+            weights={"name": 10, "city": 5, "location": 3, "amenities": 2, "description": 1}
+        ),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+    ],
+    "bookings": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_created_at_id"),
+        IndexModel([("hotel_id", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING)], name="hotel_status_created_at"),
+        IndexModel([("status", ASCENDING)], name="status"),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+    ],
+    "permits": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_created_at_id"),
+        IndexModel([("status", ASCENDING)], name="status"),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+    ],
+    "permit_types": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "tourist_spots": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("geo", GEOSPHERE)], name="geo_2dsphere"),
+        IndexModel([("name", ASCENDING), ("id", ASCENDING)], name="name_id"),
+        IndexModel([("name", ASCENDING)], name="name_ci", collation=CASE_INSENSITIVE),
+        IndexModel([("name_ne", ASCENDING)], name="name_ne_ci", collation=CASE_INSENSITIVE),
+        IndexModel(
+            [("name", TEXT), ("name_ne", TEXT), ("category", TEXT), ("location", TEXT), ("region", TEXT), ("description", TEXT)],
+            name="search_text",
+            weights={"name": 10, "name_ne": 10, "category": 5, "location": 3, "region": 3, "description": 1}
+        ),
+    ],
+    "emergency_contacts": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("geo", GEOSPHERE)], name="geo_2dsphere"),
+    ],
+    "safety_tips": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "sos_alerts": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="status_created_at_id"),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel(
+            [("delivery_queued", ASCENDING), ("created_at", ASCENDING)], name="unqueued_created_at",
+            partialFilterExpression={"delivery_queued": False}
+        ),
+    ],
+    "stats": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "rate_limits": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "room_nights": [
+        IndexModel([("hotel_id", ASCENDING), ("date", ASCENDING)], name="hotel_date_unique", unique=True),
+        IndexModel([("date", ASCENDING), ("hotel_id", ASCENDING)], name="date_hotel"),
+    ],
+    "denorm_jobs": [
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created_at"),
+        IndexModel([("source", ASCENDING), ("source_id", ASCENDING), ("status", ASCENDING)], name="source_status"),
+    ],
+    "auth_state": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "mail_outbox": [
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt"),
+        IndexModel([("sent_at", ASCENDING)], name="sent_at_ttl", expireAfterSeconds=MAIL_SENT_RETENTION_DAYS * 24 * 60 * 60),
+    ],
+    "sos_deliveries": [
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt"),
+        IndexModel([("status", ASCENDING), ("sent_at", ASCENDING)], name="status_sent_at"),
+        IndexModel([("alert_id", ASCENDING), ("channel", ASCENDING)], name="alert_channel_unique", unique=True),
+    ],
+    "sos_events": [
+        IndexModel([("seq", ASCENDING)], name="seq_unique", unique=True),
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=SOS_EVENTS_RETENTION_HOURS * 60 * 60),
+    ],
+    "counters": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "chatbot_answers": [
+        IndexModel([("key", ASCENDING)], name="key_unique", unique=True),
+        IndexModel([("model", ASCENDING), ("tokens", ASCENDING)], name="model_tokens"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "reference_versions": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "api_cache": [
+        IndexModel([("key", ASCENDING)], name="key_unique", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "pois": [
+        IndexModel([("osm_key", ASCENDING)], name="osm_key_unique", unique=True),
+        IndexModel([("location", GEOSPHERE)], name="location_2dsphere"),
+        IndexModel([("tourism", ASCENDING)], name="tourism"),
+    ],
+    "poi_index_state": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "job_leases": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "admin_audit_logs": [
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+    ],
+}
+
+# Indexes from earlier versions of INDEX_SPECS whose replacements cover the same queries.
+# They are dropped once the replacements exist.
+SUPERSEDED_INDEXES = {
+    "users": ["created_at_desc"],
+    "hotels": ["approval_created_at", "created_at_desc", "city"],
+    "bookings": ["user_created_at", "created_at_desc"],
+    "permits": ["user_created_at", "created_at_desc"],
+    "tourist_spots": ["name"],
+    "sos_alerts": ["status_created_at", "created_at_desc"],
+    "admin_audit_logs": ["created_at_desc"],
+    "mail_outbox": ["status_priority_next_attempt"],
+    "sos_deliveries": ["alert_id"],
+}
+
+# Index options that change what an index does; any difference means it has to be rebuilt
+_INDEX_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression", "weights")
+
+def _index_keys(key_items, collation: Optional[dict]) -> tuple:
+    """Key pattern plus collation, which Mongo treats as the identity of an index.
+    Text indexes are stored as _fts/_ftsx, so every text index compares as the same keys."""
+    keys = [(field, value if isinstance(value, str) else int(value)) for field, value in key_items]
+    if any(value == "text" for _, value in keys):
+        keys = [("_fts", "text")]
+    locale = (collation or {}).get("locale", "simple")
+    strength = (collation or {}).get("strength") if locale != "simple" else None
+    return tuple(keys), locale, strength
+
+def _index_options(document: dict) -> dict:
+    options = {}
+    for name in _INDEX_OPTIONS:
+        value = document.get(name)
+        if value is None or value is False:
+            continue
+        if name == "expireAfterSeconds":
+            value = int(value)
+        elif name == "weights":
+            value = {field: int(weight) for field, weight in value.items()}
+        options[name] = value
+    return options
+
+def _spec_index_options(model: IndexModel) -> dict:
+    document = dict(model.document)
+    if any(value == "text" for _, value in document["key"].items()):
+        # Mongo stores a text index's weights for every field, defaulting to 1
+        document["weights"] = {field: 1 for field, value in document["key"].items() if value == "text"}
+        document["weights"].update(model.document.get("weights") or {})
+    return _index_options(document)
+
+async def ensure_indexes() -> dict:
+    """Create any missing indexes from INDEX_SPECS and report what happened per collection.
+
+    An existing index counts only if its keys, collation and options match the spec. One with the
+    same keys under another name, or with our name but different keys or options (e.g. a changed
+    TTL), is dropped and rebuilt, since Mongo refuses to create the spec next to it. Names listed in
+    SUPERSEDED_INDEXES are dropped after the rest. Indexes are created one at a time so a single
+    failure (e.g. duplicate emails blocking a unique index) is reported without stopping the rest.
+    """
+    report = {}
+    for collection_name, models in INDEX_SPECS.items():
+        collection = db[collection_name]
+        entry = {"created": [], "existing": [], "dropped": [], "failed": {}}
+        try:
+            existing = await collection.index_information()
+        except PyMongoError as e:
+            logging.error(f"[INDEXES] Could not list indexes on {collection_name}: {str(e)}")
+            existing = {}
+
+        for model in models:
+            spec = model.document
+            name = spec["name"]
+            keys = _index_keys(spec["key"].items(), spec.get("collation"))
+            current = existing.get(name)
+            if (
+                current is not None
+                and _index_keys(current["key"], current.get("collation")) == keys
+                and _index_options(current) == _spec_index_options(model)
+            ):
+                entry["existing"].append(name)
+                continue
+
+            stale = [
+                other for other, info in existing.items()
+                if other != "_id_" and (other == name or _index_keys(info["key"], info.get("collation")) == keys)
+            ]
+            try:
+                for other in stale:
+                    await collection.drop_index(other)
+                    existing.pop(other)
+                    entry["dropped"].append(other)
+                    logging.warning(f"[INDEXES] Dropped {collection_name}.{other}; rebuilding it as {name}")
+                await collection.create_indexes([model])
+                entry["created"].append(name)
+            except PyMongoError as e:
+                entry["failed"][name] = str(e)
+                logging.error(f"[INDEXES] Failed to create {collection_name}.{name}: {str(e)}")
+
+        for name in SUPERSEDED_INDEXES.get(collection_name, []):
+            # Keep the old index while any replacement is missing
+            if name not in existing or entry["failed"]:
+                continue
+            try:
+                await collection.drop_index(name)
+                entry["dropped"].append(name)
+            except PyMongoError as e:
+                entry["failed"][name] = str(e)
+                logging.error(f"[INDEXES] Failed to drop superseded {collection_name}.{name}: {str(e)}")
+
+        report[collection_name] = entry
+
+    created = sum(len(e["created"]) for e in report.values())
+    dropped = sum(len(e["dropped"]) for e in report.values())
+    failed = sum(len(e["failed"]) for e in report.values())
+    logging.info(f"[INDEXES] Bootstrap complete - created: {created}, dropped: {dropped}, failed: {failed}")
+    return report
+
+# ==================== BLOB MIGRATION ====================
+# Fields that used to hold embedded data URIs. Permit documents (data URIs, raw base64 or public
+# blob URLs) are moved into the private document store by migrate_permit_documents.
+BLOB_MIGRATION_FIELDS = {
+    "users": ["profile_picture"],
+    "hotels": ["image_url", "images"],
+    "tourist_spots": ["image_url"],
+}
+
+def _decode_embedded_blob(value: str, field: str):
+    """Return (bytes, declared_type) for an embedded blob, or None if the value is already a URL."""
+    if value.startswith("data:"):
+        header, _, payload = value.partition(",")
+        declared_type = header[5:].split(";")[0] or None
+        return base64.b64decode(payload), declared_type
+    if field == "document_data" and not value.startswith(("http://", "https://", "/")):
+        return base64.b64decode(value), "image/jpeg"
+    return None
+
+def _move_to_document_store(value: str) -> Optional[str]:
+    """Move one stored permit document into the private store and return its key, or None if the
+    value is not something we stored (e.g. an external URL)."""
+    decoded = _decode_embedded_blob(value, "document_data")
+    if decoded:
+        data, declared_type = decoded
+        return document_store.put(data, sniff_content_type(data, declared_type))
+    key = value.rsplit("/api/blobs/", 1)[-1] if "/api/blobs/" in value else None
+    if not key or not BLOB_KEY_RE.match(key):
+        return None
+    if blob_store.exists(key):
+        with open(blob_store.path_for(key), "rb") as f:
+            document_store.put(f.read(), mimetypes.guess_type(key)[0] or "application/octet-stream")
+        blob_store.path_for(key).unlink()
+    return key if document_store.exists(key) else None
+
+async def migrate_permit_documents() -> dict:
+    """Take permit documents out of the public blob route. Runs at startup and with migrate-blobs."""
+    migrated, failed = 0, 0
+    async for permit in db.permits.find(
+        {"document_data": {"$type": "string"}, "document_key": {"$exists": False}}, {"_id": 0, "id": 1, "document_data": 1}
+    ):
+        try:
+            key = await run_in_threadpool(_move_to_document_store, permit["document_data"])
+        except (ValueError, OSError) as e:
+            failed += 1
+            logging.error(f"[BLOBS] Could not move document of permit {permit['id']}: {str(e)}")
+            continue
+        if key is None:
+            continue
+        await db.permits.update_one(
+            {"id": permit["id"]}, {"$set": {"document_key": key, "document_data": permit_document_url(permit["id"])}}
+        )
+        migrated += 1
+    if migrated or failed:
+        logging.info(f"[BLOBS] permits: moved {migrated} documents to the private store, failed {failed}")
+    return {"migrated": migrated, "failed": failed}
+
+async def migrate_embedded_blobs() -> dict:
+    """Move embedded base64 blobs out of documents into the blob store, replacing them with URLs."""
+    report = {}
+    for collection_name, fields in BLOB_MIGRATION_FIELDS.items():
+        collection = db[collection_name]
+        conditions = [{f: {"$regex": "^data:"}} for f in fields]
+        projection = {"_id": 0, "id": 1, **{f: 1 for f in fields}}
+
+        migrated, failed = 0, 0
+        async for doc in collection.find({"$or": conditions}, projection):
+            update_data = {}
+            try:
+                for field in fields:
+                    value = doc.get(field)
+                    if isinstance(value, str):
+                        decoded = _decode_embedded_blob(value, field)
+                        if decoded:
+                            update_data[field] = await store_blob(*decoded)
+                    elif isinstance(value, list):
+                        urls = []
+                        for item in value:
+                            decoded = _decode_embedded_blob(item, field) if isinstance(item, str) else None
+                            urls.append(await store_blob(*decoded) if decoded else item)
+                        if urls != value:
+                            update_data[field] = urls
+            except (ValueError, OSError) as e:
+                failed += 1
+                logging.error(f"[BLOBS] Could not migrate {collection_name} {doc.get('id')}: {str(e)}")
+                continue
+            if update_data:
+                await collection.update_one({"id": doc["id"]}, {"$set": update_data})
+                migrated += 1
+
+        if migrated and collection_name in REFERENCE_COLLECTIONS:
+            await invalidate_reference(collection_name)
+        report[collection_name] = {"migrated": migrated, "failed": failed}
+        logging.info(f"[BLOBS] {collection_name}: migrated {migrated}, failed {failed}")
+    report["permits"] = await migrate_permit_documents()
+    return report
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -2392,11 +5948,214 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Long-running background loops started at startup and cancelled at shutdown
+_background_tasks: set = set()
+
+def start_background_task(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+@app.on_event("startup")
+async def create_db_indexes():
+    app.state.index_report = await ensure_indexes()
+
+@app.on_event("startup")
+async def start_auth_state():
+    try:
+        await load_revoked_users()
+    except PyMongoError as e:
+        # Don't keep the worker from starting over a Mongo blip; the loop loads the set shortly
+        logging.error(f"[AUTH] Could not load revoked users at startup, retrying in the background: {str(e)}")
+    start_background_task(auth_state_loop())
+
+@app.on_event("startup")
+async def start_mail_worker():
+    if SMTP_HOST:
+        start_background_task(mail_worker_loop())
+
+@app.on_event("startup")
+async def start_sos_dispatcher():
+    if SMTP_HOST:
+        for _ in range(SOS_DISPATCH_WORKERS):
+            start_background_task(sos_dispatcher_loop())
+
+@app.on_event("startup")
+async def start_sos_event_feed():
+    if SOS_EVENTS_BACKEND == "changestream":
+        start_background_task(sos_event_feed_loop())
+
+@app.on_event("startup")
+async def start_reference_versions():
+    try:
+        await load_reference_versions()
+    except PyMongoError as e:
+        # Nothing is cached yet, so nothing can be stale; the loop syncs versions once Mongo answers
+        logging.error(f"[REFERENCE] Could not load cache versions at startup, retrying in the background: {str(e)}")
+    start_background_task(reference_versions_loop())
+
+@app.on_event("startup")
+async def start_room_inventory():
+    if await room_inventory_ready():
+        start_background_task(migrate_room_inventory())
+    else:
+        logging.error("[INVENTORY] room_nights has no unique (hotel_id, date) index; bookings are refused until it exists")
+
+@app.on_event("startup")
+async def start_permit_document_migration():
+    start_background_task(migrate_permit_documents())
+
+@app.on_event("startup")
+async def start_geo_backfill():
+    start_background_task(backfill_geo_points())
+
+@app.on_event("startup")
+async def start_denorm_worker():
+    start_background_task(denorm_worker_loop())
+
+@app.on_event("startup")
+async def start_poi_index():
+    if POI_INDEX_ENABLED:
+        start_background_task(poi_index_loop())
+
+@app.on_event("startup")
+async def start_weather_prefetch():
+    if WEATHER_PREFETCH_ENABLED:
+        start_background_task(weather_prefetch_loop())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in list(_background_tasks):
+        task.cancel()
+    await close_upstream_clients()
+    await close_openai_client()
+    await mail_pool.close()
+    await sos_mail_pool.close()
     client.close()
+    _password_pool.shutdown(wait=False, cancel_futures=True)
+    if _image_pool is not None:
+        _image_pool.shutdown(wait=False, cancel_futures=True)
+
+# ==================== MIDDLEWARE BENCHMARK ====================
+async def bench_middleware(requests: int = 20000) -> dict:
+    """Measure the per-request cost of the middleware stack by driving a trivial ASGI endpoint
+    directly, with and without `app.user_middleware`. Every request uses its own client address
+    so the rate limiter does its usual bookkeeping without rejecting anything."""
+    from starlette.applications import Starlette
+    from starlette.routing import Route
+
+    async def endpoint(request):
+        return JSONResponse({"ok": True})
+
+    bare = Starlette(routes=[Route("/bench", endpoint)])
+    wrapped = bare
+    for middleware in reversed(app.user_middleware):
+        wrapped = middleware.cls(wrapped, *middleware.args, **middleware.kwargs)
+
+    async def run(asgi_app) -> float:
+        started = time.perf_counter()
+        for i in range(requests):
+            # Like a server: deliver the (empty) body once, then report a disconnect only after
+            # the response has been sent
+            body_sent, response_done = False, asyncio.Event()
+
+            async def receive():
+                nonlocal body_sent
+                if not body_sent:
+                    body_sent = True
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                await response_done.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                if message["type"] == "http.response.body" and not message.get("more_body", False):
+                    response_done.set()
+
+            scope = {
+                "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                "scheme": "http", "path": "/bench", "raw_path": b"/bench", "query_string": b"", "root_path": "",
+                "headers": [(b"host", b"localhost"), (b"origin", cors_origins[0].encode())],
+                "client": (f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", 50000), "server": ("localhost", 8000),
+            }
+            await asgi_app(scope, receive, send)
+        return (time.perf_counter() - started) / requests * 1e6
+
+    await run(wrapped)  # warm up
+    bare_us = await run(bare)
+    wrapped_us = await run(wrapped)
+    return {
+        "requests": requests,
+        "middleware": [m.cls.__name__ for m in app.user_middleware],
+        "bare_us_per_request": round(bare_us, 1),
+        "with_middleware_us_per_request": round(wrapped_us, 1),
+        "overhead_us_per_request": round(wrapped_us - bare_us, 1),
+    }
 
 # Run the server
+# Usage: python server.py                 -> run the API
+#        python server.py ensure-indexes  -> create missing indexes and print the report
+#        python server.py migrate-blobs   -> move embedded base64 images/documents into the blob store
+#        python server.py rebuild-stats   -> recompute the materialized dashboard stats document
+#        python server.py ingest-pois     -> load/refresh the local POI index from Overpass once
+#        python server.py prefetch-weather -> refresh cached weather for all tourist spots once
+#        python server.py bench-middleware [n] -> time the middleware stack per request
+#        python server.py check-denormalization [--repair] -> count (and optionally re-propagate) stale copies
+#        python server.py rebuild-inventory -> repair per-night room counters from confirmed bookings
+#        python server.py backfill-geo    -> add GeoJSON points to hotels, spots and contacts stored without one
+#        python server.py flush-mail      -> deliver every due message in the mail outbox once
+#        python server.py sos-latency     -> print SOS notification latency; exits 1 if the p99 target is breached
+#        python server.py smtp-sink [port] -> run a local SMTP server that saves mail to MAIL_SINK_DIR
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    import sys
+    command = sys.argv[1] if len(sys.argv) > 1 else "serve"
+    if command == "ensure-indexes":
+        print(json.dumps(asyncio.run(ensure_indexes()), indent=2))
+    elif command == "migrate-blobs":
+        print(json.dumps(asyncio.run(migrate_embedded_blobs()), indent=2))
+    elif command == "rebuild-stats":
+        print(json.dumps(asyncio.run(rebuild_materialized_stats()), indent=2))
+    elif command == "ingest-pois":
+        async def _ingest_once():
+            try:
+                return await ingest_poi_index()
+            finally:
+                await close_upstream_clients()
+        print(json.dumps(asyncio.run(_ingest_once()), indent=2))
+    elif command == "prefetch-weather":
+        async def _prefetch_once():
+            try:
+                return await prefetch_spot_weather()
+            finally:
+                await close_upstream_clients()
+        print(json.dumps(asyncio.run(_prefetch_once()), indent=2))
+    elif command == "backfill-geo":
+        print(json.dumps(asyncio.run(backfill_geo_points()), indent=2))
+    elif command == "rebuild-inventory":
+        print(json.dumps(asyncio.run(rebuild_room_inventory()), indent=2))
+    elif command == "check-denormalization":
+        async def _check_and_repair():
+            report = await check_denormalization(repair="--repair" in sys.argv)
+            if "--repair" in sys.argv:
+                report["jobs_processed"] = await run_denorm_jobs()
+            return report
+        print(json.dumps(asyncio.run(_check_and_repair()), indent=2))
+    elif command == "flush-mail":
+        async def _flush_mail():
+            try:
+                return {"sent": await run_mail_outbox(), **MAIL_METRICS}
+            finally:
+                await mail_pool.close()
+        print(json.dumps(asyncio.run(_flush_mail()), indent=2))
+    elif command == "sos-latency":
+        report = asyncio.run(sos_latency_report())
+        print(json.dumps(report, indent=2))
+        sys.exit(1 if report["breached"] else 0)
+    elif command == "smtp-sink":
+        asyncio.run(run_smtp_sink(port=int(sys.argv[2]) if len(sys.argv) > 2 else 1025))
+    elif command == "bench-middleware":
+        requests = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+        print(json.dumps(asyncio.run(bench_middleware(requests)), indent=2))
+    else:
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=8000)
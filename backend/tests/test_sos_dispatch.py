@@ -0,0 +1,145 @@
+import asyncio
+import os
+import socket
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+SINK_PORT = _free_port()
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "nepsafe_test")
+os.environ.update(
+    SMTP_HOST="127.0.0.1",
+    SMTP_PORT=str(SINK_PORT),
+    SMTP_STARTTLS="false",
+    SOS_DISPATCH_POLL_SECONDS="0.1",
+)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import server  # noqa: E402
+from httpx import ASGITransport, AsyncClient  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+
+async def _unranked(*args, **kwargs):
+    # mongomock has no $geoNear; the SOS route falls back to unranked contacts
+    raise server.PyMongoError("$geoNear is not supported by mongomock")
+
+
+@pytest.fixture
+def app_db(monkeypatch, tmp_path):
+    monkeypatch.setattr(server, "db", AsyncMongoMockClient()["nepsafe_test"])
+    monkeypatch.setattr(server, "find_near", _unranked)
+    monkeypatch.setattr(server, "MAIL_SINK_DIR", tmp_path)
+    return server.db
+
+
+async def _wait_for(predicate, timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        if await predicate():
+            return True
+        await asyncio.sleep(0.05)
+    return False
+
+
+def test_build_email_folds_crlf_in_headers():
+    msg = server.build_email("desk@example.com", "ALERT\r\nBcc: attacker@example.com", "text", "<p>html</p>")
+    assert msg["Subject"] == "ALERT Bcc: attacker@example.com"
+    assert msg["Bcc"] is None
+
+
+def test_crlf_emergency_type_is_rejected_and_later_alerts_are_still_sent(app_db, tmp_path):
+    async def scenario():
+        sink = await asyncio.start_server(server.SMTPSink(tmp_path).handle, "127.0.0.1", SINK_PORT)
+        dispatcher = asyncio.create_task(server.sos_dispatcher_loop())
+        try:
+            async with AsyncClient(transport=ASGITransport(app=server.app), base_url="http://test") as client:
+                rejected = await client.post("/api/sos", json={
+                    "latitude": 27.7, "longitude": 85.3, "emergency_type": "general\r\nBcc: attacker@example.com",
+                })
+                assert rejected.status_code == 422
+
+                # A row that can never be rendered must not take the dispatcher down with it
+                await app_db.sos_deliveries.insert_one({
+                    "id": "poison", "alert_id": "missing", "channel": "email", "to": server.SOS_ALERT_EMAIL,
+                    "subject": "broken", "status": "pending", "attempts": 0,
+                    "received_at": datetime.now(timezone.utc), "next_attempt_at": datetime.now(timezone.utc),
+                })
+                accepted = await client.post("/api/sos", json={
+                    "latitude": 27.7, "longitude": 85.3, "emergency_type": "medical",
+                })
+                assert accepted.status_code == 200
+                alert_id = accepted.json()["id"]
+
+            async def notified():
+                alert = await app_db.sos_alerts.find_one({"id": alert_id})
+                return bool(alert and alert.get("notified_at"))
+
+            assert await _wait_for(notified)
+            assert not dispatcher.done()
+            poison = await app_db.sos_deliveries.find_one({"id": "poison"})
+            assert poison["status"] == "pending" and "KeyError" in poison["last_error"]
+            assert len(list(tmp_path.glob("*.eml"))) == 1
+        finally:
+            dispatcher.cancel()
+            await server.sos_mail_pool.close()
+            sink.close()
+            await sink.wait_closed()
+
+    asyncio.run(scenario())
+
+
+def test_alert_is_notified_when_queueing_fails_in_the_request(app_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "SOS_RECONCILE_AFTER_SECONDS", 0)
+    enqueue = server.enqueue_sos_deliveries
+    calls = []
+
+    async def enqueue_fails_once(sos_record, received_at):
+        calls.append(sos_record["id"])
+        if len(calls) == 1:
+            raise server.PyMongoError("write concern timeout")
+        await enqueue(sos_record, received_at)
+
+    monkeypatch.setattr(server, "enqueue_sos_deliveries", enqueue_fails_once)
+
+    async def scenario():
+        sink = await asyncio.start_server(server.SMTPSink(tmp_path).handle, "127.0.0.1", SINK_PORT)
+        try:
+            async with AsyncClient(transport=ASGITransport(app=server.app), base_url="http://test") as client:
+                response = await client.post("/api/sos", json={"latitude": 27.7, "longitude": 85.3})
+            assert response.status_code == 200
+            alert_id = response.json()["id"]
+            assert (await app_db.sos_alerts.find_one({"id": alert_id}))["delivery_queued"] is False
+            assert await app_db.sos_deliveries.count_documents({"alert_id": alert_id}) == 0
+
+            dispatcher = asyncio.create_task(server.sos_dispatcher_loop())
+            try:
+                async def notified():
+                    alert = await app_db.sos_alerts.find_one({"id": alert_id})
+                    return bool(alert.get("notified_at"))
+
+                assert await _wait_for(notified)
+            finally:
+                dispatcher.cancel()
+            alert = await app_db.sos_alerts.find_one({"id": alert_id})
+            assert alert["delivery_queued"] is True
+            assert await app_db.sos_deliveries.count_documents({"alert_id": alert_id}) == 1
+            assert len(list(tmp_path.glob("*.eml"))) == 1
+        finally:
+            await server.sos_mail_pool.close()
+            sink.close()
+            await sink.wait_closed()
+
+    asyncio.run(scenario())
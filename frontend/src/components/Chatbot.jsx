@@ -3,8 +3,8 @@ import { MessageCircle, X, Send, Loader2, Bot, User, Sparkles } from 'lucide-rea
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
 import { ScrollArea } from '@/components/ui/scroll-area';
-import axios from 'axios';
 import { API } from '@/App';
+import { readEventStream } from '@/lib/sse';
 
 const Chatbot = () => {
   const [isOpen, setIsOpen] = useState(false);
@@ -37,13 +37,42 @@ const Chatbot = () => {
     setLoading(true);
 
     try {
-      const response = await axios.post(`${API}/chatbot`, {
-        message: userMessage,
-        session_id: sessionId
+      // The reply streams in token by token; the first token adds the assistant message
+      const response = await fetch(`${API}/chatbot/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ message: userMessage, session_id: sessionId })
       });
+      if (!response.ok) {
+        throw new Error(`Chatbot stream failed with ${response.status}`);
+      }
 
-      setSessionId(response.data.session_id);
-      setMessages(prev => [...prev, { role: 'assistant', content: response.data.response }]);
+      let started = false;
+      const appendText = (text) => {
+        if (!started) {
+          started = true;
+          setMessages(prev => [...prev, { role: 'assistant', content: text }]);
+          return;
+        }
+        setMessages(prev => {
+          const last = prev[prev.length - 1];
+          return [...prev.slice(0, -1), { ...last, content: last.content + text }];
+        });
+      };
+
+      await readEventStream(response, (event) => {
+        const data = JSON.parse(event.data);
+        if (event.type === 'token') {
+          appendText(data.text);
+        } else if (event.type === 'error') {
+          appendText(`\n\n${data.detail}`);
+        } else if (event.type === 'done') {
+          setSessionId(data.session_id);
+        }
+      });
+      if (!started) {
+        throw new Error('Chatbot stream ended without a reply');
+      }
     } catch (error) {
       console.error('Chatbot error:', error);
       setMessages(prev => [...prev, { 
@@ -125,7 +154,7 @@ const Chatbot = () => {
                 </div>
               ))}
               
-              {loading && (
+              {loading && messages[messages.length - 1]?.role === 'user' && (
                 <div className="flex gap-3">
                   <div className="w-8 h-8 rounded-full bg-slate-100 flex items-center justify-center">
                     <Bot className="h-4 w-4 text-slate-600" />
@@ -0,0 +1,16 @@
+import { Loader2 } from 'lucide-react';
+import { Button } from '@/components/ui/button';
+
+const LoadMoreButton = ({ hasMore, loading, onClick, label = 'Load more' }) => {
+  if (!hasMore) return null;
+  return (
+    <div className="flex justify-center mt-8">
+      <Button variant="outline" onClick={onClick} disabled={loading}>
+        {loading && <Loader2 className="h-4 w-4 mr-2 animate-spin" />}
+        {label}
+      </Button>
+    </div>
+  );
+};
+
+export default LoadMoreButton;
@@ -26,6 +26,7 @@ const translations = {
     signup: 'Sign Up',
     logout: 'Logout',
     dashboard: 'Dashboard',
+    loadMore: 'Load more',
     
     // Home Page
     heroTitle: 'Welcome to NepSafe',
@@ -306,6 +307,7 @@ const translations = {
     signup: 'दर्ता गर्नुहोस्',
     logout: 'लगआउट',
     dashboard: 'ड्यासबोर्ड',
+    loadMore: 'थप लोड गर्नुहोस्',
     
     // Home Page
     heroTitle: 'NepSafe मा स्वागत छ',
@@ -0,0 +1,40 @@
+import { useCallback, useRef, useState } from 'react';
+import { fetchPage } from '@/lib/pagination';
+
+// A list endpoint shown one page at a time: load() replaces the rows with the first page for
+// the given params (resolving to that page, or null if a newer load() superseded it) and
+// loadMore() appends the next page while the server reports more.
+export function useCursorList(path) {
+  const [rows, setRows] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const configRef = useRef({});
+  // A page that arrives after load() was called again belongs to the old params; drop it
+  const generationRef = useRef(0);
+
+  const load = useCallback(async (config = {}) => {
+    const generation = ++generationRef.current;
+    configRef.current = config;
+    const page = await fetchPage(path, config);
+    if (generation !== generationRef.current) return null;
+    setRows(page.rows);
+    setNextCursor(page.nextCursor);
+    return page;
+  }, [path]);
+
+  const loadMore = useCallback(async () => {
+    if (!nextCursor) return;
+    const generation = generationRef.current;
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage(path, configRef.current, nextCursor);
+      if (generation !== generationRef.current) return;
+      setRows((prev) => [...prev, ...page.rows]);
+      setNextCursor(page.nextCursor);
+    } finally {
+      setLoadingMore(false);
+    }
+  }, [path, nextCursor]);
+
+  return { rows, setRows, hasMore: Boolean(nextCursor), loadingMore, load, loadMore };
+}
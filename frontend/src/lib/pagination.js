@@ -0,0 +1,28 @@
+import { axiosInstance } from '@/App';
+
+// Largest set fetchAllPages will assemble; views that need more must page instead
+export const MAX_ROWS = 2000;
+
+// List endpoints return one page per request and the cursor for the next page in the
+// X-Next-Cursor header, which is absent on the last page.
+export async function fetchPage(path, config = {}, cursor) {
+  const response = await axiosInstance.get(path, { ...config, params: { ...config.params, cursor } });
+  return {
+    rows: Array.isArray(response.data) ? response.data : [],
+    nextCursor: response.headers['x-next-cursor'] || null,
+    headers: response.headers,
+  };
+}
+
+// Follow the cursor for views that need the whole set at once (map markers, client-side
+// category filters), stopping after maxRows.
+export async function fetchAllPages(path, config = {}, maxRows = MAX_ROWS) {
+  const rows = [];
+  let cursor;
+  do {
+    const page = await fetchPage(path, config, cursor);
+    rows.push(...page.rows);
+    cursor = page.nextCursor;
+  } while (cursor && rows.length < maxRows);
+  return rows.slice(0, maxRows);
+}
@@ -0,0 +1,24 @@
+// Read a Server-Sent Events response body obtained with fetch. Used instead of EventSource
+// where a request needs an Authorization header or a POST body.
+export async function readEventStream(response, onEvent) {
+  const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = '';
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) return;
+    buffer += value;
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      const event = { id: null, type: 'message', data: '' };
+      block.split('\n').forEach((line) => {
+        if (line.startsWith('id: ')) event.id = line.slice(4);
+        else if (line.startsWith('event: ')) event.type = line.slice(7);
+        else if (line.startsWith('data: ')) event.data += line.slice(6);
+      });
+      // Blocks without data are retry hints and keepalive comments
+      if (event.data) onEvent(event);
+    }
+  }
+}
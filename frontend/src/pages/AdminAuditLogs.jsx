@@ -1,5 +1,6 @@
 import { useEffect, useState } from 'react';
-import { axiosInstance } from '@/App';
+import { useCursorList } from '@/hooks/useCursorList';
+import LoadMoreButton from '@/components/LoadMoreButton';
 import { Card, CardContent } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { ArrowLeft } from 'lucide-react';
@@ -7,7 +8,7 @@ import { toast } from 'sonner';
 import { Link } from 'react-router-dom';
 
 const AdminAuditLogs = () => {
-  const [logs, setLogs] = useState([]);
+  const { rows: logs, hasMore, loadingMore, load: loadLogs, loadMore } = useCursorList('/admin/audit-logs');
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
@@ -17,8 +18,7 @@ const AdminAuditLogs = () => {
   const fetchLogs = async () => {
     setLoading(true);
     try {
-      const response = await axiosInstance.get('/admin/audit-logs');
-      setLogs(response.data);
+      await loadLogs();
     } catch (error) {
       toast.error('Failed to load audit logs');
     } finally {
@@ -26,6 +26,14 @@ const AdminAuditLogs = () => {
     }
   };
 
+  const loadMoreLogs = async () => {
+    try {
+      await loadMore();
+    } catch (error) {
+      toast.error('Failed to load audit logs');
+    }
+  };
+
   if (loading) {
     return (
       <div className="flex justify-center items-center h-screen">
@@ -74,6 +82,7 @@ const AdminAuditLogs = () => {
             ))}
           </div>
         )}
+        <LoadMoreButton hasMore={hasMore} loading={loadingMore} onClick={loadMoreLogs} />
       </div>
     </div>
   );
@@ -1,5 +1,6 @@
 import { useState, useEffect } from 'react';
-import { axiosInstance } from '@/App';
+import { useCursorList } from '@/hooks/useCursorList';
+import LoadMoreButton from '@/components/LoadMoreButton';
 import { Card, CardContent } from '@/components/ui/card';
 import { Hotel, Calendar, Users, ArrowLeft } from 'lucide-react';
 import { toast } from 'sonner';
@@ -8,7 +9,7 @@ import { Button } from '@/components/ui/button';
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
 
 const AdminBookings = () => {
-  const [bookings, setBookings] = useState([]);
+  const { rows: bookings, hasMore, loadingMore, load: loadBookings, loadMore } = useCursorList('/admin/bookings');
   const [loading, setLoading] = useState(true);
   const [filter, setFilter] = useState('all');
 
@@ -19,8 +20,7 @@ const AdminBookings = () => {
   const fetchBookings = async () => {
     setLoading(true);
     try {
-      const response = await axiosInstance.get('/admin/bookings');
-      setBookings(response.data);
+      await loadBookings();
     } catch (error) {
       toast.error('Failed to fetch bookings');
     } finally {
@@ -28,6 +28,14 @@ const AdminBookings = () => {
     }
   };
 
+  const loadMoreBookings = async () => {
+    try {
+      await loadMore();
+    } catch (error) {
+      toast.error('Failed to fetch bookings');
+    }
+  };
+
   const getStatusColor = (status) => {
     switch (status) {
       case 'confirmed':
@@ -145,6 +153,7 @@ const AdminBookings = () => {
             ))}
           </div>
         )}
+        <LoadMoreButton hasMore={hasMore} loading={loadingMore} onClick={loadMoreBookings} />
       </div>
     </div>
   );
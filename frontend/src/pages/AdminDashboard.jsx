@@ -33,8 +33,8 @@ const AdminDashboard = () => {
 
   const fetchSosAlerts = async () => {
     try {
-      const response = await axiosInstance.get('/admin/sos-alerts');
-      setSosAlerts(response.data.filter(a => a.status === 'active').slice(0, 5));
+      const response = await axiosInstance.get('/admin/sos-alerts', { params: { status: 'active', limit: 5 } });
+      setSosAlerts(response.data);
     } catch (error) {
       console.error('Failed to fetch SOS alerts');
     }
@@ -1,5 +1,7 @@
 import { useEffect, useState } from 'react';
 import { axiosInstance } from '@/App';
+import { useCursorList } from '@/hooks/useCursorList';
+import LoadMoreButton from '@/components/LoadMoreButton';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
@@ -29,8 +31,10 @@ const emptyForm = {
   cost: ''
 };
 
+const EDITABLE_SPOT_FIELDS = [...Object.keys(emptyForm), 'image_url'].join(',');
+
 const AdminDestinations = () => {
-  const [spots, setSpots] = useState([]);
+  const { rows: spots, hasMore, loadingMore, load: loadSpots, loadMore } = useCursorList('/admin/tourist-spots');
   const [loading, setLoading] = useState(true);
   const [saving, setSaving] = useState(false);
   const [editingId, setEditingId] = useState(null);
@@ -65,8 +69,10 @@ const AdminDestinations = () => {
   const fetchSpots = async () => {
     setLoading(true);
     try {
-      const response = await axiosInstance.get('/admin/tourist-spots');
-      setSpots(Array.isArray(response.data) ? response.data : []);
+      // The edit form needs the full text fields, not the truncated list summary
+      await loadSpots({
+        params: { fields: EDITABLE_SPOT_FIELDS },
+      });
     } catch (error) {
       toast.error('Failed to load destinations');
     } finally {
@@ -74,6 +80,14 @@ const AdminDestinations = () => {
     }
   };
 
+  const loadMoreSpots = async () => {
+    try {
+      await loadMore();
+    } catch (error) {
+      toast.error('Failed to load destinations');
+    }
+  };
+
   const handleChange = (key) => (event) => {
     setForm((prev) => ({ ...prev, [key]: event.target.value }));
   };
@@ -358,6 +372,7 @@ const AdminDestinations = () => {
             ))}
           </div>
         )}
+        <LoadMoreButton hasMore={hasMore} loading={loadingMore} onClick={loadMoreSpots} />
       </div>
     </div>
   );
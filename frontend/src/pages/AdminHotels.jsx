@@ -1,5 +1,7 @@
 import { useEffect, useState } from 'react';
 import { axiosInstance } from '@/App';
+import { useCursorList } from '@/hooks/useCursorList';
+import LoadMoreButton from '@/components/LoadMoreButton';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { Dialog, DialogContent, DialogHeader, DialogTitle } from '@/components/ui/dialog';
@@ -10,7 +12,7 @@ import { toast } from 'sonner';
 import { Link } from 'react-router-dom';
 
 const AdminHotels = () => {
-  const [hotels, setHotels] = useState([]);
+  const { rows: hotels, hasMore, loadingMore, load: loadHotels, loadMore } = useCursorList('/admin/hotels');
   const [loading, setLoading] = useState(true);
   const [filter, setFilter] = useState('pending');
   const [selectedHotel, setSelectedHotel] = useState(null);
@@ -24,10 +26,9 @@ const AdminHotels = () => {
   const fetchHotels = async (status) => {
     setLoading(true);
     try {
-      const response = await axiosInstance.get('/admin/hotels', {
+      await loadHotels({
         params: { status: status === 'all' ? undefined : status }
       });
-      setHotels(response.data);
     } catch (error) {
       toast.error('Failed to load hotels');
     } finally {
@@ -35,6 +36,14 @@ const AdminHotels = () => {
     }
   };
 
+  const loadMoreHotels = async () => {
+    try {
+      await loadMore();
+    } catch (error) {
+      toast.error('Failed to load hotels');
+    }
+  };
+
   const updateApproval = async (status) => {
     if (!selectedHotel) return;
     setUpdating(true);
@@ -145,6 +154,7 @@ const AdminHotels = () => {
             ))}
           </div>
         )}
+        <LoadMoreButton hasMore={hasMore} loading={loadingMore} onClick={loadMoreHotels} />
       </div>
 
       <Dialog open={!!selectedHotel} onOpenChange={() => setSelectedHotel(null)}>
@@ -1,5 +1,7 @@
 import { useState, useEffect } from 'react';
 import { axiosInstance } from '@/App';
+import { useCursorList } from '@/hooks/useCursorList';
+import LoadMoreButton from '@/components/LoadMoreButton';
 import { Button } from '@/components/ui/button';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Dialog, DialogContent, DialogHeader, DialogTitle } from '@/components/ui/dialog';
@@ -12,22 +14,51 @@ import { Link } from 'react-router-dom';
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
 
 const AdminPermits = () => {
-  const [permits, setPermits] = useState([]);
+  const { rows: permits, hasMore, loadingMore, load: loadPermits, loadMore } = useCursorList('/admin/permits');
   const [loading, setLoading] = useState(true);
   const [selectedPermit, setSelectedPermit] = useState(null);
   const [updating, setUpdating] = useState(false);
   const [updateData, setUpdateData] = useState({ status: '', admin_note: '' });
   const [filter, setFilter] = useState('pending');
+  const [documentUrl, setDocumentUrl] = useState(null);
 
   useEffect(() => {
     fetchPermits();
   }, []);
 
+  // Passport scans are only served with the admin's token, so they are fetched rather than linked
+  useEffect(() => {
+    const documentData = selectedPermit?.document_data;
+    if (!documentData) {
+      setDocumentUrl(null);
+      return undefined;
+    }
+    if (!/^(https?:\/\/|\/)/.test(documentData)) {
+      setDocumentUrl(`data:image/jpeg;base64,${documentData}`);
+      return undefined;
+    }
+    let objectUrl = null;
+    let cancelled = false;
+    axiosInstance.get(`/permits/${selectedPermit.id}/document`, { responseType: 'blob' })
+      .then((response) => {
+        if (cancelled) return;
+        objectUrl = URL.createObjectURL(response.data);
+        setDocumentUrl(objectUrl);
+      })
+      .catch(() => {
+        if (!cancelled) toast.error('Failed to load passport photo');
+      });
+    return () => {
+      cancelled = true;
+      if (objectUrl) URL.revokeObjectURL(objectUrl);
+      setDocumentUrl(null);
+    };
+  }, [selectedPermit]);
+
   const fetchPermits = async () => {
     setLoading(true);
     try {
-      const response = await axiosInstance.get('/admin/permits');
-      setPermits(response.data);
+      await loadPermits();
     } catch (error) {
       toast.error('Failed to fetch permits');
     } finally {
@@ -35,6 +66,14 @@ const AdminPermits = () => {
     }
   };
 
+  const loadMorePermits = async () => {
+    try {
+      await loadMore();
+    } catch (error) {
+      toast.error('Failed to fetch permits');
+    }
+  };
+
   const fetchPermitDetails = async (permitId) => {
     try {
       const response = await axiosInstance.get(`/admin/permits/${permitId}`);
@@ -208,6 +247,7 @@ const AdminPermits = () => {
             ))}
           </div>
         )}
+        <LoadMoreButton hasMore={hasMore} loading={loadingMore} onClick={loadMorePermits} />
       </div>
 
       {/* Review Modal with Full Details */}
@@ -272,12 +312,12 @@ const AdminPermits = () => {
             </div>
 
             {/* Passport Photo */}
-            {selectedPermit?.document_data && (
+            {documentUrl && (
               <div className="bg-gradient-to-br from-green-50 to-gray-50 p-6 rounded-xl border-2">
                 <h3 className="text-lg font-bold text-gray-900 mb-4">Uploaded Passport Photo</h3>
                 <div className="flex justify-center">
                   <img 
-                    src={`data:image/jpeg;base64,${selectedPermit.document_data}`}
+                    src={documentUrl}
                     alt="Passport Photo"
                     className="max-w-md max-h-96 rounded-lg border-4 border-white shadow-xl object-contain"
                   />
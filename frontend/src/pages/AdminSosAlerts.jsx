@@ -1,5 +1,7 @@
-import { useEffect, useState } from 'react';
-import { axiosInstance } from '@/App';
+import { useEffect, useRef, useState } from 'react';
+import { API, axiosInstance } from '@/App';
+import { useCursorList } from '@/hooks/useCursorList';
+import LoadMoreButton from '@/components/LoadMoreButton';
 import { Card, CardContent } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { Tabs, TabsList, TabsTrigger } from '@/components/ui/tabs';
@@ -8,33 +10,121 @@ import { Textarea } from '@/components/ui/textarea';
 import { AlertTriangle, ArrowLeft } from 'lucide-react';
 import { toast } from 'sonner';
 import { Link } from 'react-router-dom';
+import { readEventStream } from '@/lib/sse';
+
+const matchesFilter = (alert, filter) => filter === 'all' || alert.status === filter;
+
+// Read the admin SOS event stream. This uses fetch rather than EventSource because the
+// endpoint needs the Authorization header; Last-Event-ID resumes after a dropped connection.
+const readSosStream = async (lastEventId, signal, onEvent) => {
+  const headers = { Authorization: `Bearer ${localStorage.getItem('token')}` };
+  if (lastEventId) {
+    headers['Last-Event-ID'] = lastEventId;
+  }
+  const response = await fetch(`${API}/admin/sos-alerts/stream`, { headers, signal });
+  if (!response.ok) {
+    throw new Error(`SOS stream failed with ${response.status}`);
+  }
+  await readEventStream(response, onEvent);
+};
 
 const AdminSosAlerts = () => {
-  const [alerts, setAlerts] = useState([]);
+  const { rows: alerts, setRows: setAlerts, hasMore, loadingMore, load: loadAlerts, loadMore } = useCursorList('/admin/sos-alerts');
   const [filter, setFilter] = useState('active');
   const [selectedAlert, setSelectedAlert] = useState(null);
   const [adminNote, setAdminNote] = useState('');
   const [loading, setLoading] = useState(true);
   const [updating, setUpdating] = useState(false);
+  const filterRef = useRef(filter);
+  filterRef.current = filter;
 
+  // A resumed or replayed stream can repeat events; only announce each new alert once
+  const announcedRef = useRef(new Set());
+
+  // The list page is a snapshot as of its X-Event-Seq; the stream then replays every event after
+  // that, so nothing published while the page loaded is lost. A dropped connection resumes from
+  // the last event seen without reloading; only a filter change or a reset takes a new snapshot.
   useEffect(() => {
-    fetchAlerts(filter);
+    let session = null;
+    let retryTimer;
+
+    const handleEvent = (event) => {
+      const payload = JSON.parse(event.data);
+      if (event.type === 'reset') {
+        start();
+      } else if (event.type === 'sos.created') {
+        if (!matchesFilter(payload, filter)) return;
+        setAlerts((prev) => (prev.some((a) => a.id === payload.id) ? prev : [payload, ...prev]));
+        if (announcedRef.current.has(payload.id)) return;
+        announcedRef.current.add(payload.id);
+        toast.warning(`New SOS alert: ${payload.emergency_type} from ${payload.user_name || 'Anonymous'}`);
+      } else if (event.type === 'sos.updated') {
+        applyUpdate(payload);
+      }
+    };
+
+    const start = async () => {
+      session?.abort();
+      clearTimeout(retryTimer);
+      const controller = new AbortController();
+      session = controller;
+      const page = await fetchAlerts(filter);
+      if (controller.signal.aborted) return;
+      page?.rows.forEach((a) => announcedRef.current.add(a.id));
+      let lastEventId = page?.headers['x-event-seq'] || null;
+
+      const connect = async () => {
+        try {
+          await readSosStream(lastEventId, controller.signal, (event) => {
+            if (controller.signal.aborted) return;
+            lastEventId = event.id || lastEventId;
+            handleEvent(event);
+          });
+        } catch (error) {
+          if (controller.signal.aborted) return;
+        }
+        if (!controller.signal.aborted) {
+          retryTimer = setTimeout(connect, 3000);
+        }
+      };
+      connect();
+    };
+    start();
+
+    return () => {
+      session?.abort();
+      clearTimeout(retryTimer);
+    };
   }, [filter]);
 
+  const applyUpdate = (update) => {
+    setAlerts((prev) => prev
+      .map((a) => (a.id === update.id ? { ...a, ...update } : a))
+      .filter((a) => matchesFilter(a, filterRef.current)));
+  };
+
   const fetchAlerts = async (status) => {
     setLoading(true);
     try {
-      const response = await axiosInstance.get('/admin/sos-alerts', {
+      return await loadAlerts({
         params: { status: status === 'all' ? undefined : status }
       });
-      setAlerts(response.data);
     } catch (error) {
       toast.error('Failed to load SOS alerts');
+      return null;
     } finally {
       setLoading(false);
     }
   };
 
+  const loadMoreAlerts = async () => {
+    try {
+      await loadMore();
+    } catch (error) {
+      toast.error('Failed to load SOS alerts');
+    }
+  };
+
   const updateAlert = async (status) => {
     if (!selectedAlert) return;
     setUpdating(true);
@@ -44,9 +134,9 @@ const AdminSosAlerts = () => {
         admin_note: adminNote
       });
       toast.success('Alert updated');
+      applyUpdate({ id: selectedAlert.id, status, admin_note: adminNote });
       setSelectedAlert(null);
       setAdminNote('');
-      fetchAlerts(filter);
     } catch (error) {
       toast.error(error.response?.data?.detail || 'Failed to update alert');
     } finally {
@@ -127,6 +217,7 @@ const AdminSosAlerts = () => {
             ))}
           </div>
         )}
+        <LoadMoreButton hasMore={hasMore} loading={loadingMore} onClick={loadMoreAlerts} />
       </div>
 
       <Dialog open={!!selectedAlert} onOpenChange={() => setSelectedAlert(null)}>
@@ -1,5 +1,7 @@
 import { useEffect, useState } from 'react';
 import { axiosInstance } from '@/App';
+import { useCursorList } from '@/hooks/useCursorList';
+import LoadMoreButton from '@/components/LoadMoreButton';
 import { Card, CardContent } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { Tabs, TabsList, TabsTrigger } from '@/components/ui/tabs';
@@ -10,7 +12,7 @@ import { toast } from 'sonner';
 import { Link, useLocation } from 'react-router-dom';
 
 const AdminUsers = () => {
-  const [users, setUsers] = useState([]);
+  const { rows: users, hasMore, loadingMore, load: loadUsers, loadMore } = useCursorList('/admin/users');
   const [filter, setFilter] = useState('active');
   const [roleFilter, setRoleFilter] = useState('all');
   const [selectedUser, setSelectedUser] = useState(null);
@@ -40,8 +42,7 @@ const AdminUsers = () => {
   const fetchUsers = async () => {
     setLoading(true);
     try {
-      const response = await axiosInstance.get('/admin/users');
-      setUsers(response.data);
+      await loadUsers();
     } catch (error) {
       toast.error('Failed to load users');
     } finally {
@@ -49,6 +50,14 @@ const AdminUsers = () => {
     }
   };
 
+  const loadMoreUsers = async () => {
+    try {
+      await loadMore();
+    } catch (error) {
+      toast.error('Failed to load users');
+    }
+  };
+
   const updateUserStatus = async (userId, payload) => {
     setUpdating(true);
     try {
@@ -180,6 +189,7 @@ const AdminUsers = () => {
             ))}
           </div>
         )}
+        <LoadMoreButton hasMore={hasMore} loading={loadingMore} onClick={loadMoreUsers} />
       </div>
 
       <Dialog open={!!selectedUser} onOpenChange={() => setSelectedUser(null)}>
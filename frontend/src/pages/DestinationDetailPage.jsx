@@ -1,5 +1,5 @@
 // Displays full destination details when user clicks "Learn More"
-import { useEffect, useMemo, useState } from 'react';
+import { useEffect, useState } from 'react';
 import { useParams, Link } from 'react-router-dom';
 import { MapPin, Clock, Ticket, Star, ArrowLeft, ExternalLink } from 'lucide-react';
 import { Button } from '@/components/ui/button';
@@ -21,21 +21,20 @@ const normalizeCategory = (category) => {
 const DestinationDetailPage = () => {
   const { id } = useParams();
   const { language } = useLanguage();
-  const [destinations, setDestinations] = useState([]);
+  const [destination, setDestination] = useState(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
     let isMounted = true;
-    const fetchDestinations = async () => {
+    const fetchDestination = async () => {
       try {
-        const response = await axiosInstance.get('/tourist-spots');
-        const spots = Array.isArray(response.data) ? response.data : [];
+        const response = await axiosInstance.get(`/tourist-spots/${id}`);
         if (isMounted) {
-          setDestinations(spots);
+          setDestination(response.data);
         }
       } catch (error) {
         if (isMounted) {
-          setDestinations([]);
+          setDestination(null);
         }
       } finally {
         if (isMounted) {
@@ -44,17 +43,11 @@ const DestinationDetailPage = () => {
       }
     };
 
-    fetchDestinations();
+    fetchDestination();
     return () => {
       isMounted = false;
     };
-  }, []);
-
-  // Find destination by ID from URL param
-  const destination = useMemo(
-    () => destinations.find((item) => String(item.id) === String(id)),
-    [destinations, id]
-  );
+  }, [id]);
 
   if (loading) {
     return (
@@ -1,12 +1,14 @@
 import { useState, useEffect } from 'react';
 import { axiosInstance } from '@/App';
+import { useCursorList } from '@/hooks/useCursorList';
+import LoadMoreButton from '@/components/LoadMoreButton';
 import { Card, CardContent } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { Calendar, User, Hotel, XCircle } from 'lucide-react';
 import { toast } from 'sonner';
 
 const HotelOwnerBookingsPage = () => {
-  const [bookings, setBookings] = useState([]);
+  const { rows: bookings, hasMore, loadingMore, load: loadBookings, loadMore } = useCursorList('/hotel-owner/bookings');
   const [loading, setLoading] = useState(true);
   const [cancelling, setCancelling] = useState(null);
 
@@ -17,8 +19,7 @@ const HotelOwnerBookingsPage = () => {
   const fetchBookings = async () => {
     setLoading(true);
     try {
-      const response = await axiosInstance.get('/hotel-owner/bookings');
-      setBookings(response.data);
+      await loadBookings();
     } catch (error) {
       toast.error('Failed to load bookings');
     } finally {
@@ -26,6 +27,14 @@ const HotelOwnerBookingsPage = () => {
     }
   };
 
+  const loadMoreBookings = async () => {
+    try {
+      await loadMore();
+    } catch (error) {
+      toast.error('Failed to load bookings');
+    }
+  };
+
   const handleCancelBooking = async (bookingId) => {
     if (!window.confirm('Are you sure you want to cancel this booking? The guest will be notified.')) return;
     
@@ -149,6 +158,7 @@ const HotelOwnerBookingsPage = () => {
             ))}
           </div>
         )}
+        <LoadMoreButton hasMore={hasMore} loading={loadingMore} onClick={loadMoreBookings} />
       </div>
     </div>
   );
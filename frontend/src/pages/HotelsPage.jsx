@@ -1,5 +1,7 @@
 import { useState, useEffect } from 'react';
 import { axiosInstance } from '@/App';
+import { useCursorList } from '@/hooks/useCursorList';
+import LoadMoreButton from '@/components/LoadMoreButton';
 import { useLanguage } from '@/context/LanguageContext';
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
@@ -11,7 +13,7 @@ import { toast } from 'sonner';
 
 const HotelsPage = ({ user }) => {
   const { t } = useLanguage();
-  const [hotels, setHotels] = useState([]);
+  const { rows: hotels, hasMore, loadingMore, load: loadHotels, loadMore } = useCursorList('/hotels');
   const [loading, setLoading] = useState(true);
   const [searchCity, setSearchCity] = useState('');
   const [selectedHotel, setSelectedHotel] = useState(null);
@@ -32,8 +34,7 @@ const HotelsPage = ({ user }) => {
   const fetchHotels = async (city = '') => {
     setLoading(true);
     try {
-      const response = await axiosInstance.get(`/hotels${city ? `?city=${city}` : ''}`);
-      setHotels(response.data);
+      await loadHotels({ params: { city: city || undefined } });
     } catch (error) {
       toast.error('Failed to fetch hotels');
     } finally {
@@ -41,6 +42,14 @@ const HotelsPage = ({ user }) => {
     }
   };
 
+  const loadMoreHotels = async () => {
+    try {
+      await loadMore();
+    } catch (error) {
+      toast.error('Failed to fetch hotels');
+    }
+  };
+
   const handleSearch = (e) => {
     e.preventDefault();
     fetchHotels(searchCity);
@@ -229,6 +238,7 @@ const HotelsPage = ({ user }) => {
             ))}
           </div>
         )}
+        <LoadMoreButton hasMore={hasMore} loading={loadingMore} onClick={loadMoreHotels} label={t('loadMore')} />
       </div>
 
       {/* Booking Modal */}
@@ -1,5 +1,7 @@
 import { useState, useEffect } from 'react';
 import { axiosInstance } from '@/App';
+import { useCursorList } from '@/hooks/useCursorList';
+import LoadMoreButton from '@/components/LoadMoreButton';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { Dialog, DialogContent, DialogHeader, DialogTitle } from '@/components/ui/dialog';
@@ -9,7 +11,7 @@ import { toast } from 'sonner';
 import { Link } from 'react-router-dom';
 
 const ManageHotelsPage = () => {
-  const [hotels, setHotels] = useState([]);
+  const { rows: hotels, hasMore, loadingMore, load: loadHotels, loadMore } = useCursorList('/hotel-owner/hotels');
   const [loading, setLoading] = useState(true);
   const [selectedHotel, setSelectedHotel] = useState(null);
   const [uploading, setUploading] = useState(false);
@@ -21,8 +23,7 @@ const ManageHotelsPage = () => {
   const fetchHotels = async () => {
     setLoading(true);
     try {
-      const response = await axiosInstance.get('/hotel-owner/hotels');
-      setHotels(response.data);
+      await loadHotels();
     } catch (error) {
       toast.error('Failed to load hotels');
     } finally {
@@ -30,6 +31,14 @@ const ManageHotelsPage = () => {
     }
   };
 
+  const loadMoreHotels = async () => {
+    try {
+      await loadMore();
+    } catch (error) {
+      toast.error('Failed to load hotels');
+    }
+  };
+
   const handlePhotoUpload = async (event) => {
     const files = event.target.files;
     if (!files || files.length === 0) return;
@@ -112,9 +121,9 @@ const ManageHotelsPage = () => {
                         alt={hotel.name}
                         className="w-full h-48 object-cover rounded-lg mb-4"
                       />
-                      {hotel.images && hotel.images.length > 1 && (
+                      {hotel.image_count > 1 && (
                         <div className="absolute top-2 right-2 bg-black/60 text-white px-2 py-1 rounded-full text-xs">
-                          {hotel.images.length} photos
+                          {hotel.image_count} photos
                         </div>
                       )}
                     </div>
@@ -168,6 +177,7 @@ const ManageHotelsPage = () => {
             ))}
           </div>
         )}
+        <LoadMoreButton hasMore={hasMore} loading={loadingMore} onClick={loadMoreHotels} />
       </div>
 
       {/* Photo Upload Modal */}
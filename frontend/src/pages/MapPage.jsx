@@ -6,6 +6,7 @@ import 'leaflet.markercluster';
 import 'leaflet.markercluster/dist/MarkerCluster.css';
 import 'leaflet.markercluster/dist/MarkerCluster.Default.css';
 import { axiosInstance } from '@/App';
+import { fetchAllPages } from '@/lib/pagination';
 import { Hotel, AlertTriangle, MapPin, Navigation, X, Search } from 'lucide-react';
 import { Button } from '@/components/ui/button';
 import { Card } from '@/components/ui/card';
@@ -298,14 +299,14 @@ const MapPage = () => {
   const fetchMapData = async () => {
     setLoading(true);
     try {
-      const [hotelsRes, emergencyRes, spotsRes] = await Promise.all([
-        axiosInstance.get('/hotels'),
+      const [hotelRows, emergencyRes, spotRows] = await Promise.all([
+        fetchAllPages('/hotels', { params: { limit: 1000 } }),
         axiosInstance.get('/emergency-contacts'),
-        axiosInstance.get('/tourist-spots')
+        fetchAllPages('/tourist-spots', { params: { limit: 1000 } })
       ]);
-      setHotels(hotelsRes.data);
+      setHotels(hotelRows);
       setEmergencyContacts(emergencyRes.data);
-      setTouristSpots(spotsRes.data);
+      setTouristSpots(spotRows);
     } catch (error) {
       // Log detailed error for debugging
       console.error('Map fetch error:', error);
@@ -354,19 +355,6 @@ const MapPage = () => {
     } catch (err) {
       console.error('Weather fetch error:', err);
       const msg = err?.response?.data?.detail || err?.message || 'Failed to fetch weather';
-      const shouldFallback = err?.response?.status === 400 || (msg && msg.toString().includes('OPENWEATHER_API_KEY'));
-      if (shouldFallback) {
-        toast('Using fallback weather (no alerts).');
-        try {
-          const fallback = await axiosInstance.get('/weather/fallback', { params: { lat: center.lat, lon: center.lng } });
-          setWeather(fallback.data);
-          toast.success('Loaded basic weather (fallback)');
-        } catch (fbErr) {
-          console.error('Fallback weather fetch error:', fbErr);
-          toast.error('Failed to fetch fallback weather');
-        }
-        return;
-      }
       toast.error(msg);
     }
   };
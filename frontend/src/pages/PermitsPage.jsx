@@ -1,5 +1,7 @@
 import { useState, useEffect } from 'react';
 import { axiosInstance } from '@/App';
+import { useCursorList } from '@/hooks/useCursorList';
+import LoadMoreButton from '@/components/LoadMoreButton';
 import { useLanguage } from '@/context/LanguageContext';
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
@@ -128,7 +130,7 @@ const PERMIT_DESTINATIONS = [
 
 const PermitsPage = ({ user }) => {
   const { t } = useLanguage();
-  const [permits, setPermits] = useState([]);
+  const { rows: permits, hasMore, loadingMore, load: loadPermits, loadMore } = useCursorList('/permits');
   const [loading, setLoading] = useState(true);
   const [submitting, setSubmitting] = useState(false);
   const [showForm, setShowForm] = useState(false);
@@ -154,8 +156,7 @@ const PermitsPage = ({ user }) => {
   const fetchPermits = async () => {
     setLoading(true);
     try {
-      const response = await axiosInstance.get('/permits');
-      setPermits(response.data);
+      await loadPermits();
     } catch (error) {
       toast.error('Failed to fetch permits');
     } finally {
@@ -163,6 +164,14 @@ const PermitsPage = ({ user }) => {
     }
   };
 
+  const loadMorePermits = async () => {
+    try {
+      await loadMore();
+    } catch (error) {
+      toast.error('Failed to fetch permits');
+    }
+  };
+
   const handleApplyFromDestination = (destination) => {
     setFormData({
       ...formData,
@@ -583,6 +592,7 @@ const PermitsPage = ({ user }) => {
               ))}
             </div>
           )}
+          <LoadMoreButton hasMore={hasMore} loading={loadingMore} onClick={loadMorePermits} label={t('loadMore')} />
         </div>
       </div>
 
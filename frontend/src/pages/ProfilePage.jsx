@@ -1,5 +1,7 @@
 import { useState, useEffect } from 'react';
 import { axiosInstance } from '@/App';
+import { useCursorList } from '@/hooks/useCursorList';
+import LoadMoreButton from '@/components/LoadMoreButton';
 import { useLanguage } from '@/context/LanguageContext';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
@@ -12,8 +14,10 @@ import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
 
 const ProfilePage = ({ user }) => {
   const { t } = useLanguage();
-  const [bookings, setBookings] = useState([]);
-  const [permits, setPermits] = useState([]);
+  const bookingList = useCursorList('/bookings');
+  const permitList = useCursorList('/permits');
+  const bookings = bookingList.rows;
+  const permits = permitList.rows;
   const [loading, setLoading] = useState(true);
   const [cancelling, setCancelling] = useState(null);
   const [showEditProfile, setShowEditProfile] = useState(false);
@@ -30,12 +34,7 @@ const ProfilePage = ({ user }) => {
   const fetchUserData = async () => {
     setLoading(true);
     try {
-      const [bookingsRes, permitsRes] = await Promise.all([
-        axiosInstance.get('/bookings'),
-        axiosInstance.get('/permits')
-      ]);
-      setBookings(bookingsRes.data);
-      setPermits(permitsRes.data);
+      await Promise.all([bookingList.load(), permitList.load()]);
     } catch (error) {
       toast.error('Failed to load profile data');
     } finally {
@@ -43,6 +42,14 @@ const ProfilePage = ({ user }) => {
     }
   };
 
+  const loadMoreRows = (list) => async () => {
+    try {
+      await list.loadMore();
+    } catch (error) {
+      toast.error('Failed to load profile data');
+    }
+  };
+
   const handleCancelBooking = async (bookingId) => {
     if (!window.confirm('Are you sure you want to cancel this booking?')) return;
     
@@ -302,6 +309,7 @@ const ProfilePage = ({ user }) => {
                 ))}
               </div>
             )}
+            <LoadMoreButton hasMore={bookingList.hasMore} loading={bookingList.loadingMore} onClick={loadMoreRows(bookingList)} label={t('loadMore')} />
           </TabsContent>
 
           <TabsContent value="permits" className="mt-6" data-testid="permits-content">
@@ -366,6 +374,7 @@ const ProfilePage = ({ user }) => {
                 ))}
               </div>
             )}
+            <LoadMoreButton hasMore={permitList.hasMore} loading={permitList.loadingMore} onClick={loadMoreRows(permitList)} label={t('loadMore')} />
           </TabsContent>
         </Tabs>
 
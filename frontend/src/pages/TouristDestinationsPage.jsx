@@ -4,7 +4,7 @@ import { Button } from '@/components/ui/button';
 import { Card, CardContent } from '@/components/ui/card';
 import { useLanguage } from '@/context/LanguageContext';
 import { Link } from 'react-router-dom';
-import { axiosInstance } from '@/App';
+import { fetchAllPages } from '@/lib/pagination';
 
 // Shared destination data used across the app - includes all tourist locations with bilingual content
 export const destinationsData = [
@@ -492,8 +492,7 @@ const TouristDestinationsPage = () => {
     let isMounted = true;
     const fetchDestinations = async () => {
       try {
-        const response = await axiosInstance.get('/tourist-spots');
-        const spots = Array.isArray(response.data) ? response.data : [];
+        const spots = await fetchAllPages('/tourist-spots', { params: { limit: 1000 } });
         if (isMounted) {
           setDestinations(spots);
         }